@@ -0,0 +1,307 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Benchmark for convert.py
+#
+# Generates synthetic violation files of increasing size, converts each one in a fresh
+# process with each conversion engine and reports the elapsed time and the peak RSS of that process.
+# With the streaming Converter the peak RSS should stay flat as the row count grows.
+# An engine name ending in BYTES_SUFFIX (e.g. row+bytes) runs that engine with the byte mode pipeline,
+# one ending in THREADS_SUFFIX (e.g. row+threads) runs it with the threaded pipeline of PIPELINE_THREADS converters.
+# With --slow-read=SECONDS every read of the source sleeps that long first, a stand-in for a slow disk.
+# Also times the CSV readers on quote-free rows against a plain split.
+# The per-stage times come from the converter's ConversionStats. With --rules the conversion functions are
+# profiled (PROFILE_SAMPLED) and the estimated time of each rule is reported too.
+#
+# The source files are generated once per row count and number of filler columns and kept in BENCH_FOLDER.
+# They are the same on every run and Python version, so results can be compared across commits:
+# --save-baseline=NAME stores the results in BASELINE_FOLDER, --compare=NAME reports the change in rows/sec
+# against them. With --gate the benchmark fails (exit status 1) if any result is slower than its baseline,
+# e.g. to check Python 3 against Python 2:
+#
+#   python2 benchmark.py --save-baseline=py2
+#   python3 benchmark.py --compare=py2 --gate
+#
+# Usage: python benchmark.py [rows,rows,...] [engine,engine,...] [--filler=COLUMNS] [--slow-read=SECONDS]
+#                            [--rules] [--save-baseline=NAME] [--compare=NAME [--gate]]
+
+BENCH_FOLDER        = "bench"
+BASELINE_FOLDER     = BENCH_FOLDER + "/baselines"
+SOURCE_FILE_FORMAT  = "bench_{0}_{1}.csv"
+DEST_FILE_FORMAT    = "bench_{0}_{1}_out.csv"
+BASELINE_FILE_FORMAT = "{0}.json"
+DEFAULT_ROW_COUNTS  = [10000, 100000, 1000000]
+DEFAULT_ENGINES     = ['row', 'columnar', 'row+bytes', 'columnar+bytes']
+DEFAULT_FILLER      = 20
+GENERATE_BATCH_ROWS = 10000
+READER_MAX_ROWS     = 1000000
+BYTES_SUFFIX        = '+bytes'
+THREADS_SUFFIX      = '+threads'
+PIPELINE_THREADS    = 2
+CHILD_SYS_ARG       = '--child'
+SLOW_READ_SYS_ARG   = '--slow-read'
+FILLER_SYS_ARG      = '--filler'
+RULES_SYS_ARG       = '--rules'
+SAVE_SYS_ARG        = '--save-baseline'
+COMPARE_SYS_ARG     = '--compare'
+GATE_SYS_ARG        = '--gate'
+
+SOURCE_HEADER   = u'citation,tag,expmm,expyy,state,make,Description,violFine,violDate'
+SOURCE_ROW      = u'{0},T{1:05d},{2},{3},{4},{5},{6},${7}.00,{8:02d}/{9:02d}/2014 {10:02d}:{11:02d}:{12:02d} {13}'
+FILLER_HEADER   = u',filler{0}'
+FILLER_VALUE    = u',filler value {0}'
+STATES          = [u'MD', u'VA', u'DC', u'PA', u'NY', u'ZZ']
+MAKES           = [u'TOYOTA', u'HONDA', u'FORD', u'CHEVY']
+DESCRIPTIONS    = [u'NO STOPPING', u'EXPIRED METER', u'FIRE HYDRANT']
+FINES           = [32, 52, 77, 102, 250]
+MERIDIEMS       = [u'AM', u'PM']
+
+RESULT_HEADER   = "{0:>12} {1:>16} {2:>10} {3:>10} {4:>14} {5:>8} {6:>8} {7:>8} {8:>8} {9:>10}"
+RESULT_ROW      = "{0:>12} {1:>16} {2:>10.2f} {3:>10.0f} {4:>14} {5:>8.2f} {6:>8.2f} {7:>8.2f} {8:>8.2f} {9:>10}"
+RULE_ROW        = "{0:>30} {1:>24} {2:>8.2f}"
+CHANGE_FORMAT   = "{0:+.1%}"
+NO_CHANGE       = "-"
+STAGES          = ['read', 'split', 'convert', 'write']
+READER_HEADER   = "{0:>12} {1:>18} {2:>12} {3:>12}"
+READER_ROW      = "{0:>12} {1:>18} {2:>12.2f} {3:>12.0f}"
+
+import io
+import itertools
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+
+def write_source_file(file_path, row_count, filler_columns):
+    # deterministic synthetic source file with the columns used by RALLY_MAPPING and filler_columns more.
+    # The values are drawn with random() alone, which gives the same sequence on Python 2 and 3.
+    rnd = random.Random(row_count)
+
+    def between(low, high):
+        return low + int(rnd.random() * (high - low + 1))
+
+    def pick(values):
+        return values[int(rnd.random() * len(values))]
+
+    filler = u''.join(FILLER_VALUE.format(idx) for idx in range(filler_columns)) + u'\n'
+    with io.open(file_path, 'w', encoding='utf-8') as out_file:
+        out_file.write(SOURCE_HEADER + u''.join(FILLER_HEADER.format(idx) for idx in range(filler_columns)) + u'\n')
+        for start in range(0, row_count, GENERATE_BATCH_ROWS):
+            out_file.writelines(SOURCE_ROW.format(idx, between(0, 99999), between(1, 12), between(10, 18),
+                                                  pick(STATES), pick(MAKES), pick(DESCRIPTIONS), pick(FINES),
+                                                  between(1, 12), between(1, 28), between(1, 12), between(0, 59),
+                                                  between(0, 59), pick(MERIDIEMS)) + filler
+                                for idx in range(start, min(start + GENERATE_BATCH_ROWS, row_count)))
+
+
+def peak_rss_kb():
+    # ru_maxrss is reported in kilobytes on Linux and bytes on OS X
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+
+class SlowRawFile(io.RawIOBase):
+    # raw file that sleeps before each read
+    def __init__(self, path, read_seconds):
+        super(SlowRawFile, self).__init__()
+        self.raw = io.FileIO(path, 'r')
+        self.read_seconds = read_seconds
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        time.sleep(self.read_seconds)
+        return self.raw.readinto(buffer)
+
+    def close(self):
+        self.raw.close()
+        super(SlowRawFile, self).close()
+
+
+def slow_file_source(source_file, read_seconds):
+    # a convert.FileSource reading through SlowRawFile
+    import convert
+
+    class SlowFileSource(convert.FileSource):
+        def open(self, buffer_size=convert.READ_BUFFER_SIZE):
+            return io.BufferedReader(SlowRawFile(self.path, read_seconds), buffer_size)
+
+        def open_lines(self, buffer_size=convert.READ_BUFFER_SIZE):
+            return io.TextIOWrapper(self.open(buffer_size), encoding='utf-8')
+
+    return SlowFileSource(source_file)
+
+
+def run_child(source_file, destination_file, engine, read_seconds, profile_rules):
+    # runs a single conversion in this process and prints the result as a line of JSON:
+    # elapsed seconds, peak RSS and the converter's statistics
+    import logging
+    import convert
+
+    convert.rootLogger.setLevel(logging.WARNING)
+    start = time.time()
+    pipeline_threads = None
+    if engine.endswith(THREADS_SUFFIX):
+        engine = engine[:-len(THREADS_SUFFIX)]
+        pipeline_threads = PIPELINE_THREADS
+    byte_mode = engine.endswith(BYTES_SUFFIX)
+    if byte_mode:
+        engine = engine[:-len(BYTES_SUFFIX)]
+    source = slow_file_source(source_file, read_seconds) if read_seconds else source_file
+    converter = convert.Converter(source, destination_file, convert.RALLY_MAPPING, [], engine=engine,
+                                  byte_mode=byte_mode, pipeline_threads=pipeline_threads,
+                                  profile=convert.PROFILE_SAMPLED if profile_rules else None)
+    converter.transform()
+    elapsed = time.time() - start
+    print(json.dumps({'seconds': elapsed, 'peak_rss_kb': peak_rss_kb(), 'stats': converter.stats.to_dict()}))
+
+
+def get_commit():
+    # the current commit of the repository, None if it is not known
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('ascii').strip()
+
+
+def load_baseline(name):
+    # the results stored as baseline name, keyed by (rows, engine)
+    with io.open(os.path.join(BASELINE_FOLDER, BASELINE_FILE_FORMAT.format(name)), 'r', encoding='utf-8') as in_file:
+        baseline = json.load(in_file)
+    return dict(((result['rows'], result['engine']), result) for result in baseline['results'])
+
+
+def save_baseline(name, results, filler_columns, read_seconds):
+    if not os.path.isdir(BASELINE_FOLDER):
+        os.makedirs(BASELINE_FOLDER)
+    baseline = {'commit': get_commit(), 'python': sys.version.split()[0], 'filler_columns': filler_columns,
+                'slow_read': read_seconds, 'results': results}
+    file_path = os.path.join(BASELINE_FOLDER, BASELINE_FILE_FORMAT.format(name))
+    with io.open(file_path, 'w', encoding='utf-8') as out_file:
+        out_file.write(u'{0}\n'.format(json.dumps(baseline, indent=2, sort_keys=True)))
+    print("Baseline saved to: {0}".format(file_path))
+
+
+def run_benchmark(row_counts, engines, filler_columns, read_seconds, profile_rules, baseline):
+    # returns the list of results, one per row count and engine
+    if not os.path.isdir(BENCH_FOLDER):
+        os.mkdir(BENCH_FOLDER)
+
+    results = []
+    print(RESULT_HEADER.format("rows", "engine", "seconds", "rows/sec", "peak RSS (KB)", *STAGES + ["vs base"]))
+    for row_count in row_counts:
+        source_file = os.path.join(BENCH_FOLDER, SOURCE_FILE_FORMAT.format(row_count, filler_columns))
+        destination_file = os.path.join(BENCH_FOLDER, DEST_FILE_FORMAT.format(row_count, filler_columns))
+        if not os.path.isfile(source_file):
+            write_source_file(source_file, row_count, filler_columns)
+
+        for engine in engines:
+            # each conversion runs in a fresh process so the peak RSS of one run does not mask another
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), CHILD_SYS_ARG,
+                                              source_file, destination_file, engine, str(read_seconds),
+                                              str(int(profile_rules))])
+            child = json.loads(output.decode('utf-8').splitlines()[-1])
+            stats = child['stats']
+            result = {'rows': row_count, 'engine': engine, 'seconds': child['seconds'],
+                      'rows_per_second': row_count / child['seconds'], 'peak_rss_kb': child['peak_rss_kb'],
+                      'stage_seconds': stats['stage_seconds'],
+                      'rule_seconds': dict((rule['name'], rule['estimated_seconds']) for rule in stats['rules'])}
+            results.append(result)
+
+            change = NO_CHANGE
+            if (row_count, engine) in baseline:
+                change = CHANGE_FORMAT.format(
+                    result['rows_per_second'] / baseline[(row_count, engine)]['rows_per_second'] - 1)
+            stage_seconds = [result['stage_seconds'][stage] for stage in STAGES]
+            print(RESULT_ROW.format(row_count, engine, result['seconds'], result['rows_per_second'],
+                                    result['peak_rss_kb'], *stage_seconds + [change]))
+            if profile_rules:
+                for rule in stats['rules']:
+                    print(RULE_ROW.format("rule", rule['name'], rule['estimated_seconds']))
+    return results
+
+
+def get_regressions(results, baseline):
+    # the results with fewer rows/sec than their baseline
+    return [result for result in results if (result['rows'], result['engine']) in baseline
+            and result['rows_per_second'] < baseline[(result['rows'], result['engine'])]['rows_per_second']]
+
+
+def run_reader_benchmark(row_count, filler_columns):
+    # quote-free rows through each reader, including the split the reader fast path is based on
+    import convert
+
+    source_file = os.path.join(BENCH_FOLDER, SOURCE_FILE_FORMAT.format(row_count, filler_columns))
+    with io.open(source_file, 'r', encoding='utf-8') as src_file:
+        header_fields = src_file.readline().rstrip(u'\n').split(u',')
+        lines = list(itertools.islice(src_file, READER_MAX_ROWS))
+    row_count = len(lines)
+    # split up to the last column RALLY_MAPPING uses, as the Converter does
+    max_split = max(header_fields.index(field) for mapping in convert.RALLY_MAPPING
+                    for field in mapping[convert.SOURCE_KEY]) + 1
+
+    readers = [('split', lambda src_lines: (line.rstrip(u'\n').split(u',') for line in src_lines)),
+               (convert.SIMPLE_CSV, convert.split_rows),
+               (convert.RFC4180_CSV, convert.read_csv_rows),
+               (convert.RFC4180_CSV + '+projected', lambda src_lines: convert.read_csv_rows(src_lines, None, max_split))]
+
+    print(READER_HEADER.format("rows", "reader", "seconds", "rows/sec"))
+    for name, reader in readers:
+        start = time.time()
+        for _ in reader(lines):
+            pass
+        elapsed = time.time() - start
+        print(READER_ROW.format(row_count, name, elapsed, row_count / elapsed))
+
+
+def get_arg_value(args, arg_name, default=None):
+    # the value of an argument given as --name=value, or the default if not present
+    for arg in args:
+        if arg.startswith(arg_name + '='):
+            return arg.split('=', 1)[1]
+    return default
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    if len(sys.argv) > 1 and sys.argv[1] == CHILD_SYS_ARG:
+        run_child(sys.argv[2], sys.argv[3], sys.argv[4], float(sys.argv[5]), sys.argv[6] == '1')
+    else:
+        options = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+        args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+        counts = DEFAULT_ROW_COUNTS
+        engines = DEFAULT_ENGINES
+        if len(args) > 0:
+            counts = [int(count) for count in args[0].split(',')]
+        if len(args) > 1:
+            engines = args[1].split(',')
+        filler = int(get_arg_value(options, FILLER_SYS_ARG, DEFAULT_FILLER))
+        read_seconds = float(get_arg_value(options, SLOW_READ_SYS_ARG, 0.0))
+        compare_name = get_arg_value(options, COMPARE_SYS_ARG)
+        save_name = get_arg_value(options, SAVE_SYS_ARG)
+        baseline_results = load_baseline(compare_name) if compare_name else {}
+
+        bench_results = run_benchmark(counts, engines, filler, read_seconds, RULES_SYS_ARG in options,
+                                      baseline_results)
+        if save_name:
+            save_baseline(save_name, bench_results, filler, read_seconds)
+        run_reader_benchmark(counts[-1], filler)
+
+        if GATE_SYS_ARG in options:
+            regressions = get_regressions(bench_results, baseline_results)
+            for regression in regressions:
+                print("Slower than baseline {0}: {1} rows, {2}".format(compare_name, regression['rows'],
+                                                                        regression['engine']))
+            if not baseline_results or regressions:
+                print("Gate failed")
+                sys.exit(1)
+            print("Gate passed")
@@ -8,8 +8,11 @@ VERSION = '2015.1.0'
 SOURCE_FOLDER   = "source"
 DEST_FOLDER     = "upload"
 LOG_FOLDER      = "logs"
+MAPPING_CACHE_FOLDER = "cache"
 
 LOG_FILE_NAME       = 'story_data_prep.log'
+STATS_FILE_NAME     = 'story_data_prep_stats.json'
+REJECTS_FILE_NAME   = 'story_data_prep_rejects.csv'
 OUTPUT_FILE_NAME    = 'upload.csv'
 
 DESTINATION_KEY         = 'destination'
@@ -17,13 +20,93 @@ SOURCE_KEY              = 'source'
 CONVERSION_FUNCTION_KEY = 'conversion'
 SOURCE_INDEX_KEY        = 'index'
 
-PROCESSING_COUNT_FEEDBACK   = 100
+SOURCE_FILE_KEY         = 'source_file'
+SOURCE_SIZE_KEY         = 'source_size'
+SOURCE_MTIME_KEY        = 'source_mtime'
+SOURCE_HASH_KEY         = 'source_hash'
+SOURCE_OFFSET_KEY       = 'source_offset'
+OUTPUT_OFFSET_KEY       = 'output_offset'
+ROWS_KEY                = 'rows'
+SHARDS_KEY              = 'shards'
+SHARD_FILE_KEY          = 'file'
+SHARD_BYTES_KEY         = 'bytes'
+SHARD_SHA1_KEY          = 'sha1'
+COMPLETE_KEY            = 'complete'
+DEDUP_RUNS_KEY          = 'runs'
+DEDUP_BLOOMS_KEY        = 'blooms'
+DEDUP_FILE_KEY          = 'file'
+DEDUP_KEYS_KEY          = 'keys'
+DEDUP_CAPACITY_KEY      = 'capacity'
+DEDUP_NEXT_FILE_KEY     = 'next_file'
+REJECTS_KEY             = 'rejects'
+REJECTS_OFFSET_KEY      = 'rejects_offset'
+
+PROGRESS_INTERVAL_SECONDS   = 5
+READ_BUFFER_SIZE            = 1024 * 1024
+WRITE_BUFFER_SIZE           = 1024 * 1024
+STREAM_CHUNK_ROWS           = 1000
+PIPELINE_MAX_CHUNKS         = 16
+PIPELINE_POLL_SECONDS       = 0.1
+ROW_ENGINE                  = 'row'
+COLUMNAR_ENGINE             = 'columnar'
+PARALLEL_CHUNK_SIZE         = 64 * 1024 * 1024
+WATCH_POLL_SECONDS          = 0.5
+PART_FILE_FORMAT            = '{0}.{1}.{2}.part'
+CHECKPOINT_INTERVAL_ROWS    = 100000
+CHECKPOINT_FILE_FORMAT      = '{0}.checkpoint'
+SHARD_FILE_FORMAT           = '{0}.{1:05d}{2}'
+MANIFEST_FILE_FORMAT        = '{0}.manifest.json'
+TEMP_FILE_SUFFIX            = '.tmp'
+ERROR_RATE_MIN_ROWS         = 1000
+REJECTS_HEADER              = [u'record', u'rule', u'error', u'source_line']
+STATE_FILE_NAME             = 'conversion_state.json'
+DEDUP_INDEX_FILE_NAME       = 'dedup_keys'
+DEDUP_KEY_FIELD             = 'citation'
+DEDUP_KEY_BYTES             = 8
+DEDUP_FILE_FORMAT           = '{0}.{1:05d}{2}'
+DEDUP_RUN_EXTENSION         = '.keys'
+DEDUP_BLOOM_EXTENSION       = '.bloom'
+DEDUP_BLOOM_BITS_PER_KEY    = 10
+DEDUP_BLOOM_HASHES          = 7
+DEDUP_MIN_CAPACITY          = 1000000
+DEDUP_RUN_KEYS              = 1000000
+DEDUP_RUN_RATIO             = 2
+DEDUP_MERGE_BLOCK_KEYS      = 1 << 16
+DEDUP_FENCE_KEYS            = 1024
+STDIO_PATH                  = '-'
+GZIP_EXTENSION              = '.gz'
+BZIP2_EXTENSION             = '.bz2'
+XZ_EXTENSION                = '.xz'
+YAML_EXTENSIONS             = ('.yaml', '.yml')
+SOURCE_FILE_EXTENSIONS      = ('.csv', '.csv' + GZIP_EXTENSION, '.csv' + BZIP2_EXTENSION, '.csv' + XZ_EXTENSION)
+HASH_BLOCK_SIZE             = 1024 * 1024
+COUNT_BLOCK_SIZE            = 16 * 1024 * 1024
+MMAP_BLOCK_SIZE             = 4 * 1024 * 1024
+PROFILE_FULL                = 'full'
+PROFILE_SAMPLED             = 'sampled'
+PROFILE_SAMPLE_CHUNKS       = 50
+READ_STAGE                  = 'read'
+SPLIT_STAGE                 = 'split'
+CONVERT_STAGE               = 'convert'
+WRITE_STAGE                 = 'write'
 MIN_EXPIRATION_DATE_YEAR    = 10
 SOURCE_DATE_FORMAT          = '%m/%d/%Y %I:%M:%S %p'
+SOURCE_DATE_LENGTH          = 22
+SOURCE_DATE_DIGITS          = u'0123456789'
+DATE_CACHE_SIZE             = 16384
+YEAR_MONTH_CACHE_SIZE       = 1024
+BYTE_CONVERSION_CACHE_SIZE  = 16384
+NOTES_PREFIX_CACHE_SIZE     = 4096
 BULLET_LIST_FORMAT          = u"<ul type=\"disc\"><li>{0}</li><li>{1}</li><li>{2}</li></ul>"
 CSV_SEP                     = u','
-EDT_OFFSET                  = '+04:00'
-EST_OFFSET                  = '+05:00'
+CSV_QUOTE                   = u'"'
+CSV_SEP_BYTES               = b','
+CSV_QUOTE_BYTES             = b'"'
+COLUMN_JOIN                 = u'\x00'
+RFC4180_CSV                 = 'rfc4180'
+SIMPLE_CSV                  = 'simple'
+EDT_OFFSET                  = u'+04:00'
+EST_OFFSET                  = u'+05:00'
 NO_STATE_INFO_TEXT          = u'No State Information'
 US_STATES = {
         u'AK': u'Alaska',
@@ -90,42 +173,199 @@ US_STATES = {
 LOG_MSG_STARTING        = "Starting Conversion"
 LOG_MSG_SCRIPT_VERSION  = "Script Version: {0}"
 LOG_MSG_USING_LOG       = "Using log file: {0}"
-LOG_MSG_PYTHON_VER      = "Program will only run on Python Version 2.6 or 2.7"
+LOG_MSG_PYTHON_VER      = "Program will only run on Python Version 2.6, 2.7 or 3"
 LOG_MSG_PROG_ABORT      = "Program aborted: {0}"
 LOG_MSG_VERIFY_BEGIN    = "Verifying conversion..."
 LOG_MSG_VERIFY_COUNT    = "Source records: {0}, Destination Records: {1}"
 LOG_MSG_VERIFY_SUCCESS  = "Verification Result: Pass"
 LOG_MSG_VERIFY_FAIL     = "Verification Result: Fail"
+LOG_MSG_VERIFY_STREAM_COUNT = "Records read: {0}, Records written: {1}, rejected: {2}, duplicates dropped: {3}"
+LOG_MSG_VERIFY_NULLS    = "Empty values in '{0}': {1} of {2}"
+LOG_MSG_VERIFY_NULLS_FAIL = "Too many empty values in '{0}': {1} of {2}, limit {3:.0%}"
+LOG_MSG_VERIFY_CHECKSUM = "Destination records CRC32: {0:08x}"
 
 LOG_MSG_CREATE_MAPPINGS     ="Creating rules from mappings."
 LOG_MSG_ADD_RULE            ="Added rule for '{0}' mapping."
-LOG_MSG_PROCESS_RECS        ="Processed {0} records."
+LOG_MSG_PROCESS_RECS        ="Processed {0} records ({1:.0f} records/s, {2:.0%} done, ETA {3:.0f}s)."
+LOG_MSG_PROCESS_RECS_RATE   ="Processed {0} records ({1:.0f} records/s)."
 LOG_MSG_PROC_COMPLETE       ="Processed {0} records. Conversion Complete"
 LOG_MSG_SRC_NOT_FOUND       = u"Source column '{0}' not found in file. Aborting program."
 LOG_MSG_GET_SRC_COL_IDX     = u"Retrieving source column indices for {0} field."
+LOG_MSG_PROJECTION          = u"Source rows are split up to column '{0}', {1} of {2} columns."
 LOG_MSG_SRC_DIR_NOT_FOUND   = "Source Directory '{0}' not found - application will terminate."
 LOG_MSG_USING_SRC_DIR       = "Using source folder: {0}"
 LOG_MSG_USING_DEST_FLDR     = "Using destination folder: {0}"
 LOG_MSG_ABORT_NO_SRC_FILE   = "Aborting program: No conversion files found in folder {0}"
 LOG_MSG_PROCESS_FROM_TO     = "Processing files from source: {0} to destination: {1}."
+LOG_MSG_PARALLEL_START      = "Converting {0} file(s) in {1} chunk(s) using {2} processes."
+LOG_MSG_PARALLEL_CHUNK_DONE = "Converted chunk {0} of {1}: {2} records."
+LOG_MSG_MERGE_OUTPUT        = "Merging {0} chunk(s) into: {1}"
+LOG_MSG_CHECKPOINT          = "Checkpoint: {0} records, source offset {1}, output offset {2}."
+LOG_MSG_RESUME              = "Resuming from checkpoint: {0} records, source offset {1}, output offset {2}."
+LOG_MSG_CHECKPOINT_STALE    = "Ignoring checkpoint {0} - source or destination file has changed."
+LOG_MSG_SKIP_UNCHANGED      = "Skipping unchanged source file: {0}"
+LOG_MSG_NOTHING_TO_CONVERT  = "No changed source files - nothing to convert."
+LOG_MSG_WATCH_START         = "Watching {0}: converting up to {1} files at a time, polling every {2} seconds."
+LOG_MSG_WATCH_CONVERTED     = "Converted {0} to {1}: {2} records in {3:.3f} seconds."
+LOG_MSG_WATCH_FAILED        = "Failed to convert {0}: {1}"
+LOG_MSG_WATCH_STOP          = "Stopped watching for source files."
+LOG_MSG_USING_MAPPING       = "Using mapping file: {0}"
+LOG_MSG_MAPPING_CACHED      = "Using the cached mapping: {0}"
+LOG_MSG_SKIP_REREAD         = "Skipping {0} - the source or destination is not a file that can be re-read."
+LOG_MSG_STATS_THROUGHPUT    = "Converted {0} records in {1:.2f}s ({2:.0f} records/s), read {3} bytes, wrote {4} bytes."
+LOG_MSG_STATS_STAGE         = "Stage '{0}': {1:.3f}s"
+LOG_MSG_STATS_RULE          = "Rule '{0}': {1:.3f}s over {2} calls, estimated {3:.3f}s for all records"
+LOG_MSG_STATS_FILE          = "Conversion statistics written to: {0}"
+LOG_MSG_STATS_CACHE         = "Cache '{0}': {1} hits, {2} misses, {3} of {4} entries"
+LOG_MSG_REJECTS             = "Rejected {0} records, written to: {1}"
+LOG_MSG_SHARD_DONE          = "Wrote shard {0}: {1} records, {2} bytes."
+LOG_MSG_DEDUP               = u"Dropped {0} records with a '{1}' seen before, {2} keys in: {3}"
+LOG_MSG_DEDUP_BLOOM         = "Starting Bloom filter {0} for {1} keys."
+LOG_MSG_DEDUP_MERGE         = "Merged {0} runs of {1} keys into: {2}"
 
 
 #Exception Messages
 LOG_MSG_EXCEPT_DIR_NOT_FOUND = "Source Directory not found.  Aborting program."
 LOG_MSG_EXCEPT_NO_SRC       = "Aborting program. Source files missing."
 LOG_MSG_EXCEPT_SRC_FLD_NOT_FOUND = "Aborting program - source field not found in file"
+LOG_MSG_EXCEPT_ENGINE       = "Aborting program - unknown conversion engine '{0}'"
+LOG_MSG_EXCEPT_CSV_FORMAT   = "Aborting program - unknown CSV format '{0}'"
+LOG_MSG_EXCEPT_DEST_COUNT   = "Aborting program - expected one destination file or one per source file"
+LOG_MSG_EXCEPT_COMPRESSION  = "Aborting program - no module available to read or write '{0}' files"
+LOG_MSG_EXCEPT_MAPPING      = "Aborting program - invalid mapping file '{0}': {1}"
+LOG_MSG_EXCEPT_YAML         = "Aborting program - the PyYAML package is needed to read '{0}'"
+LOG_MSG_EXCEPT_NOT_A_FILE   = "Aborting program - '{0}' needs a plain (uncompressed) file source and destination"
+LOG_MSG_EXCEPT_NOT_SUPPORTED = "Aborting program - '{0}' can not be used with '{1}'"
+LOG_MSG_EXCEPT_MAX_REJECTS  = "Aborting program - {0} records rejected, limit {1}"
+LOG_MSG_EXCEPT_WORKER_EXIT  = "Aborting program - a worker process exited with code {0}"
+LOG_MSG_EXCEPT_REJECT_RATE  = "Aborting program - {0} of {1} records rejected, limit {2:.2%}"
 
 VERSION_SYS_ARG = '--version'
+PARALLEL_SYS_ARG = '--parallel'
+OUTPUT_PER_INPUT_SYS_ARG = '--output-per-input'
+CHECKPOINT_SYS_ARG = '--checkpoint'
+INCREMENTAL_SYS_ARG = '--incremental'
+REREAD_VALIDATION_SYS_ARG = '--reread-validation'
+PROFILE_SYS_ARG = '--profile'
+BYTES_SYS_ARG = '--bytes'
+MMAP_SYS_ARG = '--mmap'
+MAPPING_SYS_ARG = '--mapping'
+THREADS_SYS_ARG = '--threads'
+QUARANTINE_SYS_ARG = '--quarantine'
+MAX_ERRORS_SYS_ARG = '--max-errors'
+MAX_ERROR_RATE_SYS_ARG = '--max-error-rate'
+SHARD_ROWS_SYS_ARG = '--shard-rows'
+SHARD_BYTES_SYS_ARG = '--shard-bytes'
+DEDUP_SYS_ARG = '--dedup'
+WATCH_SYS_ARG = '--watch'
+WORKERS_SYS_ARG = '--workers'
+SOURCE_SYS_ARG = '--source'
+DESTINATION_SYS_ARG = '--destination'
+BUFFER_SIZE_SYS_ARG = '--buffer-size'
+ENGINE_SYS_ARG = '--engine'
+CSV_SYS_ARG = '--csv'
 
 import os
 import logging
 import sys
 import datetime
 import io
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import operator
+import shutil
+import collections
+import functools
+import csv
+import json
+import hashlib
+import mmap
+import zlib
+import struct
+import bisect
+import time
+import threading
+import atexit
+import logging.handlers
+import contextlib
+import signal
+import gzip
+import bz2
+try:
+    import lzma
+except ImportError:
+    # Python 2 has no xz support in the standard library
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+try:
+    text_type = unicode
+    # a byte of a bytes object or mmap is a one character string
+    byte_value, to_byte = ord, chr
+except NameError:
+    # Python 3 - str is unicode text, a byte is an int
+    text_type = str
+    byte_value = to_byte = int
 
 
 # -------------------------------------------     LOGGING SETUP -----------------------------------------------------
 #  initialize the logging...use stdout for console logging
+#  once start_logging is called, records are only queued by the converting thread and the console and log file are
+#  written by a listener thread, so slow log storage does not hold up the conversion
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:
+    # Python 2 - the minimal parts of the Python 3 handlers used here
+    class QueueHandler(logging.Handler):
+        def __init__(self, record_queue):
+            logging.Handler.__init__(self)
+            self.queue = record_queue
+
+        def emit(self, record):
+            try:
+                # the message is formatted now, the arguments may change before the listener writes it
+                record.msg = record.getMessage()
+                record.args = None
+                if record.exc_info:
+                    record.exc_text = logging.Formatter().formatException(record.exc_info)
+                    record.exc_info = None
+                self.queue.put_nowait(record)
+            except Exception:
+                self.handleError(record)
+
+    class QueueListener(object):
+        _sentinel = None
+
+        def __init__(self, record_queue, *handlers):
+            self.queue = record_queue
+            self.handlers = handlers
+            self._thread = None
+
+        def start(self):
+            self._thread = threading.Thread(target=self._monitor)
+            self._thread.daemon = True
+            self._thread.start()
+
+        def stop(self):
+            self.queue.put_nowait(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+        def _monitor(self):
+            while True:
+                record = self.queue.get()
+                if record is self._sentinel:
+                    break
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
 
 logFormatter = logging.Formatter("%(asctime)s [%(levelname)-5.5s]  %(message)s")
 rootLogger = logging.getLogger()
@@ -135,12 +375,143 @@ consoleHandler.setFormatter(logFormatter)
 rootLogger.addHandler(consoleHandler)
 rootLogger.setLevel(logging.INFO)
 
+logQueue = queue.Queue()
+logQueueHandler = QueueHandler(logQueue)
+logListener = QueueListener(logQueue)
+
+
+def start_logging():
+    # moves the root logger's handlers to the listener thread, everything logged before exit is written before the
+    # program ends
+    logListener.handlers = tuple(rootLogger.handlers)
+    for handler in logListener.handlers:
+        rootLogger.removeHandler(handler)
+    rootLogger.addHandler(logQueueHandler)
+    logListener.start()
+    atexit.register(logListener.stop)
+
+
+def add_log_handler(handler):
+    # once logging is started, handlers are added to the listener rather than the root logger so they are written
+    # off the converting thread
+    if logQueueHandler in rootLogger.handlers:
+        logListener.handlers = logListener.handlers + (handler,)
+    else:
+        rootLogger.addHandler(handler)
+
 # ------------------------------------------- Global Functions ------------------------------------------------------
 
 
 def get_version():
     return VERSION
 
+
+# high resolution timer for the conversion statistics
+timer = getattr(time, 'perf_counter', time.time)
+
+
+def get_sys_arg_value(arg_name, default=None):
+    # returns the value of a command line argument given as --name=value, or the default if not present
+    for arg in sys.argv[1:]:
+        if arg.startswith(arg_name + '='):
+            return arg.split('=', 1)[1]
+    return default
+
+
+# ------------------------------------------- Caching ---------------------------------------------------------------
+# functools.lru_cache is not available before Python 3.2, so provide an equivalent for older versions.
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+try:
+    from functools import lru_cache
+except ImportError:
+    def lru_cache(maxsize=128):
+        """ Decorator: bounded least recently used memoization of a function with hashable positional arguments.
+
+            :param  maxsize: maximum number of results kept
+            :return decorator - the wrapped function has cache_info() and cache_clear() like functools.lru_cache
+        """
+        def decorator(fn):
+            cache = collections.OrderedDict()
+            stats = [0, 0]
+            # the OrderedDict links are not thread safe, converter threads share the cache
+            lock = threading.Lock()
+
+            @functools.wraps(fn)
+            def wrapper(*args):
+                with lock:
+                    try:
+                        result = cache.pop(args)
+                        stats[0] += 1
+                        cache[args] = result
+                        return result
+                    except KeyError:
+                        pass
+                result = fn(*args)
+                with lock:
+                    stats[1] += 1
+                    cache.pop(args, None)
+                    if len(cache) >= maxsize:
+                        cache.popitem(last=False)
+                    cache[args] = result
+                return result
+
+            def cache_info():
+                return CacheInfo(stats[0], stats[1], maxsize, len(cache))
+
+            def cache_clear():
+                cache.clear()
+                stats[0] = stats[1] = 0
+
+            wrapper.cache_info = cache_info
+            wrapper.cache_clear = cache_clear
+            return wrapper
+        return decorator
+
+
+"""
+Class:  LookupCache
+
+        Bounded table of the results of a function of one hashable key, for lookups with few distinct keys that
+        are repeated on most rows. A dictionary lookup is much cheaper than lru_cache, which has to keep the
+        order of use, so rather than evicting the least recently used result the table is cleared when full.
+        Hits and misses are counted for tuning the size (the counts are approximate with converter threads).
+
+        :param  function: function of the key that computes the value
+        :param  maxsize: maximum number of results kept
+"""
+
+
+class LookupCache(object):
+    __slots__ = ('_function', '_maxsize', '_table', '_hits', '_misses')
+
+    def __init__(self, function, maxsize):
+        self._function = function
+        self._maxsize = maxsize
+        self._table = {}
+        self._hits = 0
+        self._misses = 0
+
+    def lookup(self, key):
+        try:
+            value = self._table[key]
+        except KeyError:
+            self._misses += 1
+            if len(self._table) >= self._maxsize:
+                self._table.clear()
+            value = self._table[key] = self._function(key)
+            return value
+        self._hits += 1
+        return value
+
+    def cache_info(self):
+        return CacheInfo(self._hits, self._misses, self._maxsize, len(self._table))
+
+    def cache_clear(self):
+        self._table.clear()
+        self._hits = self._misses = 0
+
 # ------------------------------------------ Conversion Functions -------------------------------------------------
 # These function are used in the MAPPING dictionary list and ConversionRule objects
 #
@@ -154,10 +525,8 @@ def date_to_iso_date(field_list):
         :param  field_list - a list containing a single date
         :return unicode string of the ISO formatted date
     """
-    in_date = field_list[0]
-    new_date = datetime.datetime.strptime(in_date, SOURCE_DATE_FORMAT)
-    result_date = convert_date_to_utc(new_date)
-    return result_date
+    # violation dates repeat, so results are memoized by the source string
+    return source_date_to_iso_date(field_list[0])
 
 
 def currency_to_integer(field_list):
@@ -171,7 +540,7 @@ def currency_to_integer(field_list):
     """
     amount = field_list[0]
     amount_as_num = amount.strip()[1:]
-    return unicode(int(float(amount_as_num)))
+    return text_type(int(float(amount_as_num)))
 
 
 def year_month_to_date(field_list):
@@ -183,12 +552,80 @@ def year_month_to_date(field_list):
         :return unicode string of the ISO formatted date if the yy and mm
                 values are valid. Empty string otherwise
     """
+    # there are only a handful of distinct yy/mm pairs, so results are memoized
+    return yy_mm_to_iso_date(field_list[0], field_list[1])
+
+
+def to_bullet_list(field_list):
+    """ Converts 3 fields to a bulleted HTML list.
+
+        :param  field_list - a list containing three entries, second entry
+                is a US State abbreviation and is converted to the full name of
+                the state.
+        :return unicode string of the HTML bulleted list
+    """
+    # the list up to the third entry is the same for every row with the same make and state
+    return NOTES_PREFIXES.lookup((field_list[0], field_list[1])) + field_list[2] + BULLET_LIST_END
+
+# --------------------- Conversion Function Helper Functions --------------------------
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def source_date_to_iso_date(in_date):
+    # memoized conversion of a single SOURCE_DATE_FORMAT string to an ISO date
+    new_date = parse_source_date(in_date)
+    result_date = convert_date_to_utc(new_date)
+    return result_date
+
+
+def parse_source_date(in_date):
+    """ Parses a date in the format: SOURCE_DATE_FORMAT (MM/DD/YYYY HH:MM:SS AM)
+
+        Dates with zero padded fixed width fields are parsed directly, anything else
+        is left to strptime so the accepted values and errors are unchanged.
+
+        :param  in_date - unicode string of the date
+        :return datetime of the date
+    """
+    if len(in_date) == SOURCE_DATE_LENGTH and in_date[2] == u'/' and in_date[5] == u'/' and in_date[10] == u' ' \
+            and in_date[13] == u':' and in_date[16] == u':' and in_date[19] == u' ':
+        hour = in_date[11:13]
+        am_pm = in_date[20:].upper()
+        # only ASCII digits, unicode.isdigit and int also take other digits that strptime may not
+        if not hour.strip(SOURCE_DATE_DIGITS) and am_pm in (u'AM', u'PM'):
+            hour = int(hour)
+            if 1 <= hour <= 12:
+                # 12 AM is hour 0 and 12 PM hour 12 of the day
+                hour = hour % 12 + (12 if am_pm == u'PM' else 0)
+                try:
+                    return source_date_fields_to_datetime(in_date, hour)
+                except ValueError:
+                    pass
+    return datetime.datetime.strptime(in_date, SOURCE_DATE_FORMAT)
+
+
+if hasattr(datetime.datetime, 'fromisoformat'):
+    def source_date_fields_to_datetime(in_date, hour):
+        # the datetime of a SOURCE_DATE_FORMAT date given its hour of the day, ValueError if it is not valid.
+        # Python 3.7+: the fields are rearranged into an ISO date, parsed by a single call
+        return datetime.datetime.fromisoformat(u'%s-%s-%sT%02d%s' % (in_date[6:10], in_date[0:2], in_date[3:5],
+                                                                     hour, in_date[13:19]))
+else:
+    def source_date_fields_to_datetime(in_date, hour):
+        # the datetime of a SOURCE_DATE_FORMAT date given its hour of the day, ValueError if it is not valid
+        if (in_date[0:2] + in_date[3:5] + in_date[6:10] + in_date[14:16] + in_date[17:19]).strip(SOURCE_DATE_DIGITS):
+            raise ValueError(in_date)
+        return datetime.datetime(int(in_date[6:10]), int(in_date[0:2]), int(in_date[3:5]),
+                                 hour, int(in_date[14:16]), int(in_date[17:19]))
+
+
+@lru_cache(maxsize=YEAR_MONTH_CACHE_SIZE)
+def yy_mm_to_iso_date(yy, mm):
+    # memoized conversion of a yy and mm pair, see year_month_to_date
     # logic: since we only have the year and month, the tag is valid
     # until midnight of the last day of the next month. So get midnight of
     # first day of following month and subtract one day!
     result = None
-    yy = field_list[0]
-    mm = field_list[1]
     if len(yy) > 1 and len(mm) > 0:
         year , month = int(yy) + 2000 , int(mm)
         if month == 12:
@@ -208,21 +645,6 @@ def year_month_to_date(field_list):
         return u''
 
 
-def to_bullet_list(field_list):
-    """ Converts 3 fields to a bulleted HTML list.
-
-        :param  field_list - a list containing three entries, second entry
-                is a US State abbreviation and is converted to the full name of
-                the state.
-        :return unicode string of the HTML bulleted list
-    """
-    state = state_code_to_full(field_list[1])
-    result = BULLET_LIST_FORMAT.format(field_list[0], state, field_list[2])
-    return result
-
-# --------------------- Conversion Function Helper Functions --------------------------
-
-
 def state_code_to_full(state_code):
     """ Converts a state two letter code to the full state name.
 
@@ -230,34 +652,72 @@ def state_code_to_full(state_code):
         :return unicode string of the full state name, NO_STATE_INFO_TEXT string if
                 not a valid US State
     """
-    if US_STATES.has_key(state_code):
-        return US_STATES[state_code]
-    else:
-        return NO_STATE_INFO_TEXT
+    return US_STATES.get(state_code, NO_STATE_INFO_TEXT)
+
+
+def split_bullet_list_format(list_format):
+    # the text of a three entry list format around its {0}, {1} and {2} fields
+    start, rest = list_format.split(u'{0}')
+    before_second, rest = rest.split(u'{1}')
+    after_second, end = rest.split(u'{2}')
+    return start, before_second, after_second, end
+
+
+# Notes are rendered by joining pieces of BULLET_LIST_FORMAT rather than formatting it for every row:
+# the HTML of the second entry is built once for each state, and the list up to the third entry is kept for
+# each (make, state) in NOTES_PREFIXES
+BULLET_LIST_START, STATE_ENTRY_START, STATE_ENTRY_END, BULLET_LIST_END = split_bullet_list_format(BULLET_LIST_FORMAT)
+STATE_ENTRIES = dict((code, STATE_ENTRY_START + name + STATE_ENTRY_END) for code, name in US_STATES.items())
+NO_STATE_ENTRY = STATE_ENTRY_START + NO_STATE_INFO_TEXT + STATE_ENTRY_END
+
+
+def notes_prefix(make_state):
+    # the bulleted list of to_bullet_list up to its third entry
+    make, state_code = make_state
+    return BULLET_LIST_START + make + STATE_ENTRIES.get(state_code, NO_STATE_ENTRY)
+
+
+NOTES_PREFIXES = LookupCache(notes_prefix, NOTES_PREFIX_CACHE_SIZE)
+
+
+def get_cache_info():
+    # hits and misses of the conversion function caches since the process started, by cache name
+    return [('source_date_to_iso_date', source_date_to_iso_date.cache_info()),
+            ('yy_mm_to_iso_date', yy_mm_to_iso_date.cache_info()),
+            ('notes_prefix', NOTES_PREFIXES.cache_info())]
+
+
+EDT_HOURS = datetime.timedelta(hours=4)
+EST_HOURS = datetime.timedelta(hours=5)
 
 
 def convert_date_to_utc(the_date):
     # converts local file to YYYY-MM-DDTHH:MM:SS+04:00 etc
     # MD: date times are all in EST or EDT.
-    result = u''
-    edt_offset = datetime.timedelta(hours=4)
-    est_offset = datetime.timedelta(hours=5)
-
-    # Since all dates are > 2010: get 2nd Sunday in march and 1st Sunday in Nov for given year
-    year = the_date.year
-    from_date = datetime.datetime(year,3,1)
-    from_date = get_second_sunday(from_date)
-    to_date = datetime.datetime(year,11,1)
-    to_date = get_first_sunday(to_date)
-    # now establish if the date is in the fall/winter or spring/summer
+    from_date, to_date = get_dst_boundaries(the_date.year)
+    # now establish if the date is in the fall/winter or spring/summer.
+    # isoformat is a byte string on Python 2, adding the unicode offset makes the result unicode
     if to_date > the_date >= from_date:
-        the_date -= edt_offset
-        result = unicode(the_date.isoformat() + EDT_OFFSET)
-    else:
-        the_date -= est_offset
-        result = unicode(the_date.isoformat() + EST_OFFSET)
+        return (the_date - EDT_HOURS).isoformat() + EDT_OFFSET
+    return (the_date - EST_HOURS).isoformat() + EST_OFFSET
+
 
-    return result
+DST_BOUNDARIES = {}
+
+
+def get_dst_boundaries(year):
+    # returns the (start, end) datetimes of daylight saving time for the given year,
+    # computed once per year and kept in the DST_BOUNDARIES table
+    try:
+        return DST_BOUNDARIES[year]
+    except KeyError:
+        # Since all dates are > 2010: get 2nd Sunday in march and 1st Sunday in Nov for given year
+        from_date = datetime.datetime(year,3,1)
+        from_date = get_second_sunday(from_date)
+        to_date = datetime.datetime(year,11,1)
+        to_date = get_first_sunday(to_date)
+        DST_BOUNDARIES[year] = (from_date, to_date)
+        return from_date, to_date
 
 
 def get_first_sunday(from_date):
@@ -274,12 +734,58 @@ def get_second_sunday(from_date):
     return new_date
 
 
+# ------------------------------------------ Column Conversion Functions ------------------------------------------
+# Used by the columnar engine to convert a batch of rows one column at a time.
+# Each function takes a list of columns, one per source field of the mapping (each a list of values),
+# and returns the list of converted values. Results must be identical to applying the row function to each row.
+#
+# Low cardinality columns are converted once per distinct value and mapped back, like a categorical lookup.
+
+
+def map_distinct(fn, values):
+    # equivalent to [fn(value) for value in values] calling fn only once per distinct value
+    lookup = dict((value, fn(value)) for value in set(values))
+    return [lookup[value] for value in values]
+
+
+def dates_to_iso_dates(columns):
+    # violation dates are mostly distinct, source_date_to_iso_date memoizes the repeats
+    return [source_date_to_iso_date(in_date) for in_date in columns[0]]
+
+
+def currencies_to_integers(columns):
+    return map_distinct(lambda amount: currency_to_integer([amount]), columns[0])
+
+
+def years_months_to_dates(columns):
+    return map_distinct(lambda yy_mm: yy_mm_to_iso_date(*yy_mm), list(zip(columns[0], columns[1])))
+
+
+def to_bullet_lists(columns):
+    prefix = NOTES_PREFIXES.lookup
+    return [prefix((make, state)) + tag + BULLET_LIST_END for make, state, tag in zip(*columns)]
+
+
+def convert_columns_by_row(conversion_function, columns):
+    # fallback for conversion functions without a column version
+    return [conversion_function(list(fields)) for fields in zip(*columns)]
+
+
+COLUMN_CONVERSIONS = {
+        date_to_iso_date:       dates_to_iso_dates,
+        currency_to_integer:    currencies_to_integers,
+        year_month_to_date:     years_months_to_dates,
+        to_bullet_list:         to_bullet_lists
+}
+
+
 #--------------------- Field Mapping: List of Dictionary entries ---------------------
 # Each entry: { DESTINATION_KEY: <Rally Field>,
 #               SOURCE_KEY :<list of source columns>,
 #               CONVERSION_FUNCTION_KEY : <function>
 #             }
 # NOTE: To change/add a mapping, add/update the mapping dictionary and provide the appropriate conversion function.
+#       Mappings can also be loaded from a file with --mapping, see Mapping Configuration below.
 
 RALLY_MAPPING   = [{DESTINATION_KEY: u'Name',                SOURCE_KEY :[u'citation'],             CONVERSION_FUNCTION_KEY : None} ,
                    {DESTINATION_KEY: u'Description',         SOURCE_KEY :[u'Description'],          CONVERSION_FUNCTION_KEY : None } ,
@@ -288,29 +794,964 @@ RALLY_MAPPING   = [{DESTINATION_KEY: u'Name',                SOURCE_KEY :[u'cita
                    {DESTINATION_KEY: u'LicenseExpiration',   SOURCE_KEY :[u'expyy',u'expmm'],       CONVERSION_FUNCTION_KEY : year_month_to_date },
                    {DESTINATION_KEY: u'Notes',               SOURCE_KEY :[u'make',u'state',u'tag'], CONVERSION_FUNCTION_KEY : to_bullet_list }]
 
+# ------------------------ Mapping Configuration --------------------------
+# Mappings can be loaded from a JSON or YAML file instead of using RALLY_MAPPING. The file holds a list of
+# entries of the same form, with the conversion function given by its name in CONVERSION_FUNCTIONS, or null
+# to send the data as is (see rally_mapping.json), e.g.
+#   [{"destination": "Name", "source": ["citation"], "conversion": null},
+#    {"destination": "ViolationDate", "source": ["violDate"], "conversion": "date_to_iso_date"}]
+#
+# A validated mapping is cached as JSON in MAPPING_CACHE_FOLDER, named after the sha1 of the mapping file,
+# so short jobs do not parse YAML or validate the same mapping again.
+
+CONVERSION_FUNCTIONS = {
+        'date_to_iso_date':     date_to_iso_date,
+        'currency_to_integer':  currency_to_integer,
+        'year_month_to_date':   year_month_to_date,
+        'to_bullet_list':       to_bullet_list
+}
+
+
+def load_mapping(mapping_file, cache_folder=MAPPING_CACHE_FOLDER):
+    """ Loads a mapping list from a JSON or YAML mapping file.
+
+        :param  mapping_file: path of the mapping file, YAML if it has one of the YAML_EXTENSIONS
+        :param  cache_folder: folder of the cached mappings, None to not use the cache
+        :return list of mappings of the same form as RALLY_MAPPING
+    """
+    rootLogger.info(LOG_MSG_USING_MAPPING.format(mapping_file))
+    with io.open(mapping_file, 'rb') as the_file:
+        content = the_file.read()
+
+    cache_file = None
+    if cache_folder is not None:
+        cache_file = cache_folder + os.path.sep + hashlib.sha1(content).hexdigest() + '.json'
+        if os.path.isfile(cache_file):
+            rootLogger.info(LOG_MSG_MAPPING_CACHED.format(cache_file))
+            with io.open(cache_file, 'r', encoding='utf-8') as the_file:
+                return resolve_mapping(mapping_file, json.load(the_file))
+
+    entries = validate_mapping(mapping_file, parse_mapping(mapping_file, content))
+    # a JSON round trip gives the same (unicode) values as a mapping loaded from the cache
+    entries = json.loads(json.dumps(entries))
+    if cache_file is not None:
+        try:
+            os.mkdir(cache_folder)
+        except OSError:
+            # made by a concurrent job
+            if not os.path.isdir(cache_folder):
+                raise
+        # written to a temporary file first so a concurrent job never reads a partial cache file, or finds none
+        temp_file = cache_file + '.{0}'.format(os.getpid()) + TEMP_FILE_SUFFIX
+        with io.open(temp_file, 'w', encoding='utf-8') as the_file:
+            the_file.write(json.dumps(entries) + u'\n')
+        replace_file(temp_file, cache_file)
+    return resolve_mapping(mapping_file, entries)
+
+
+def parse_mapping(mapping_file, content):
+    # the mapping file content as Python objects
+    if mapping_file.endswith(YAML_EXTENSIONS):
+        # imported here so jobs using JSON mappings or the cache do not pay for importing it
+        try:
+            import yaml
+        except ImportError:
+            raise Exception(LOG_MSG_EXCEPT_YAML.format(mapping_file))
+        try:
+            return yaml.safe_load(content)
+        except yaml.YAMLError as e:
+            raise Exception(LOG_MSG_EXCEPT_MAPPING.format(mapping_file, e))
+    try:
+        return json.loads(content.decode('utf-8'))
+    except ValueError as e:
+        raise Exception(LOG_MSG_EXCEPT_MAPPING.format(mapping_file, e))
+
+
+def validate_mapping(mapping_file, entries):
+    # checks the structure of the mapping entries, returns them with only the known keys
+    def fail(reason):
+        raise Exception(LOG_MSG_EXCEPT_MAPPING.format(mapping_file, reason))
+
+    text_types = (type(u''), type(''))
+    if not isinstance(entries, list) or not entries:
+        fail('expected a list of mappings')
+    validated = []
+    destinations = set()
+    for idx, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            fail('mapping {0} is not a dictionary'.format(idx))
+        destination = entry.get(DESTINATION_KEY)
+        sources = entry.get(SOURCE_KEY)
+        conversion = entry.get(CONVERSION_FUNCTION_KEY)
+        if not isinstance(destination, text_types) or not destination:
+            fail('mapping {0} has no {1}'.format(idx, DESTINATION_KEY))
+        if destination in destinations:
+            fail('{0} is mapped more than once'.format(destination))
+        destinations.add(destination)
+        if not isinstance(sources, list) or not sources or not all(isinstance(col, text_types) for col in sources):
+            fail('{0}: {1} must be a list of column names'.format(destination, SOURCE_KEY))
+        if conversion is not None and conversion not in CONVERSION_FUNCTIONS:
+            fail('{0}: unknown conversion function {1}'.format(destination, conversion))
+        validated.append({DESTINATION_KEY: destination, SOURCE_KEY: sources, CONVERSION_FUNCTION_KEY: conversion})
+    return validated
+
+
+def resolve_mapping(mapping_file, entries):
+    # replaces the conversion function names with the functions
+    mapping_list = []
+    for entry in entries:
+        conversion = entry[CONVERSION_FUNCTION_KEY]
+        if conversion is not None and conversion not in CONVERSION_FUNCTIONS:
+            raise Exception(LOG_MSG_EXCEPT_MAPPING.format(mapping_file,
+                                                          'unknown conversion function {0}'.format(conversion)))
+        mapping_list.append({DESTINATION_KEY: entry[DESTINATION_KEY], SOURCE_KEY: entry[SOURCE_KEY],
+                             CONVERSION_FUNCTION_KEY: CONVERSION_FUNCTIONS.get(conversion)})
+    return mapping_list
+
 
 # ------------------------ Validation Rules --------------------------------
 
+# These functions re-read the files after the conversion. The stream validators (see RowCountValidator)
+# check the conversion as it runs without reading the files again.
+
 def validate_row_counts(source_file, destination_file):
     # simple row count validation
-    success = False
-    with io.open(source_file, 'r', encoding='utf-8') as src_file, \
-                            io.open(destination_file, 'r', encoding='utf-8') as dest_file:
-        count_source = sum(1 for _ in src_file)
-        count_dest = sum(1 for _ in dest_file)
-        success = (count_source == count_dest)
-        rootLogger.info(LOG_MSG_VERIFY_COUNT.format(count_source, count_dest))
+    count_source = count_lines(source_file)
+    count_dest = count_lines(destination_file)
+    success = (count_source == count_dest)
+    rootLogger.info(LOG_MSG_VERIFY_COUNT.format(count_source, count_dest))
     return success
 
+
+def count_lines(file_path):
+    # counts the newlines of the memory mapped file in large blocks, without decoding.
+    # A last line without a newline is counted too, the same as iterating over the file.
+    file_size = os.path.getsize(file_path)
+    if file_size == 0:
+        return 0
+    count = 0
+    with io.open(file_path, 'rb') as the_file:
+        mapped = mmap.mmap(the_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for start in range(0, file_size, COUNT_BLOCK_SIZE):
+                count += mapped[start:start + COUNT_BLOCK_SIZE].count(b'\n')
+            if mapped[file_size - 1:file_size] != b'\n':
+                count += 1
+        finally:
+            mapped.close()
+    return count
+
+
+def file_hash(file_path):
+    # sha1 hex digest of the file content
+    digest = hashlib.sha1()
+    with io.open(file_path, 'rb') as the_file:
+        for block in iter(lambda: the_file.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_source_info(source_file):
+    # the size, modification time and content hash of a source file, taken before it is converted so a change
+    # made during the conversion is found by the next run
+    file_stat = os.stat(source_file)
+    return {SOURCE_SIZE_KEY: file_stat.st_size, SOURCE_MTIME_KEY: file_stat.st_mtime,
+            SOURCE_HASH_KEY: file_hash(source_file)}
+
+# ------------------------ CSV Reader and Writer Functions --------------------------
+# Readers take an iterable of source lines and yield each record as a list of fields. If the last record
+# continues past the end of lines (a quoted line break), the rest of it is read from the more_lines iterator.
+# Writers take a list of destination values and return the formatted line.
+#
+# The RFC 4180 reader and writer handle quoted fields, but only lines that contain a quote
+# (or values that need quoting) leave the plain split/join fast path.
+#
+# Given max_split, readers split a record into at most max_split + 1 fields: the fields after the first
+# max_split are left as one, formatted as the writer would, so the columns a conversion does not use are
+# not tokenized. A record with quotes only in those columns still takes the plain split path.
+
+
+def read_csv_rows(lines, more_lines=None, max_split=-1):
+    lines = iter(lines)
+    for line in lines:
+        if CSV_QUOTE not in line:
+            yield line.rstrip(u'\n').split(CSV_SEP, max_split)
+        else:
+            # a quoted field may contain line breaks, the record is complete once its quotes are balanced
+            while line.count(CSV_QUOTE) % 2:
+                next_line = next(lines, None)
+                if next_line is None and more_lines is not None:
+                    next_line = next(more_lines, None)
+                if next_line is None:
+                    break
+                line += next_line
+            record = line.rstrip(u'\n')
+            fields = record.split(CSV_SEP, max_split)
+            if 0 <= max_split < len(fields) and CSV_QUOTE not in record[:-len(fields[-1]) or None]:
+                yield fields
+            else:
+                yield join_fields_after(parse_csv_record(record), max_split, CSV_SEP, quote_csv_field)
+
+
+def parse_csv_record(record):
+    # parses a single record containing quoted fields with the csv module
+    if sys.version_info[0] == 2:
+        # the Python 2 csv module only reads byte strings
+        return [field.decode('utf-8') for field in next(csv.reader([record.encode('utf-8')]))]
+    return next(csv.reader([record]))
+
+
+def join_fields_after(fields, max_split, separator, quote_field):
+    # the fields after the first max_split joined back into one, as a reader given max_split returns them
+    if 0 <= max_split < len(fields):
+        fields[max_split:] = [separator.join([quote_field(field) for field in fields[max_split:]])]
+    return fields
+
+
+def format_csv_row(values):
+    line = CSV_SEP.join(values)
+    if CSV_QUOTE in line or u'\n' in line or u'\r' in line or line.count(CSV_SEP) >= len(values):
+        line = CSV_SEP.join([quote_csv_field(value) for value in values])
+    return line + u'\n'
+
+
+def quote_csv_field(value):
+    # quotes a value only if it contains a quote, separator or line break
+    if CSV_QUOTE in value or CSV_SEP in value or u'\n' in value or u'\r' in value:
+        return CSV_QUOTE + value.replace(CSV_QUOTE, CSV_QUOTE + CSV_QUOTE) + CSV_QUOTE
+    return value
+
+
+def split_rows(lines, more_lines=None, max_split=-1):
+    # plain reader: no quoting, every separator splits a field
+    for line in lines:
+        yield line.rstrip(u'\n').split(CSV_SEP, max_split)
+
+
+def join_row(values):
+    # plain writer: values are written as is
+    return CSV_SEP.join(values) + u'\n'
+
+
+CSV_FORMATS = {
+        RFC4180_CSV:    (read_csv_rows, format_csv_row),
+        SIMPLE_CSV:     (split_rows, join_row)
+}
+
+# ------------------------ Byte Mode Functions --------------------------
+# The byte mode pipeline reads, splits, joins and writes UTF-8 bytes. Fields are decoded only for the
+# conversion functions that use them, columns sent as is are never decoded or encoded.
+# Line endings are normalized the same as the text pipeline so both produce identical output.
+#
+# Decoding fields one at a time costs more than decoding whole lines, so conversion results are kept by the
+# raw field bytes and repeated values are neither decoded nor converted again. As with the columnar engine,
+# conversion functions must return the same result for the same fields.
+# On Python 3 decoding whole lines is cheap and the text pipeline is the faster of the two.
+
+
+def read_csv_byte_rows(lines, more_lines=None, max_split=-1):
+    # read_csv_rows for lines of bytes, quoted records are decoded and parsed by parse_csv_record
+    lines = iter(lines)
+    for line in lines:
+        if CSV_QUOTE_BYTES not in line:
+            yield line.rstrip(b'\r\n').split(CSV_SEP_BYTES, max_split)
+        else:
+            while line.count(CSV_QUOTE_BYTES) % 2:
+                next_line = next(lines, None)
+                if next_line is None and more_lines is not None:
+                    next_line = next(more_lines, None)
+                if next_line is None:
+                    break
+                line += next_line
+            record = line.replace(b'\r\n', b'\n').rstrip(b'\n')
+            fields = record.split(CSV_SEP_BYTES, max_split)
+            if 0 <= max_split < len(fields) and CSV_QUOTE_BYTES not in record[:-len(fields[-1]) or None]:
+                yield fields
+            else:
+                fields = [field.encode('utf-8') for field in parse_csv_record(record.decode('utf-8'))]
+                yield join_fields_after(fields, max_split, CSV_SEP_BYTES, quote_csv_byte_field)
+
+
+def format_csv_byte_row(values):
+    # format_csv_row for values of bytes
+    line = CSV_SEP_BYTES.join(values)
+    if CSV_QUOTE_BYTES in line or b'\n' in line or b'\r' in line or line.count(CSV_SEP_BYTES) >= len(values):
+        line = CSV_SEP_BYTES.join([quote_csv_byte_field(value) for value in values])
+    return line + b'\n'
+
+
+def quote_csv_byte_field(value):
+    if CSV_QUOTE_BYTES in value or CSV_SEP_BYTES in value or b'\n' in value or b'\r' in value:
+        return CSV_QUOTE_BYTES + value.replace(CSV_QUOTE_BYTES, CSV_QUOTE_BYTES + CSV_QUOTE_BYTES) + CSV_QUOTE_BYTES
+    return value
+
+
+def split_byte_rows(lines, more_lines=None, max_split=-1):
+    for line in lines:
+        yield line.rstrip(b'\r\n').split(CSV_SEP_BYTES, max_split)
+
+
+def join_byte_row(values):
+    return CSV_SEP_BYTES.join(values) + b'\n'
+
+
+CSV_BYTE_FORMATS = {
+        RFC4180_CSV:    (read_csv_byte_rows, format_csv_byte_row),
+        SIMPLE_CSV:     (split_byte_rows, join_byte_row)
+}
+
+
+def cached_byte_conversion(conversion_function, single_field):
+    """ Wraps a conversion function to convert UTF-8 fields to UTF-8 bytes.
+
+        :param  conversion_function: function that takes a list of unicode fields, see RALLY_MAPPING
+        :param  single_field: True if the wrapper is called with a single field rather than a tuple of fields
+        :return function of the field(s) that caches up to BYTE_CONVERSION_CACHE_SIZE results
+    """
+    cache = {}
+
+    def convert(fields):
+        result = cache.get(fields)
+        if result is None:
+            if len(cache) >= BYTE_CONVERSION_CACHE_SIZE:
+                cache.clear()
+            decoded = [fields.decode('utf-8')] if single_field else [field.decode('utf-8') for field in fields]
+            result = cache[fields] = conversion_function(decoded).encode('utf-8')
+        return result
+    return convert
+
+
+def convert_byte_columns(column_function, columns):
+    # column conversion for byte mode, whole columns are decoded and encoded at once
+    return encode_column(column_function([decode_column(column) for column in columns]))
+
+
+def decode_column(values):
+    # decodes a list of UTF-8 values with a single decode rather than one per value
+    decoded = COLUMN_JOIN.encode('utf-8').join(values).decode('utf-8').split(COLUMN_JOIN)
+    if len(decoded) != len(values):
+        # a value contains COLUMN_JOIN (or there are no values)
+        decoded = [value.decode('utf-8') for value in values]
+    return decoded
+
+
+def encode_column(values):
+    encoded = COLUMN_JOIN.join(values).encode('utf-8').split(COLUMN_JOIN.encode('utf-8'))
+    if len(encoded) != len(values):
+        encoded = [value.encode('utf-8') for value in values]
+    return encoded
+
+# ------------------------ File Chunking Functions --------------------------
+# Used to split a source file into byte ranges on line boundaries so they can be converted in parallel,
+# and to read the lines of a memory mapped source file
+
+
+def read_header_line(source_file):
+    """ Reads the header row of a source file.
+
+        :param  source_file: source file path
+        :return tuple of the unicode header line (without line ending) and the byte offset of the first data row
+    """
+    with io.open(source_file, 'rb') as src_file:
+        header_line = src_file.readline()
+        data_start = src_file.tell()
+    return header_line.decode('utf-8').rstrip(u'\r\n'), data_start
+
+
+def get_line_aligned_ranges(source_file, start, chunk_size, quoted=False):
+    """ Splits a source file into byte ranges of roughly chunk_size bytes, each ending on a line boundary.
+
+        :param  source_file: source file path
+        :param  start: byte offset to start from (normally the offset of the first data row)
+        :param  chunk_size: target size in bytes of each range
+        :param  quoted: whether fields may be quoted (RFC 4180), so a line break can be part of a field. Ranges then
+                end on a line break outside quotes, found by counting the quote characters from start: each one
+                opens or closes a quoted field, or is one of the pair that escapes a quote within one.
+        :return list of (start, end) byte offset tuples covering the file from start to the end of file
+    """
+    ranges = []
+    file_size = os.path.getsize(source_file)
+    quote_count = 0
+    with io.open(source_file, 'rb') as src_file:
+        src_file.seek(start)
+        while start < file_size:
+            end = start + chunk_size
+            if end >= file_size:
+                end = file_size
+            elif not quoted:
+                # move the end of the range forward to the end of the line it falls in
+                src_file.seek(end - 1)
+                src_file.readline()
+                end = src_file.tell()
+            else:
+                # the same, but to the end of the first line that is not within a quoted field
+                quote_count += _count_quotes(src_file, end - 1)
+                line = src_file.readline()
+                quote_count += line.count(b'"')
+                while line and quote_count % 2:
+                    line = src_file.readline()
+                    quote_count += line.count(b'"')
+                end = src_file.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _count_quotes(src_file, end):
+    # the number of quote characters from the position of src_file to byte offset end, where it is left
+    count = 0
+    while src_file.tell() < end:
+        block = src_file.read(min(READ_BUFFER_SIZE, end - src_file.tell()))
+        if not block:
+            break
+        count += block.count(b'"')
+    return count
+
+
+def read_mapped_lines(mapped, start=0, end=None, block_size=MMAP_BLOCK_SIZE):
+    """ Reads the lines of a memory mapped file.
+
+        The mapped file is cut into blocks of about block_size bytes on line boundaries and each block is split
+        into lines, so no read buffer is filled and the lines are iterated without a call per line.
+
+        :param  mapped: mmap of the source file
+        :param  start: byte offset (on a line boundary) of the first line
+        :param  end: byte offset (on a line boundary) to stop at, None to read to the end of the file
+        :param  block_size: target size in bytes of the blocks the lines are split from
+        :return iterator of the lines as bytes, with their line endings
+    """
+    if end is None:
+        end = len(mapped)
+    return itertools.chain.from_iterable(_read_mapped_blocks(mapped, start, end, block_size))
+
+
+def _read_mapped_blocks(mapped, position, end, block_size):
+    # yields the lines of each block as a list. Lines end at b'\n' only, as when a file is read in byte mode, so a
+    # lone b'\r' stays part of its line (bytes.splitlines would also end lines at b'\r' and other separators)
+    while position < end:
+        block_end = min(position + block_size, end)
+        if block_end < end:
+            # the block ends after the last line that ends in it
+            newline = mapped.rfind(b'\n', position, block_end)
+            if newline == -1:
+                newline = mapped.find(b'\n', block_end, end)
+            block_end = end if newline == -1 else newline + 1
+        yield io.BytesIO(mapped[position:block_end]).readlines()
+        position = block_end
+
+# ------------------------ Data Source and Sink Functions --------------------------
+# File paths are turned into sources and sinks by their extension, STDIO_PATH stands for stdin/stdout
+
+
+def get_compressed_file_opener(path):
+    # the function that opens a compressed file, chosen by extension
+    if path.endswith(GZIP_EXTENSION):
+        return gzip.open
+    if path.endswith(BZIP2_EXTENSION):
+        return bz2.BZ2File
+    if path.endswith(XZ_EXTENSION):
+        if lzma is None:
+            raise Exception(LOG_MSG_EXCEPT_COMPRESSION.format(XZ_EXTENSION))
+        return lzma.open
+    return None
+
+
+def is_plain_file_path(path):
+    return path != STDIO_PATH and get_compressed_file_opener(path) is None
+
+
+def replace_file(temp_file, file_path):
+    # renames a completed temporary file to file_path, replacing it.
+    # os.replace is atomic, before Python 3.3 os.rename can not replace a file on Windows
+    if hasattr(os, 'replace'):
+        os.replace(temp_file, file_path)
+        return
+    if os.path.isfile(file_path):
+        os.remove(file_path)
+    os.rename(temp_file, file_path)
+
+
+def as_data_source(source):
+    # a DataSource for a file path or STDIO_PATH, sources are returned as is
+    if isinstance(source, DataSource):
+        return source
+    if source == STDIO_PATH:
+        return StdinSource()
+    if get_compressed_file_opener(source) is not None:
+        return CompressedFileSource(source)
+    return FileSource(source)
+
+
+def as_data_sink(destination):
+    # a DataSink for a file path or STDIO_PATH, sinks are returned as is
+    if isinstance(destination, DataSink):
+        return destination
+    if destination == STDIO_PATH:
+        return StdoutSink()
+    if get_compressed_file_opener(destination) is not None:
+        return CompressedFileSink(destination)
+    return FileSink(destination)
+
 # ----------------------  Classes ------------------------------------------
 
+"""
+Class:  SourceLineReader
+
+        Iterates the decoded lines of a binary source file, keeping track of the byte offset reached.
+        Line endings are normalized to '\n' to match reading the file in text mode.
+
+        :param  src_file: source file opened in binary mode, lines are read from its current position
+        :param  end: byte offset (on a line boundary) to stop at, None to read to the end of the file
+        :param  decode: if False the lines are returned as bytes
+"""
+
+
+class SourceLineReader(object):
+    def __init__(self, src_file, end=None, decode=True):
+        self._src_file = src_file
+        self._end = end
+        self._decode = decode
+        try:
+            self.position = src_file.tell()
+        except (IOError, OSError):
+            # a pipe - the position is only known relative to where reading starts
+            self.position = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._end is not None and self.position >= self._end:
+            raise StopIteration
+        line = self._src_file.readline()
+        if not line:
+            raise StopIteration
+        self.position += len(line)
+        if line.endswith(b'\r\n'):
+            line = line[:-2] + b'\n'
+        return line.decode('utf-8') if self._decode else line
+
+    next = __next__
+
+    def seek(self, position):
+        self._src_file.seek(position)
+        self.position = position
+
+
+"""
+Class:  DataSource, FileSource, CompressedFileSource, StdinSource, MemorySource
+
+        Sources of CSV data for a Converter. open_lines is a context manager that provides an iterator of the
+        unicode source lines, open_binary one that provides the binary stream. Only a FileSource has a path,
+        the other sources can be read once from the start.
+
+        FileSource reads a plain file. CompressedFileSource decompresses a gzip, bzip2 or xz file as it is read,
+        StdinSource reads standard input and MemorySource reads a byte or unicode string.
+
+        :param  path: file path (FileSource, CompressedFileSource)
+        :param  data: the CSV data (MemorySource)
+"""
+
+
+class DataSource(object):
+    path = None
+    name = None
+
+    def open(self, buffer_size=READ_BUFFER_SIZE):
+        # binary stream of the source data
+        raise NotImplementedError
+
+    def size(self):
+        # size of the source data in bytes, or None if it is not known before reading it
+        return None
+
+    @contextlib.contextmanager
+    def open_binary(self, buffer_size=READ_BUFFER_SIZE):
+        src_file = self.open(buffer_size)
+        try:
+            yield src_file
+        finally:
+            src_file.close()
+
+    @contextlib.contextmanager
+    def open_lines(self, buffer_size=READ_BUFFER_SIZE):
+        with self.open_binary(buffer_size) as src_file:
+            yield SourceLineReader(src_file)
+
+
+class FileSource(DataSource):
+    def __init__(self, path):
+        self.path = path
+        self.name = path
+
+    def open(self, buffer_size=READ_BUFFER_SIZE):
+        return io.open(self.path, 'rb', buffering=buffer_size)
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def open_lines(self, buffer_size=READ_BUFFER_SIZE):
+        # decoding in the io module is faster than SourceLineReader
+        return io.open(self.path, 'r', encoding='utf-8', buffering=buffer_size)
+
+    @contextlib.contextmanager
+    def open_mapped_lines(self, start=0, end=None):
+        # the lines between start and end of the memory mapped file as bytes, see read_mapped_lines
+        with io.open(self.path, 'rb') as src_file:
+            if os.fstat(src_file.fileno()).st_size == 0:
+                # an empty file cannot be mapped
+                yield iter([])
+                return
+            mapped = mmap.mmap(src_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield read_mapped_lines(mapped, start, end)
+            finally:
+                mapped.close()
+
+
+class CompressedFileSource(DataSource):
+    def __init__(self, path):
+        self.name = path
+        self._path = path
+        self._open = get_compressed_file_opener(path)
+
+    def open(self, buffer_size=READ_BUFFER_SIZE):
+        return self._open(self._path, 'rb')
+
+
+class StdinSource(DataSource):
+    name = '<stdin>'
+
+    def open(self, buffer_size=READ_BUFFER_SIZE):
+        return getattr(sys.stdin, 'buffer', sys.stdin)
+
+    @contextlib.contextmanager
+    def open_binary(self, buffer_size=READ_BUFFER_SIZE):
+        # standard input is left open
+        yield self.open(buffer_size)
+
+
+class MemorySource(DataSource):
+    name = '<memory>'
+
+    def __init__(self, data):
+        self._data = data.encode('utf-8') if isinstance(data, type(u'')) else data
+
+    def open(self, buffer_size=READ_BUFFER_SIZE):
+        return io.BytesIO(self._data)
+
+    def size(self):
+        return len(self._data)
+
+
+"""
+Class:  DataSink, FileSink, CompressedFileSink, StdoutSink, MemorySink
+
+        Destinations of the CSV data written by a Converter. open_text is a context manager that provides an
+        object with the write and writelines methods of a unicode text file, open_binary one that provides the
+        binary stream. Only a FileSink has a path.
+
+        FileSink writes a plain file. CompressedFileSink compresses to a gzip, bzip2 or xz file as it is written,
+        StdoutSink writes to standard output and MemorySink keeps the data, see getvalue.
+
+        :param  path: file path (FileSink, CompressedFileSink)
+        :param  opener: function that opens the file (CompressedFileSink), chosen by the extension of path if None
+"""
+
+
+class DataSink(object):
+    path = None
+    name = None
+
+    def open(self, buffer_size=WRITE_BUFFER_SIZE):
+        # binary stream the destination data is written to
+        raise NotImplementedError
+
+    def size(self):
+        # bytes written, or None if it is not known
+        return None
+
+    @contextlib.contextmanager
+    def open_binary(self, buffer_size=WRITE_BUFFER_SIZE):
+        dest_file = self.open(buffer_size)
+        try:
+            yield dest_file
+        finally:
+            dest_file.close()
+
+    @contextlib.contextmanager
+    def open_text(self, buffer_size=WRITE_BUFFER_SIZE):
+        with self.open_binary(buffer_size) as dest_file:
+            yield TextSinkWriter(dest_file)
+
+
+class TextSinkWriter(object):
+    # encodes the unicode text written to a binary stream
+    def __init__(self, dest_file):
+        self._dest_file = dest_file
+
+    def write(self, text):
+        self._dest_file.write(text.encode('utf-8'))
+
+    def writelines(self, lines):
+        self._dest_file.write(u''.join(lines).encode('utf-8'))
+
+
+class FileSink(DataSink):
+    def __init__(self, path):
+        self.path = path
+        self.name = path
+
+    def open(self, buffer_size=WRITE_BUFFER_SIZE):
+        return io.open(self.path, 'wb', buffering=buffer_size)
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def open_text(self, buffer_size=WRITE_BUFFER_SIZE):
+        return io.open(self.path, 'w', encoding='utf-8', buffering=buffer_size)
+
+
+class CompressedFileSink(DataSink):
+    def __init__(self, path, opener=None):
+        self.name = path
+        self._path = path
+        self._open = opener or get_compressed_file_opener(path)
+
+    def open(self, buffer_size=WRITE_BUFFER_SIZE):
+        return self._open(self._path, 'wb')
+
+    def size(self):
+        return os.path.getsize(self._path)
+
+
+class StdoutSink(DataSink):
+    name = '<stdout>'
+
+    def open(self, buffer_size=WRITE_BUFFER_SIZE):
+        return getattr(sys.stdout, 'buffer', sys.stdout)
+
+    @contextlib.contextmanager
+    def open_binary(self, buffer_size=WRITE_BUFFER_SIZE):
+        # standard output is flushed but left open
+        dest_file = self.open(buffer_size)
+        try:
+            yield dest_file
+        finally:
+            dest_file.flush()
+
+
+class MemorySink(DataSink):
+    name = '<memory>'
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+
+    @contextlib.contextmanager
+    def open_binary(self, buffer_size=WRITE_BUFFER_SIZE):
+        self._buffer = io.BytesIO()
+        yield self._buffer
+
+    def size(self):
+        return len(self._buffer.getvalue())
+
+    def getvalue(self):
+        # the data written, as a unicode string
+        return self._buffer.getvalue().decode('utf-8')
+
+
+"""
+Class:  ShardedFileSink, ShardWriter
+
+        Destination split into numbered shard files, for importers that can not take one large file or that load
+        several files in parallel. A new shard is started before a row that would take the current one past
+        max_rows rows or max_bytes bytes, and every shard starts with the header row (the first write).
+        A record is never split across shards.
+
+        Each shard is written to a temporary file and renamed once complete. After every shard the manifest is
+        rewritten the same way, listing the shards completed so far with their row count, size and SHA-1, so
+        uploads can start on the shards listed while the conversion is still running. 'complete' is set in the
+        manifest once the last shard is written. Shards listed in the manifest of an earlier run are removed
+        when the sink is opened.
+
+        :param  path: destination file path, the shards are named after it (SHARD_FILE_FORMAT) and the manifest
+                is MANIFEST_FILE_FORMAT
+        :param  max_rows: maximum rows per shard, not counting the header. None for no limit
+        :param  max_bytes: maximum size of a shard in bytes, None for no limit. A shard holds at least one row.
+"""
+
+
+class ShardedFileSink(DataSink):
+    def __init__(self, path, max_rows=None, max_bytes=None):
+        self.name = path
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.manifest_file = MANIFEST_FILE_FORMAT.format(path)
+        self.shards = []
+        self._root, self._extension = os.path.splitext(path)
+
+    def shard_path(self, number):
+        return SHARD_FILE_FORMAT.format(self._root, number, self._extension)
+
+    def open(self, buffer_size=WRITE_BUFFER_SIZE):
+        self._remove_shards()
+        return ShardWriter(self, buffer_size)
+
+    def size(self):
+        return sum(shard[SHARD_BYTES_KEY] for shard in self.shards)
+
+    @contextlib.contextmanager
+    def open_binary(self, buffer_size=WRITE_BUFFER_SIZE):
+        # a conversion that fails leaves the shards completed so far and an incomplete manifest
+        writer = self.open(buffer_size)
+        try:
+            yield writer
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+
+    @contextlib.contextmanager
+    def open_text(self, buffer_size=WRITE_BUFFER_SIZE):
+        with self.open_binary(buffer_size) as writer:
+            writer.encode_text = True
+            yield writer
+
+    def add_shard(self, shard_file, rows, byte_count, sha1):
+        self.shards.append({SHARD_FILE_KEY: os.path.basename(shard_file), ROWS_KEY: rows,
+                            SHARD_BYTES_KEY: byte_count, SHARD_SHA1_KEY: sha1})
+        rootLogger.info(LOG_MSG_SHARD_DONE.format(shard_file, rows, byte_count))
+        self.write_manifest(False)
+
+    def write_manifest(self, complete):
+        manifest = {SHARDS_KEY: self.shards, ROWS_KEY: sum(shard[ROWS_KEY] for shard in self.shards),
+                    COMPLETE_KEY: complete}
+        temp_file = self.manifest_file + TEMP_FILE_SUFFIX
+        with io.open(temp_file, 'w', encoding='utf-8') as the_file:
+            the_file.write(text_type(json.dumps(manifest, indent=2, separators=(',', ': '), sort_keys=True)) + u'\n')
+        replace_file(temp_file, self.manifest_file)
+
+    def _remove_shards(self):
+        # the manifest and shards of an earlier run
+        if os.path.isfile(self.manifest_file):
+            try:
+                with io.open(self.manifest_file, 'r', encoding='utf-8') as the_file:
+                    shards = json.load(the_file)[SHARDS_KEY]
+            except (ValueError, KeyError):
+                shards = []
+            folder = os.path.dirname(self.manifest_file)
+            for shard in shards:
+                shard_file = os.path.join(folder, shard[SHARD_FILE_KEY])
+                if os.path.isfile(shard_file):
+                    os.remove(shard_file)
+            os.remove(self.manifest_file)
+        self.shards = []
+
+
+class ShardWriter(object):
+    # the writer of a ShardedFileSink, takes the write and writelines calls of a Converter
+    def __init__(self, sink, buffer_size):
+        self.encode_text = False
+        self._sink = sink
+        self._buffer_size = buffer_size
+        self._header = None
+        self._file = None
+        self._shard_file = None
+        self._rows = 0
+        self._bytes = 0
+        self._digest = None
+
+    def write(self, data):
+        # the first write is the header row
+        if self.encode_text:
+            data = data.encode('utf-8')
+        if self._header is None:
+            self._header = data
+        else:
+            self._write_lines([data])
+
+    def writelines(self, lines):
+        if self.encode_text:
+            # encoded a line at a time, the size of each is needed for max_bytes
+            lines = [line.encode('utf-8') for line in lines]
+        self._write_lines(lines)
+
+    def close(self):
+        # the source had no rows, the destination is a shard with just the header
+        if self._file is None and not self._sink.shards and self._header is not None:
+            self._start_shard()
+        if self._file is not None:
+            self._finish_shard()
+        self._sink.write_manifest(True)
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            os.remove(self._shard_file + TEMP_FILE_SUFFIX)
+            self._file = None
+
+    def _write_lines(self, lines):
+        while lines:
+            if self._file is None:
+                self._start_shard()
+            count = self._count_rows_that_fit(lines)
+            if count < len(lines):
+                data = b''.join(lines[:count])
+                lines = lines[count:]
+            else:
+                data = b''.join(lines)
+                lines = None
+            self._file.write(data)
+            self._digest.update(data)
+            self._rows += count
+            self._bytes += len(data)
+            if lines:
+                self._finish_shard()
+
+    def _count_rows_that_fit(self, lines):
+        # the number of the lines that can be added to the current shard, at least one if it has no rows yet
+        count = len(lines)
+        if self._sink.max_rows:
+            count = min(count, self._sink.max_rows - self._rows)
+        if self._sink.max_bytes:
+            room = self._sink.max_bytes - self._bytes
+            for idx in range(count):
+                room -= len(lines[idx])
+                if room < 0:
+                    count = idx
+                    break
+        if self._rows == 0:
+            return max(count, 1)
+        return count
+
+    def _start_shard(self):
+        header = self._header or b''
+        self._shard_file = self._sink.shard_path(len(self._sink.shards) + 1)
+        self._file = io.open(self._shard_file + TEMP_FILE_SUFFIX, 'wb', buffering=self._buffer_size)
+        self._file.write(header)
+        self._digest = hashlib.sha1(header)
+        self._rows = 0
+        self._bytes = len(header)
+
+    def _finish_shard(self):
+        # the shard is on disk before it is renamed and listed in the manifest
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        replace_file(self._shard_file + TEMP_FILE_SUFFIX, self._shard_file)
+        self._sink.add_shard(self._shard_file, self._rows, self._bytes, self._digest.hexdigest())
+
+
 """
 Class:  ConversionRule
 
         This class encapsulates the single entry from a mapping list which holds the transformation logic.
 
-        As each line of the source file is processed, the rule is updated to insert the data from the row columns.
-        The 'execute' method then performs the transformation from source field(s) to destination field
+        A rule holds no per-row or per-file state. Once the column positions of its source fields are known
+        (from the source file header) the rule is compiled into a step of a ConversionPlan.
+        The 'execute' method performs the transformation from source field(s) to destination field for a
+        single list of field values.
 
         :param  output_column_index: position of the output in the destination file (Integer)
         :param  destination_field: name of the column in the destination file (string)
@@ -321,37 +1762,32 @@ Class:  ConversionRule
 
 
 class ConversionRule(object):
+    __slots__ = ('_output_column_index', '_destination_field', '_source_fields', '_convert_function')
+
     def __init__(self, output_column_index, destination_field, source_columns, conversion_function=None):
         self._output_column_index = output_column_index
         self._destination_field = destination_field
-        self._source_fields = source_columns
+        self._source_fields = tuple(source_columns)
         self._convert_function = conversion_function
-        self._source_data_indexes = []
-        self._data_list = []
-
-    @property
-    def source_data_indexes(self):
-        return self._source_data_indexes
-
-    @source_data_indexes.setter
-    def source_data_indexes(self, value):
-        self._source_data_indexes = value
-
-    @property
-    def data_list(self):
-        return self._data_list
-
-    @data_list.setter
-    def data_list(self, value):
-        self._data_list = value
 
-    def execute(self):
+    def execute(self, data_list):
         # if no conversion routine we just send the data as is.
-        result = self._data_list[0]
+        result = data_list[0]
         if self._convert_function:
-            result = self._convert_function(self._data_list)
+            result = self._convert_function(data_list)
         return result
 
+    def compile(self, source_data_indexes):
+        # returns a (getter, conversion function) step that converts a split source row.
+        # getter fetches the rule's field(s) from the row, conversion function is None if the data is sent as is.
+        if not self._convert_function:
+            return operator.itemgetter(source_data_indexes[0]), None
+        if len(source_data_indexes) == 1:
+            # a slice keeps the single field in a list, as the conversion functions expect
+            idx = source_data_indexes[0]
+            return operator.itemgetter(slice(idx, idx + 1)), self._convert_function
+        return operator.itemgetter(*source_data_indexes), self._convert_function
+
     @property
     def source_columns(self):
         return self._source_fields
@@ -360,11 +1796,806 @@ class ConversionRule(object):
     def output_column_name(self):
         return self._destination_field
 
+    @property
+    def conversion_function(self):
+        return self._convert_function
+
+
+"""
+Class:  ConversionPlan
+
+        The compiled form of a list of ConversionRules for one source file layout.
+
+        Built once from the source header row, the plan is a flat tuple of (getter, conversion function) steps,
+        one per rule in destination column order. The plan is immutable so it can be shared between threads.
+
+        'execute' converts a single row. 'execute_columns' converts a batch of rows column by column using the
+        COLUMN_CONVERSIONS version of each conversion function where there is one.
+
+        :param  rules: list of ConversionRule objects
+        :param  column_indexes: list with, for each rule, the list of source column positions of its source fields
+        :param  byte_mode: if True the rows are lists of UTF-8 bytes. Only the fields passed to a conversion
+                function are decoded, and its result encoded.
+"""
+
+
+class ConversionPlan(object):
+    __slots__ = ('_rules', '_column_indexes', '_steps', '_column_steps')
+
+    def __init__(self, rules, column_indexes, byte_mode=False):
+        self._rules = tuple(rules)
+        self._column_indexes = tuple(tuple(indexes) for indexes in column_indexes)
+        self._steps = tuple(rule.compile(indexes) for rule, indexes in zip(self._rules, self._column_indexes))
+        self._column_steps = tuple(self._compile_column_step(rule, indexes)
+                                   for rule, indexes in zip(self._rules, self._column_indexes))
+        if byte_mode:
+            self._steps = tuple(self._compile_byte_step(rule, indexes, step)
+                                for rule, indexes, step in zip(self._rules, self._column_indexes, self._steps))
+            self._column_steps = tuple(self._compile_byte_column_step(rule, step)
+                                       for rule, step in zip(self._rules, self._column_steps))
+
+    def execute(self, line_data):
+        # converts a split source row to the list of destination values
+        return [get(line_data) if convert is None else convert(get(line_data)) for get, convert in self._steps]
+
+    def execute_checked(self, line_data):
+        # same as execute, but returns (destination values, None), or (None, (rule, exception)) for the first rule
+        # that fails to convert the row
+        values = []
+        for rule, (get, convert) in zip(self._rules, self._steps):
+            try:
+                values.append(get(line_data) if convert is None else convert(get(line_data)))
+            except Exception as e:
+                return None, (rule, e)
+        return values, None
+
+    def execute_columns(self, rows):
+        # converts a list of split source rows to a list of destination value lists
+        out_columns = [self._execute_column_step(step, rows) for step in self._column_steps]
+        return list(zip(*out_columns))
+
+    def execute_profiled(self, rows, rule_seconds, columnar=False):
+        # same result as execute for each row (or execute_columns if columnar), but converts the rows
+        # one rule at a time, adding the time taken by each rule to rule_seconds
+        out_columns = []
+        for idx, (get, convert) in enumerate(self._steps):
+            start = timer()
+            if columnar:
+                out_columns.append(self._execute_column_step(self._column_steps[idx], rows))
+            elif convert is None:
+                out_columns.append([get(row) for row in rows])
+            else:
+                out_columns.append([convert(get(row)) for row in rows])
+            rule_seconds[idx] += timer() - start
+        return list(zip(*out_columns))
+
+    @staticmethod
+    def _execute_column_step(column_step, rows):
+        indexes, convert = column_step
+        columns = [[row[idx] for row in rows] for idx in indexes]
+        return columns[0] if convert is None else convert(columns)
+
+    @staticmethod
+    def _compile_byte_step(rule, indexes, step):
+        # the row step for byte mode, see cached_byte_conversion
+        if not rule.conversion_function:
+            return step
+        if len(indexes) == 1:
+            return operator.itemgetter(indexes[0]), cached_byte_conversion(rule.conversion_function, True)
+        return operator.itemgetter(*indexes), cached_byte_conversion(rule.conversion_function, False)
+
+    @staticmethod
+    def _compile_byte_column_step(rule, column_step):
+        # the column step for byte mode, the column conversion function with its columns decoded and encoded
+        indexes, convert = column_step
+        if convert is None:
+            return column_step
+        return indexes, functools.partial(convert_byte_columns, convert)
+
+    @staticmethod
+    def _compile_column_step(rule, indexes):
+        # returns the (source column indexes, column conversion function) step for a rule
+        function = rule.conversion_function
+        if not function:
+            return indexes[:1], None
+        if function in COLUMN_CONVERSIONS:
+            return indexes, COLUMN_CONVERSIONS[function]
+        return indexes, functools.partial(convert_columns_by_row, function)
+
+    @property
+    def rules(self):
+        return self._rules
+
+    @property
+    def column_indexes(self):
+        return self._column_indexes
+
+    @property
+    def steps(self):
+        return self._steps
+
+
+"""
+Class:  StreamValidator, RowCountValidator, NullCountValidator, ChecksumValidator
+
+        Stream validators check the conversion while it runs, so the source and destination files do not need
+        to be read a second time. The Converter calls 'update' for every chunk of rows converted and 'result'
+        once the conversion is complete. The other calls are made at the points the records are counted, they
+        do nothing unless a validator needs them.
+
+        add_read(count): records yielded by the source reader, before duplicates are dropped
+        add_left_out(rejected, dropped): records of a chunk left out of the destination, rejected (see
+            RejectWriter) or dropped as duplicates (see DedupIndex)
+        update(source_rows, out_rows, out_lines):
+            source_rows: list of source rows (lists of fields)
+            out_rows: list of destination value lists, in the same order
+            out_lines: list of formatted destination lines, in the same order
+        add_written(count): destination rows written to the sink, once the write has returned
+        result(): logs the outcome and returns True/False
+
+        RowCountValidator: the number of records read matches the number of destination rows written plus the
+            records rejected and dropped. The counts are taken at the reader and the sink rather than from the
+            chunks passed between them, so rows lost or repeated on the way are found.
+        NullCountValidator: counts the empty values of each destination column, fails if the fraction of empty
+            values in a column exceeds max_null_fraction (if given).
+        ChecksumValidator: a CRC32 of the destination rows as written, so runs can be compared.
+"""
+
+
+class StreamValidator(object):
+    def add_read(self, count):
+        pass
+
+    def add_left_out(self, rejected, dropped):
+        pass
+
+    def update(self, source_rows, out_rows, out_lines):
+        pass
+
+    def add_written(self, count):
+        pass
+
+    def result(self):
+        return True
+
+
+class RowCountValidator(StreamValidator):
+    def __init__(self):
+        self.read_count = 0
+        self.written_count = 0
+        self.rejected_count = 0
+        self.dropped_count = 0
+
+    def add_read(self, count):
+        self.read_count += count
+
+    def add_left_out(self, rejected, dropped):
+        self.rejected_count += rejected
+        self.dropped_count += dropped
+
+    def add_written(self, count):
+        self.written_count += count
+
+    def result(self):
+        rootLogger.info(LOG_MSG_VERIFY_STREAM_COUNT.format(self.read_count, self.written_count, self.rejected_count,
+                                                           self.dropped_count))
+        return self.read_count == self.written_count + self.rejected_count + self.dropped_count
+
+
+class NullCountValidator(StreamValidator):
+    def __init__(self, column_names, max_null_fraction=None):
+        self.column_names = column_names
+        self.max_null_fraction = max_null_fraction
+        self.null_counts = [0] * len(column_names)
+        self.row_count = 0
+
+    def update(self, source_rows, out_rows, out_lines):
+        if not out_rows:
+            return
+        self.row_count += len(out_rows)
+        for idx, column in enumerate(zip(*out_rows)):
+            # an empty value of the column's own type, the values are bytes in byte mode
+            self.null_counts[idx] += column.count(column[0][:0])
+
+    def result(self):
+        success = True
+        for name, null_count in zip(self.column_names, self.null_counts):
+            rootLogger.info(LOG_MSG_VERIFY_NULLS.format(name, null_count, self.row_count))
+            if self.max_null_fraction is not None and self.row_count \
+                    and float(null_count) / self.row_count > self.max_null_fraction:
+                rootLogger.info(LOG_MSG_VERIFY_NULLS_FAIL.format(name, null_count, self.row_count,
+                                                                self.max_null_fraction))
+                success = False
+        return success
+
+
+class ChecksumValidator(StreamValidator):
+    def __init__(self):
+        self.checksum = 0
+
+    def update(self, source_rows, out_rows, out_lines):
+        if out_lines and isinstance(out_lines[0], bytes):
+            data = b''.join(out_lines)
+        else:
+            data = u''.join(out_lines).encode('utf-8')
+        self.checksum = zlib.crc32(data, self.checksum)
+
+    def result(self):
+        rootLogger.info(LOG_MSG_VERIFY_CHECKSUM.format(self.checksum & 0xffffffff))
+        return True
+
+
+"""
+Class:  RejectWriter
+
+        Quarantine of the source records that fail to convert. Given a RejectWriter the Converter writes such a
+        record to it and carries on with the next, rather than aborting the conversion. The rejects are written as
+        RFC 4180 CSV with the record number (1 for the first record after the header), the destination column of
+        the rule that failed, the error and the source line. Rejected records are not passed to the stream
+        validators to update, RowCountValidator counts them apart. The re-read row count validation counts them
+        as missing from the destination.
+
+        A conversion is still aborted when the rejected records pass either limit:
+
+        :param  destination: path or DataSink of the rejects file
+        :param  max_errors: number of records that can be rejected, None for no limit
+        :param  max_error_rate: fraction of the records read that can be rejected, None for no limit. It is checked
+                once ERROR_RATE_MIN_ROWS records have been read, and at the end of the conversion.
+"""
+
+
+class RejectWriter(object):
+    def __init__(self, destination, max_errors=None, max_error_rate=None):
+        self.sink = as_data_sink(destination)
+        self.max_errors = max_errors
+        self.max_error_rate = max_error_rate
+        self.count = 0
+        self._file = None
+
+    @contextlib.contextmanager
+    def open(self, resume_offset=None, resume_count=0):
+        # opens the rejects file for a conversion. Resuming a checkpointed conversion, the file is truncated to
+        # the offset recorded with the checkpoint and the records rejected before it are counted
+        if resume_offset is not None and self.sink.path is not None and os.path.isfile(self.sink.path):
+            self.count = resume_count
+            with io.open(self.sink.path, 'r+b') as self._file:
+                self._file.seek(resume_offset)
+                self._file.truncate()
+                yield self
+        else:
+            self.count = 0
+            with self.sink.open_binary() as self._file:
+                self._file.write(format_csv_row(REJECTS_HEADER).encode('utf-8'))
+                yield self
+
+    def add(self, record, rule_name, error, source_line):
+        self.count += 1
+        values = [u'{0}'.format(record), rule_name, u'{0}'.format(repr(error)), source_line]
+        self._file.write(format_csv_row(values).encode('utf-8'))
+
+    def check(self, records, final=False):
+        # raises an exception if the records rejected, out of the records read so far, pass a limit
+        if self.max_errors is not None and self.count > self.max_errors:
+            raise Exception(LOG_MSG_EXCEPT_MAX_REJECTS.format(self.count, self.max_errors))
+        if self.max_error_rate is not None and records and (final or records >= ERROR_RATE_MIN_ROWS) \
+                and float(self.count) / records > self.max_error_rate:
+            raise Exception(LOG_MSG_EXCEPT_REJECT_RATE.format(self.count, records, self.max_error_rate))
+
+    def sync(self):
+        # flushes the rejects to disk and returns the file offset, for a checkpoint
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def log(self):
+        rootLogger.info(LOG_MSG_REJECTS.format(self.count, self.sink.name))
+
+
+"""
+Class:  SortedKeyRun
+
+        A file of DEDUP_KEY_BYTES byte keys in sorted order, memory mapped rather than loaded. Only the first key of
+        every DEDUP_FENCE_KEYS is held in memory to find the block of keys to search for a key.
+
+        :param  path: path of the run file
+"""
+
+
+class SortedKeyRun(object):
+    def __init__(self, path):
+        self.path = path
+        self.key_count = os.path.getsize(path) // DEDUP_KEY_BYTES
+        self._file = None
+        self._keys = None
+        self._fences = []
+        # an empty file can not be mapped, a run without keys is not
+        if self.key_count:
+            self._file = io.open(path, 'rb')
+            self._keys = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._fences = [self._keys[offset:offset + DEDUP_KEY_BYTES] for offset in
+                            range(0, self.key_count * DEDUP_KEY_BYTES, DEDUP_FENCE_KEYS * DEDUP_KEY_BYTES)]
+
+    @classmethod
+    def create(cls, path, blocks):
+        # writes a run of the keys in blocks (bytes of sorted keys, in order) and opens it
+        temp_file = path + TEMP_FILE_SUFFIX
+        with io.open(temp_file, 'wb') as run_file:
+            for block in blocks:
+                run_file.write(block)
+            run_file.flush()
+            os.fsync(run_file.fileno())
+        replace_file(temp_file, path)
+        return cls(path)
+
+    def contains(self, key):
+        # searches the block of keys for key at a key boundary
+        if not self.key_count:
+            return False
+        start = max(bisect.bisect_right(self._fences, key) - 1, 0) * DEDUP_FENCE_KEYS
+        block = self._keys[start * DEDUP_KEY_BYTES:min(start + DEDUP_FENCE_KEYS, self.key_count) * DEDUP_KEY_BYTES]
+        offset = block.find(key)
+        while offset != -1 and offset % DEDUP_KEY_BYTES:
+            offset = block.find(key, offset + 1)
+        return offset != -1
+
+    def read_values(self, start, count):
+        # the keys from position start as integers, which sort the same as the keys
+        data = self._keys[start * DEDUP_KEY_BYTES:(start + count) * DEDUP_KEY_BYTES]
+        return list(struct.unpack('>{0}Q'.format(len(data) // DEDUP_KEY_BYTES), data))
+
+    def close(self):
+        if self._keys is not None:
+            self._keys.close()
+            self._file.close()
+        self._keys = self._file = None
+
+
+def merge_key_runs(runs, skip=frozenset()):
+    """ Merges sorted key runs a block of DEDUP_MERGE_BLOCK_KEYS keys of each run at a time.
+
+        :param  runs: list of SortedKeyRun
+        :param  skip: set of the keys (as integers) to leave out
+        :return iterator of bytes of sorted keys, in order, with each key once
+    """
+    positions = [0] * len(runs)
+    blocks = [[] for _ in runs]
+    previous = None
+    while True:
+        for idx, run in enumerate(runs):
+            if not blocks[idx] and positions[idx] < run.key_count:
+                blocks[idx] = run.read_values(positions[idx], DEDUP_MERGE_BLOCK_KEYS)
+                positions[idx] += len(blocks[idx])
+        if not any(blocks):
+            return
+        # the keys up to the least of the last keys read from the runs with keys left to read are all read
+        bounds = [blocks[idx][-1] for idx, run in enumerate(runs) if positions[idx] < run.key_count]
+        bound = min(bounds) if bounds else None
+        merged = []
+        for idx, block in enumerate(blocks):
+            end = len(block) if bound is None else bisect.bisect_right(block, bound)
+            merged.extend(block[:end])
+            blocks[idx] = block[end:]
+        merged.sort()
+        values = []
+        for value in merged:
+            if value != previous and value not in skip:
+                values.append(value)
+            previous = value
+        yield struct.pack('>{0}Q'.format(len(values)), *values)
+
+
+"""
+Class:  BloomFilter
+
+        A Bloom filter in a memory mapped file, DEDUP_BLOOM_BITS_PER_KEY bits per key of its capacity (about 1%
+        false positives once it holds that many keys). The DEDUP_BLOOM_HASHES bits of a key are found by double
+        hashing of the key, which is already a hash.
+
+        :param  path: path of the filter file, created empty if it does not exist
+        :param  capacity: number of keys the filter is sized for
+        :param  key_count: number of keys added to the filter so far
+"""
+
+
+class BloomFilter(object):
+    def __init__(self, path, capacity, key_count=0):
+        self.path = path
+        self.capacity = capacity
+        self.key_count = key_count
+        if not os.path.isfile(path):
+            rootLogger.info(LOG_MSG_DEDUP_BLOOM.format(path, capacity))
+            with io.open(path, 'wb') as bloom_file:
+                bloom_file.truncate(capacity * DEDUP_BLOOM_BITS_PER_KEY // 8 + 1)
+        self._file = io.open(path, 'r+b')
+        self._bits = mmap.mmap(self._file.fileno(), 0)
+        self._bit_count = len(self._bits) * 8
+
+    def might_contain(self, value, step):
+        # value and step are from the key, see DedupIndex._add
+        bits, bit_count = self._bits, self._bit_count
+        for i in range(DEDUP_BLOOM_HASHES):
+            position = (value + i * step) % bit_count
+            if not byte_value(bits[position >> 3]) & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, value, step):
+        bits, bit_count = self._bits, self._bit_count
+        for i in range(DEDUP_BLOOM_HASHES):
+            position = (value + i * step) % bit_count
+            idx = position >> 3
+            bits[idx] = to_byte(byte_value(bits[idx]) | (1 << (position & 7)))
+        self.key_count += 1
+
+    @property
+    def is_full(self):
+        return self.key_count >= self.capacity
+
+    def flush(self):
+        self._bits.flush()
+
+    def close(self):
+        if self._bits is not None:
+            self._bits.close()
+            self._file.close()
+        self._bits = self._file = None
+
+
+"""
+Class:  DedupIndex
+
+        Index of the record keys converted by earlier runs, so that records re-sent in overlapping extracts are
+        dropped before they are converted. A record is dropped if the value of its key_field was seen before, in
+        an earlier run or earlier in this one. Records with an empty key are always kept, records too short to have
+        the key field are returned apart to be rejected as records that fail to convert are. The keys of records
+        that fail to convert are removed again (remove_rows) so the records are not dropped once they are fixed.
+
+        Keys are the first DEDUP_KEY_BYTES bytes of the SHA-1 of the value. The keys of a run are held in memory
+        and written as a new sorted run (SortedKeyRun) every DEDUP_RUN_KEYS keys, so memory use does not grow with
+        the size of the index or of the source. The last two runs are merged while the older is no more than
+        DEDUP_RUN_RATIO times the size of the newer one, so runs grow geometrically: a key is merged again only a
+        logarithmic number of times and a lookup searches a logarithmic number of runs.
+
+        Bloom filters answer most lookups of new keys without touching the runs. The keys added are set in the
+        newest filter only, once it is full a new filter of twice its capacity is started, so no filter is ever
+        rebuilt. The false positive rate is about 1% for each filter, each false positive costs a lookup in the runs.
+
+        The runs and filters of the index are listed in its manifest (MANIFEST_FILE_FORMAT), which is replaced
+        only when commit is called, after the conversion passed validation. A conversion that fails or is
+        interrupted leaves the index as it was, the same records are converted again by the next run, and the
+        files it wrote are removed. Runs merged away are removed once they are no longer listed. The committed
+        filters may be left with bits of keys that were not committed, these only cost a lookup.
+
+        With 64 bit keys the chance of a new record being taken for a duplicate is about n / 2^64 per record,
+        for an index of n keys.
+
+        :param  path: path the files of the index are named after
+        :param  key_field: source column of the record key
+"""
+
+
+class DedupIndex(object):
+    def __init__(self, path, key_field=DEDUP_KEY_FIELD):
+        self.path = path
+        self.key_field = key_field
+        self.manifest_file = MANIFEST_FILE_FORMAT.format(path)
+        self.duplicates = 0
+        self._pending = set()
+        self._removed = set()
+        self._lock = threading.Lock()
+        self._runs = []
+        self._blooms = []
+        self._next_file = 0
+        self._manifest = None
+
+    @contextlib.contextmanager
+    def open(self):
+        # maps the runs and Bloom filters for a conversion. Keys not committed by the end are discarded
+        self._manifest = self._read_manifest()
+        self._remove_unlisted_files()
+        self.duplicates = 0
+        self._pending = set()
+        self._removed = set()
+        self._next_file = self._manifest[DEDUP_NEXT_FILE_KEY]
+        try:
+            self._runs = [SortedKeyRun(self._get_file_path(run[DEDUP_FILE_KEY]))
+                          for run in self._manifest[DEDUP_RUNS_KEY]]
+            self._blooms = [BloomFilter(self._get_file_path(bloom[DEDUP_FILE_KEY]), bloom[DEDUP_CAPACITY_KEY],
+                                        bloom[DEDUP_KEYS_KEY]) for bloom in self._manifest[DEDUP_BLOOMS_KEY]]
+            if not self._blooms:
+                self._add_bloom(DEDUP_MIN_CAPACITY)
+            yield self
+        finally:
+            for run in self._runs:
+                run.close()
+            for bloom in self._blooms:
+                bloom.close()
+            self._runs = []
+            self._blooms = []
+            self._pending = set()
+            self._removed = set()
+            self._remove_unlisted_files()
+
+    @property
+    def key_count(self):
+        # the keys of the open runs and the pending keys, or once closed the keys of the committed index
+        if self._runs or self._pending or self._manifest is None:
+            return sum(run.key_count for run in self._runs) + len(self._pending)
+        return sum(run[DEDUP_KEYS_KEY] for run in self._manifest[DEDUP_RUNS_KEY])
+
+    def filter_rows(self, rows, key_idx):
+        # adds the keys of rows to the index, returns the rows with a key not seen before, the positions in rows
+        # of those dropped and the (position in rows, row, exception) of the rows without the key field
+        kept, dropped, failed = [], [], []
+        with self._lock:
+            add = self._add
+            for idx, row in enumerate(rows):
+                try:
+                    key = row[key_idx]
+                except IndexError as e:
+                    failed.append((idx, row, e))
+                    continue
+                if add(key):
+                    kept.append(row)
+                else:
+                    dropped.append(idx)
+        self.duplicates += len(dropped)
+        return kept, dropped, failed
+
+    def remove_rows(self, rows, key_idx):
+        # takes the keys of rows added by filter_rows out of the index again, e.g. for rows that failed to convert
+        with self._lock:
+            for row in rows:
+                if row[key_idx]:
+                    key = self._get_key(row[key_idx])
+                    if key in self._pending:
+                        self._pending.remove(key)
+                    else:
+                        # already written to a run, it is left out when the run is merged or on commit
+                        self._removed.add(key)
+
+    def commit(self):
+        # writes the pending keys as a run, leaves the keys removed out of the runs of this conversion and replaces
+        # the manifest, from then on the keys are part of the index
+        if self._pending:
+            self._write_pending()
+        if self._removed:
+            for run in list(self._runs):
+                if any(run.contains(key) for key in self._removed):
+                    self._merge_runs([run])
+            self._removed = set()
+        for bloom in self._blooms:
+            bloom.flush()
+        runs = [{DEDUP_FILE_KEY: os.path.basename(run.path), DEDUP_KEYS_KEY: run.key_count} for run in self._runs]
+        blooms = [{DEDUP_FILE_KEY: os.path.basename(bloom.path), DEDUP_CAPACITY_KEY: bloom.capacity,
+                   DEDUP_KEYS_KEY: bloom.key_count} for bloom in self._blooms]
+        manifest = {DEDUP_RUNS_KEY: runs, DEDUP_BLOOMS_KEY: blooms, DEDUP_NEXT_FILE_KEY: self._next_file}
+        temp_file = self.manifest_file + TEMP_FILE_SUFFIX
+        with io.open(temp_file, 'w', encoding='utf-8') as the_file:
+            the_file.write(text_type(json.dumps(manifest, indent=2, separators=(',', ': '), sort_keys=True)) + u'\n')
+        replace_file(temp_file, self.manifest_file)
+        self._manifest = manifest
+
+    def log(self):
+        rootLogger.info(LOG_MSG_DEDUP.format(self.duplicates, self.key_field, self.key_count, self.path))
+
+    def _get_key(self, value):
+        if not isinstance(value, bytes):
+            value = value.encode('utf-8')
+        return hashlib.sha1(value).digest()[:DEDUP_KEY_BYTES]
+
+    def _add(self, value):
+        # adds the key of value to the index, returns False if it was there already
+        if not value:
+            return True
+        key = self._get_key(value)
+        if key in self._pending:
+            return False
+        if key in self._removed:
+            # removed from the index but maybe not yet from its run
+            self._removed.remove(key)
+            self._pending.add(key)
+            return True
+        # double hashing of the key for the bits of the Bloom filters
+        value = struct.unpack('>Q', key)[0]
+        step = (value >> 32) | 1
+        for bloom in self._blooms:
+            if bloom.might_contain(value, step) and self._contains(key):
+                return False
+        self._blooms[-1].add(value, step)
+        if self._blooms[-1].is_full:
+            self._add_bloom(self._blooms[-1].capacity * 2)
+        self._pending.add(key)
+        if len(self._pending) >= DEDUP_RUN_KEYS:
+            self._write_pending()
+        return True
+
+    def _contains(self, key):
+        for run in reversed(self._runs):
+            if run.contains(key):
+                return True
+        return False
+
+    def _write_pending(self):
+        # writes the pending keys as the newest run and merges the runs it makes too many of
+        self._runs.append(SortedKeyRun.create(self._get_new_file_path(DEDUP_RUN_EXTENSION),
+                                              [b''.join(sorted(self._pending))]))
+        self._pending = set()
+        while len(self._runs) > 1 and self._runs[-2].key_count <= self._runs[-1].key_count * DEDUP_RUN_RATIO:
+            self._merge_runs(self._runs[-2:])
+
+    def _merge_runs(self, runs):
+        # replaces runs, the last runs of the index, with one run of their keys less the keys removed
+        path = self._get_new_file_path(DEDUP_RUN_EXTENSION)
+        skip = set(struct.unpack('>Q', key)[0] for key in self._removed)
+        merged = SortedKeyRun.create(path, merge_key_runs(runs, skip))
+        rootLogger.info(LOG_MSG_DEDUP_MERGE.format(len(runs), sum(run.key_count for run in runs), path))
+        idx = self._runs.index(runs[0])
+        self._runs[idx:idx + len(runs)] = [merged] if merged.key_count else []
+        listed = self._get_listed_files()
+        for run in runs + ([] if merged.key_count else [merged]):
+            run.close()
+            # runs of the committed index are kept until the manifest no longer lists them
+            if os.path.basename(run.path) not in listed:
+                os.remove(run.path)
+
+    def _add_bloom(self, capacity):
+        self._blooms.append(BloomFilter(self._get_new_file_path(DEDUP_BLOOM_EXTENSION), capacity))
+
+    def _get_file_path(self, file_name):
+        return os.path.join(os.path.dirname(self.path), file_name)
+
+    def _get_new_file_path(self, extension):
+        self._next_file += 1
+        return DEDUP_FILE_FORMAT.format(self.path, self._next_file, extension)
+
+    def _read_manifest(self):
+        if not os.path.isfile(self.manifest_file):
+            return {DEDUP_RUNS_KEY: [], DEDUP_BLOOMS_KEY: [], DEDUP_NEXT_FILE_KEY: 0}
+        with io.open(self.manifest_file, 'r', encoding='utf-8') as the_file:
+            return json.load(the_file)
+
+    def _get_listed_files(self):
+        entries = self._manifest[DEDUP_RUNS_KEY] + self._manifest[DEDUP_BLOOMS_KEY]
+        return set(entry[DEDUP_FILE_KEY] for entry in entries)
+
+    def _remove_unlisted_files(self):
+        # the runs and filters of the index that its manifest does not list, left by a conversion that was not
+        # committed or merged away
+        prefix = os.path.basename(self.path) + '.'
+        extensions = (DEDUP_RUN_EXTENSION, DEDUP_RUN_EXTENSION + TEMP_FILE_SUFFIX, DEDUP_BLOOM_EXTENSION)
+        listed = self._get_listed_files()
+        for file_name in os.listdir(os.path.dirname(self.path) or os.curdir):
+            if file_name.startswith(prefix) and file_name.endswith(extensions) and file_name not in listed:
+                os.remove(self._get_file_path(file_name))
+
+
+"""
+Class:  ProgressReporter
+
+        Logs the number of records converted with the throughput, the share of the source read and
+        the estimated time left. Records are reported once every PROGRESS_INTERVAL_SECONDS rather than every
+        so many rows, so the log does not grow with the speed of the conversion.
+
+        :param  total_bytes: size of the source data to convert, used to estimate the time left. None if unknown.
+        :param  start_rows: records already converted, e.g. when resuming from a checkpoint
+        :param  interval: seconds between progress messages
+"""
+
+
+class ProgressReporter(object):
+    def __init__(self, total_bytes, start_rows=0, interval=PROGRESS_INTERVAL_SECONDS):
+        self.total_bytes = total_bytes
+        self.start_rows = start_rows
+        self.interval = interval
+        self.bytes_read = 0
+        self.started = timer()
+        self.next_report = self.started + interval
+
+    def add_bytes(self, byte_count):
+        self.bytes_read += byte_count
+
+    def update(self, rows):
+        # called once per chunk, logs if the interval has passed
+        now = timer()
+        if now < self.next_report:
+            return
+        self.next_report = now + self.interval
+        elapsed = now - self.started
+        if self.total_bytes is None:
+            rootLogger.info(LOG_MSG_PROCESS_RECS_RATE.format(rows, (rows - self.start_rows) / elapsed))
+            return
+        done = min(float(self.bytes_read) / self.total_bytes, 1.0) if self.total_bytes else 1.0
+        eta = elapsed * (1.0 - done) / done if done else 0.0
+        rootLogger.info(LOG_MSG_PROCESS_RECS.format(rows, (rows - self.start_rows) / elapsed, done, eta))
+
+
+"""
+Class:  ConversionStats
+
+        Instrumentation of a conversion: records converted and throughput, bytes read and written,
+        the time spent in the read, split, convert and write stages and, if profiled, the time spent in each rule.
+        The hits and misses of the conversion function caches (get_cache_info) are logged with them.
+
+        Stage times are measured once per chunk of rows so they are always collected.
+        Rule times are measured by converting a chunk one rule at a time. With PROFILE_FULL every chunk is
+        profiled. With PROFILE_SAMPLED one chunk in every PROFILE_SAMPLE_CHUNKS is, and the time for all records
+        is estimated from the sample, which keeps the overhead low enough to leave on in production.
+
+        :param  rule_names: destination column name of each rule, in plan order
+        :param  profile: None, PROFILE_FULL or PROFILE_SAMPLED
+"""
+
+
+class ConversionStats(object):
+    def __init__(self, rule_names, profile=None):
+        self.rule_names = list(rule_names)
+        self.profile = profile
+        self.rows = 0
+        self.profiled_rows = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.seconds = 0.0
+        self.stage_seconds = dict((stage, 0.0) for stage in (READ_STAGE, SPLIT_STAGE, CONVERT_STAGE, WRITE_STAGE))
+        self.rule_seconds = [0.0] * len(self.rule_names)
+
+    def merge(self, other):
+        # adds the stage and rule times of other, e.g. from a pipeline thread
+        for stage, seconds in other.stage_seconds.items():
+            self.stage_seconds[stage] += seconds
+        for idx, seconds in enumerate(other.rule_seconds):
+            self.rule_seconds[idx] += seconds
+        self.profiled_rows += other.profiled_rows
+
+    def profile_chunk(self, chunk_idx):
+        # True if the rules should be timed for the given chunk
+        if self.profile == PROFILE_FULL:
+            return True
+        return self.profile == PROFILE_SAMPLED and chunk_idx % PROFILE_SAMPLE_CHUNKS == 0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def estimated_rule_seconds(self, idx):
+        # the rule's time scaled up from the profiled rows to all rows
+        if not self.profiled_rows:
+            return 0.0
+        return self.rule_seconds[idx] * self.rows / self.profiled_rows
+
+    def to_dict(self):
+        rules = []
+        for idx, name in enumerate(self.rule_names):
+            rules.append({'name': name, 'seconds': self.rule_seconds[idx], 'calls': self.profiled_rows,
+                          'estimated_seconds': self.estimated_rule_seconds(idx)})
+        return {'rows': self.rows, 'seconds': self.seconds, 'rows_per_second': self.rows_per_second,
+                'bytes_read': self.bytes_read, 'bytes_written': self.bytes_written,
+                'stage_seconds': self.stage_seconds, 'profile': self.profile, 'profiled_rows': self.profiled_rows,
+                'rules': rules,
+                'caches': dict((name, dict(zip(info._fields, info))) for name, info in get_cache_info())}
+
+    def log(self):
+        rootLogger.info(LOG_MSG_STATS_THROUGHPUT.format(self.rows, self.seconds, self.rows_per_second,
+                                                        self.bytes_read, self.bytes_written))
+        for stage in (READ_STAGE, SPLIT_STAGE, CONVERT_STAGE, WRITE_STAGE):
+            rootLogger.info(LOG_MSG_STATS_STAGE.format(stage, self.stage_seconds[stage]))
+        if self.profiled_rows:
+            for idx, name in enumerate(self.rule_names):
+                rootLogger.info(LOG_MSG_STATS_RULE.format(name, self.rule_seconds[idx], self.profiled_rows,
+                                                          self.estimated_rule_seconds(idx)))
+        for name, info in get_cache_info():
+            rootLogger.info(LOG_MSG_STATS_CACHE.format(name, info.hits, info.misses, info.currsize, info.maxsize))
+
+    def write_json(self, file_path):
+        with io.open(file_path, 'w', encoding='utf-8') as stats_file:
+            stats_file.write(json.dumps(self.to_dict(), indent=2, sort_keys=True) + u'\n')
+        rootLogger.info(LOG_MSG_STATS_FILE.format(file_path))
+
 
 """
 Class:  Converter
 
-        This class performs the transformation from source file to destination file.
+        This class performs the transformation from a source to a destination (see DataSource and DataSink).
         Note: A converter has no knowledge of the transformation logic, this is encapsulated in the
         ConversionRule objects
 
@@ -372,31 +2603,94 @@ Class:  Converter
 
         The transform method performs the transformation from source to destination:
         Once the source file is opened for processing and the row headings established,
-        the rules are updated to establish the column positions of the source column fields.
-        For each row in the source file, the rules fetch the relevant data from the mapped columns
-        then their execute method is called to perform the transformation.  The data from all rule transformations
+        the rules are compiled with the column positions of the source column fields into a ConversionPlan.
+        For each row in the source file, the plan fetches the relevant data from the mapped columns
+        and calls the conversion functions to perform the transformation.  The data from all rule transformations
         is then concatenated to a comma delimited line to be output to the destination file.
+        Rows are streamed through a read -> convert -> write generator pipeline in chunks of chunk_rows lines,
+        so the source file is never held in memory as a whole.
 
-        :param  source_file: source file path
-        :param  destination_file: destination file path
+        :param  source_file: source file path, STDIO_PATH for standard input or a DataSource.
+                Paths of .gz, .bz2 and .xz files are decompressed as they are read.
+        :param  destination_file: destination file path, STDIO_PATH for standard output or a DataSink.
+                Paths of .gz, .bz2 and .xz files are compressed as they are written.
         :param  mapping_list: list of mappings of the form:
             {DESTINATION_KEY: <Rally Field>, SOURCE_KEY :<list of source columns>,CONVERSION_FUNCTION_KEY : <function>}
         :param  validation_fn_list: list of functions of form f(source_file_path, dest_file_path) that return True/False
-                based on validation of files.
-
-
-        TODO: This should be decoupled from the file read/write. Using an abstract dataSource and dataSink type
-        interface rather than file names would allow the solution to source and sink data from streams, files, APIs, etc
+                based on validation of files. They are skipped unless both the source and destination are plain files.
+        :param  read_buffer_size: buffer size in bytes used when reading the source file
+        :param  write_buffer_size: buffer size in bytes used when writing the destination file
+        :param  chunk_rows: maximum number of rows held in memory between the read, convert and write stages
+        :param  engine: ROW_ENGINE converts each row in turn, COLUMNAR_ENGINE converts each chunk column by column.
+                Both produce identical output.
+        :param  csv_format: key of the CSV_FORMATS reader and writer used for the source and destination files.
+                RFC4180_CSV handles quoted fields, SIMPLE_CSV splits and joins on CSV_SEP only.
+        :param  checkpoint_rows: if set, the source and destination offsets are recorded in a checkpoint journal
+                (CHECKPOINT_FILE_FORMAT) every checkpoint_rows rows. An interrupted run restarted with the same
+                settings resumes from the last checkpoint instead of from the start of the file.
+                Needs a plain file source and destination.
+        :param  stream_validator_list: list of stream validators (see RowCountValidator) updated with every chunk
+                of rows converted. Unlike the validation functions they do not re-read the files.
+        :param  profile: None, PROFILE_FULL or PROFILE_SAMPLED - whether the time spent in each rule is measured
+                for all chunks of rows or a sample of them. The results are in the stats attribute (ConversionStats).
+        :param  byte_mode: if True the source is read and split as UTF-8 bytes and the destination written as bytes.
+                Only the fields passed to a conversion function are decoded. The output is identical.
+        :param  pipeline_threads: if set, the chunks of rows are converted by this many converter threads while a
+                reader thread reads and splits the source and the calling thread writes the destination. The threads
+                are connected by queues of chunks, at most PIPELINE_MAX_CHUNKS chunks are held at any time
+                and the destination rows are written in source order.
+        :param  reject_writer: if set (RejectWriter), records that fail to convert are written to it and the
+                conversion carries on. Otherwise the first such record aborts the conversion.
+        :param  dedup_index: if set (DedupIndex), records with a key seen before are dropped as they are read and
+                the keys of the others are committed to the index once the conversion has passed validation.
+                Can not be used with checkpoint_rows.
+        :param  mmap_input: if True the source file is memory mapped and its lines are split from large blocks of
+                the mapping rather than read through a file buffer. Implies byte_mode and needs a plain file source.
+                Checkpointed conversions read the file as normal.
 """
 
 
 class Converter(object):
-    def __init__(self, source_file, destination_file, mapping_list, validation_fn_list):
-        self.source_file = source_file
-        self.destination_file = destination_file
+    def __init__(self, source_file, destination_file, mapping_list, validation_fn_list,
+                 read_buffer_size=READ_BUFFER_SIZE, write_buffer_size=WRITE_BUFFER_SIZE,
+                 chunk_rows=STREAM_CHUNK_ROWS, engine=ROW_ENGINE, csv_format=RFC4180_CSV, checkpoint_rows=None,
+                 stream_validator_list=None, profile=None, byte_mode=False, mmap_input=False, pipeline_threads=None,
+                 reject_writer=None, dedup_index=None):
+        if engine not in (ROW_ENGINE, COLUMNAR_ENGINE):
+            raise Exception(LOG_MSG_EXCEPT_ENGINE.format(engine))
+        if csv_format not in CSV_FORMATS:
+            raise Exception(LOG_MSG_EXCEPT_CSV_FORMAT.format(csv_format))
+        self.source = as_data_source(source_file)
+        self.sink = as_data_sink(destination_file)
+        # file paths, None unless the source or destination is a plain file
+        self.source_file = self.source.path
+        self.destination_file = self.sink.path
         self.rules = []
+        self.plan = None
+        self.max_split = -1
         self.source_headers = []
         self.validation_fns = validation_fn_list
+        self.stream_validators = stream_validator_list or []
+        self.read_buffer_size = read_buffer_size
+        self.write_buffer_size = write_buffer_size
+        self.chunk_rows = chunk_rows
+        self.engine = engine
+        self.byte_mode = byte_mode or mmap_input
+        self.mmap_input = mmap_input
+        self.pipeline_threads = pipeline_threads
+        self.reject_writer = reject_writer
+        self.dedup_index = dedup_index
+        self.dedup_key_idx = None
+        self.duplicate_count = 0
+        self.source_position = None
+        if mmap_input and self.source_file is None:
+            raise Exception(LOG_MSG_EXCEPT_NOT_A_FILE.format(MMAP_SYS_ARG))
+        self.read_rows, self.format_row = (CSV_BYTE_FORMATS if self.byte_mode else CSV_FORMATS)[csv_format]
+        self.checkpoint_rows = checkpoint_rows
+        self.checkpoint_file = CHECKPOINT_FILE_FORMAT.format(self.destination_file)
+        self.line_count = 0
+        self.stats = ConversionStats([mapping[DESTINATION_KEY] for mapping in mapping_list], profile)
+        self.progress = None
 
         rootLogger.info(LOG_MSG_CREATE_MAPPINGS)
         for idx, mapping in enumerate(mapping_list):
@@ -409,52 +2703,397 @@ class Converter(object):
             rootLogger.info(LOG_MSG_ADD_RULE.format(rally_field))
 
     def transform(self):
-        first_line = True
-        line_count = 0
-        with io.open(self.source_file, 'r', encoding='utf-8') as src_file, \
-                            io.open(self.destination_file, 'w+', encoding='utf-8') as dest_file:
-            for line in src_file.readlines():
-                line = line.rstrip('\n')
-                if first_line:
-                    first_line = False
-                    self._update_rules_source_data_indexes(line)
-                    header_row = self._get_destination_header_line()
-                    dest_file.write(header_row)
-                else:
-                    line_count += 1
-                    # map the actual data into the rule based on the current line
-                    line_data = line.split(CSV_SEP)
-                    for rule in self.rules:
-                        rule_field_data = []
-                        column_indexes = rule.source_data_indexes
-                        for idx in column_indexes:
-                            data_value = line_data[idx]
-                            rule_field_data.append(data_value)
-
-                        rule.data_list = rule_field_data
-
-                    # now we just execute the rules then concat the values and write to file
-                    out_line_list = []
-                    for rule in self.rules:
-                        result = rule.execute()
-                        out_line_list.append(result)
-
-                    dest_file.write(CSV_SEP.join(out_line_list) + u'\n')
-
-                    #show/log progress
-                    if line_count % PROCESSING_COUNT_FEEDBACK == 0:
-                        rootLogger.info(LOG_MSG_PROCESS_RECS.format(line_count))
+        if self.dedup_index is None:
+            return self._transform_and_validate()
+        if self.checkpoint_rows:
+            raise Exception(LOG_MSG_EXCEPT_NOT_SUPPORTED.format(DEDUP_SYS_ARG, CHECKPOINT_SYS_ARG))
+        # keys are only added to the index if the conversion passes, otherwise the records are converted again
+        with self.dedup_index.open():
+            success = self._transform_and_validate()
+            if success:
+                self.dedup_index.commit()
+                self.dedup_index.log()
+        return success
+
+    def _transform_and_validate(self):
+        self.line_count = 0
+        self.duplicate_count = 0
+        start = timer()
+        self.progress = ProgressReporter(self.source.size())
+        if self.checkpoint_rows:
+            if self.source_file is None or self.destination_file is None:
+                raise Exception(LOG_MSG_EXCEPT_NOT_A_FILE.format(CHECKPOINT_SYS_ARG))
+            self._transform_with_checkpoints()
+        else:
+            with self._open_rejects():
+                self._transform()
 
         # and we're done
-        rootLogger.info(LOG_MSG_PROC_COMPLETE.format(line_count))
-        self._validate_transform()
+        self._update_stats(timer() - start, self.source.size())
+        rootLogger.info(LOG_MSG_PROC_COMPLETE.format(self.line_count))
+        self.stats.log()
+        if self.reject_writer is not None:
+            self.reject_writer.log()
+            self.reject_writer.check(self.line_count + self.reject_writer.count + self.duplicate_count, final=True)
+        return self._validate_transform()
+
+    def _open_rejects(self, checkpoint=None):
+        # the reject writer opened for the conversion, if there is one
+        if self.reject_writer is None:
+            return _no_rejects()
+        if checkpoint is None:
+            return self.reject_writer.open()
+        return self.reject_writer.open(checkpoint.get(REJECTS_OFFSET_KEY), checkpoint.get(REJECTS_KEY, 0))
+
+    def _update_stats(self, seconds, bytes_read):
+        self.stats.seconds = seconds
+        self.stats.rows = self.line_count
+        # the text read if the size of the source is not known up front
+        self.stats.bytes_read = bytes_read if bytes_read is not None else self.progress.bytes_read
+        self.stats.bytes_written = self.sink.size()
+
+    def _transform(self):
+        if self.mmap_input:
+            source_context = self.source.open_mapped_lines()
+            sink_context = self.sink.open_binary(self.write_buffer_size)
+        elif self.byte_mode:
+            source_context = self.source.open_binary(self.read_buffer_size)
+            sink_context = self.sink.open_binary(self.write_buffer_size)
+        else:
+            source_context = self.source.open_lines(self.read_buffer_size)
+            sink_context = self.sink.open_text(self.write_buffer_size)
+        with source_context as src_file, sink_context as dest_file:
+            header_fields = self._read_header_fields(src_file)
+            if header_fields is not None:
+                self._compile_plan(header_fields)
+                header_row = self._get_destination_header_line()
+                dest_file.write(header_row)
+                self._write_rows(src_file, dest_file)
+
+    def _transform_with_checkpoints(self):
+        # same as _transform but the files are read and written as bytes so that the source and destination
+        # offsets are known. Every checkpoint_rows rows the offsets are recorded in the checkpoint journal,
+        # and if a journal is left from an interrupted run the conversion carries on from its last entry.
+        checkpoint = self._read_checkpoint()
+        source_stat = os.stat(self.source_file)
+        with io.open(self.source_file, 'rb', buffering=self.read_buffer_size) as src_file, \
+                            io.open(self.destination_file, 'r+b' if checkpoint else 'wb',
+                                    buffering=self.write_buffer_size) as dest_file, \
+                            io.open(self.checkpoint_file, 'a' if checkpoint else 'w', encoding='utf-8') as journal, \
+                            self._open_rejects(checkpoint):
+            src_lines = SourceLineReader(src_file, decode=not self.byte_mode)
+            header_fields = self._read_header_fields(src_lines)
+            if header_fields is None:
+                return
+            self._compile_plan(header_fields)
+
+            if checkpoint:
+                rootLogger.info(LOG_MSG_RESUME.format(checkpoint[ROWS_KEY], checkpoint[SOURCE_OFFSET_KEY],
+                                                      checkpoint[OUTPUT_OFFSET_KEY]))
+                src_lines.seek(checkpoint[SOURCE_OFFSET_KEY])
+                dest_file.seek(checkpoint[OUTPUT_OFFSET_KEY])
+                dest_file.truncate()
+                self.line_count = checkpoint[ROWS_KEY]
+                self.progress = ProgressReporter(source_stat.st_size - checkpoint[SOURCE_OFFSET_KEY], self.line_count)
+            else:
+                dest_file.write(self._encode_lines([self._get_destination_header_line()]))
+
+            checkpoint_count = self.line_count
+            for out_chunk in self._convert_chunks(src_lines):
+                start = timer()
+                dest_file.write(self._encode_lines(out_chunk))
+                self.stats.stage_seconds[WRITE_STAGE] += timer() - start
+                self._add_written(len(out_chunk))
+                if self.line_count - checkpoint_count >= self.checkpoint_rows:
+                    checkpoint_count = self.line_count
+                    self._write_checkpoint(journal, self.source_position, dest_file, source_stat)
+
+        # the run completed, there is nothing to resume
+        os.remove(self.checkpoint_file)
+
+    def _write_checkpoint(self, journal, source_offset, dest_file, source_stat):
+        # the destination is synced first so a journal entry never points past what is on disk
+        dest_file.flush()
+        os.fsync(dest_file.fileno())
+        entry = {SOURCE_FILE_KEY: self.source_file, SOURCE_SIZE_KEY: source_stat.st_size,
+                 SOURCE_MTIME_KEY: source_stat.st_mtime, SOURCE_OFFSET_KEY: source_offset,
+                 OUTPUT_OFFSET_KEY: dest_file.tell(), ROWS_KEY: self.line_count}
+        if self.reject_writer is not None:
+            entry[REJECTS_OFFSET_KEY] = self.reject_writer.sync()
+            entry[REJECTS_KEY] = self.reject_writer.count
+        journal.write(json.dumps(entry) + u'\n')
+        journal.flush()
+        os.fsync(journal.fileno())
+        rootLogger.info(LOG_MSG_CHECKPOINT.format(self.line_count, source_offset, entry[OUTPUT_OFFSET_KEY]))
+
+    def _read_checkpoint(self):
+        # returns the last complete journal entry if it still matches the source and destination files
+        if not os.path.isfile(self.checkpoint_file):
+            return None
+        checkpoint = None
+        with io.open(self.checkpoint_file, 'r', encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    checkpoint = json.loads(line)
+                except ValueError:
+                    # a partly written last entry from a crash
+                    break
+        if checkpoint is None:
+            return None
+
+        source_stat = os.stat(self.source_file)
+        if checkpoint[SOURCE_FILE_KEY] != self.source_file or checkpoint[SOURCE_SIZE_KEY] != source_stat.st_size \
+                or checkpoint[SOURCE_MTIME_KEY] != source_stat.st_mtime \
+                or not os.path.isfile(self.destination_file) \
+                or os.path.getsize(self.destination_file) < checkpoint[OUTPUT_OFFSET_KEY]:
+            rootLogger.info(LOG_MSG_CHECKPOINT_STALE.format(self.checkpoint_file))
+            return None
+        return checkpoint
+
+    def transform_range(self, header_line, start, end):
+        # converts the source lines between byte offsets start and end (both on line boundaries)
+        # and writes them to the destination without a header row. Used by BatchConverter.
+        if self.source_file is None or self.destination_file is None:
+            raise Exception(LOG_MSG_EXCEPT_NOT_A_FILE.format(PARALLEL_SYS_ARG))
+        self.line_count = 0
+        started = timer()
+        self.progress = ProgressReporter(end - start)
+        header_lines = [header_line.encode('utf-8') if self.byte_mode else header_line]
+        self._compile_plan(self._read_header_fields(header_lines))
+        if self.mmap_input:
+            with self.source.open_mapped_lines(start, end) as src_lines, \
+                                self.sink.open_binary(self.write_buffer_size) as dest_file, self._open_rejects():
+                self._write_rows(src_lines, dest_file)
+            self._update_stats(timer() - started, end - start)
+            return self.line_count
+        with self.source.open_binary(self.read_buffer_size) as src_file, \
+                            self.sink.open_binary(self.write_buffer_size) as dest_file, self._open_rejects():
+            src_file.seek(start)
+            src_lines = SourceLineReader(src_file, end, decode=not self.byte_mode)
+            if self.byte_mode:
+                self._write_rows(src_lines, dest_file)
+            else:
+                self._write_rows(src_lines, TextSinkWriter(dest_file))
+        self._update_stats(timer() - started, end - start)
+        return self.line_count
+
+    def _read_header_fields(self, src_lines):
+        # the source column names from the first row, None if the source is empty
+        header_fields = next(self.read_rows(src_lines), None)
+        if header_fields is not None and self.byte_mode:
+            header_fields = [field.decode('utf-8') for field in header_fields]
+        return header_fields
+
+    def _encode_lines(self, lines):
+        # formatted destination lines as UTF-8 bytes
+        if self.byte_mode:
+            return b''.join(lines)
+        return u''.join(lines).encode('utf-8')
+
+    def _write_rows(self, src_lines, dest_file):
+        # rows flow through the pipeline a chunk at a time so memory use
+        # is bounded by chunk_rows regardless of the size of the source file
+        write_seconds = 0.0
+        for out_chunk in self._convert_chunks(src_lines):
+            start = timer()
+            dest_file.writelines(out_chunk)
+            write_seconds += timer() - start
+            self._add_written(len(out_chunk))
+        self.stats.stage_seconds[WRITE_STAGE] += write_seconds
+
+    def _add_written(self, count):
+        # rows the sink has taken, counted apart from the chunks converted (see RowCountValidator)
+        for validator in self.stream_validators:
+            validator.add_written(count)
+
+    def _read_chunks(self, src_lines):
+        # yield lists of the source rows from at most chunk_rows source lines, read lazily from the file
+        stage_seconds = self.stats.stage_seconds
+        while True:
+            start = timer()
+            lines = list(itertools.islice(src_lines, self.chunk_rows))
+            split_start = timer()
+            stage_seconds[READ_STAGE] += split_start - start
+            if not lines:
+                break
+            self.progress.add_bytes(sum(map(len, lines)))
+            chunk = list(self.read_rows(lines, src_lines, self.max_split))
+            for validator in self.stream_validators:
+                validator.add_read(len(chunk))
+            # records seen before are dropped here, before any conversion work is spent on them. Records without
+            # a key fail here rather than in the conversion, and are rejected with the chunk (see _write_rejects)
+            dropped, key_rejects = [], []
+            if self.dedup_index is not None:
+                chunk, dropped, key_rejects = self.dedup_index.filter_rows(chunk, self.dedup_key_idx)
+                if key_rejects and self.reject_writer is None:
+                    raise key_rejects[0][2]
+            stage_seconds[SPLIT_STAGE] += timer() - split_start
+            yield chunk, dropped, key_rejects
+
+    def _convert_chunks(self, src_lines):
+        # yield the list of converted destination lines for each chunk of source rows, in source order.
+        # source_position is the offset in the source after the chunk (if src_lines keeps track of it)
+        if self.pipeline_threads:
+            converted_chunks = self._convert_chunks_threaded(src_lines)
+        else:
+            converted_chunks = self._convert_chunks_serial(src_lines)
+        for (chunk, out_rows, out_lines, rejects), dropped, key_rejects, position in converted_chunks:
+            if self.reject_writer is not None:
+                self._write_rejects(rejects, dropped, key_rejects, len(chunk))
+                if self.dedup_index is not None:
+                    # the records rejected are converted again once fixed, they are not duplicates then
+                    self.dedup_index.remove_rows([reject[1] for reject in rejects], self.dedup_key_idx)
+            self.duplicate_count += len(dropped)
+            for validator in self.stream_validators:
+                validator.add_left_out(len(rejects) + len(key_rejects), len(dropped))
+                validator.update(chunk, out_rows, out_lines)
+
+            #show/log progress
+            self.line_count += len(chunk)
+            self.progress.update(self.line_count)
+            self.source_position = position
+
+            yield out_lines
+
+    def _convert_chunks_serial(self, src_lines):
+        for chunk_idx, (chunk, dropped, key_rejects) in enumerate(self._read_chunks(src_lines)):
+            yield (self._convert_chunk(chunk_idx, chunk, self.stats), dropped, key_rejects,
+                   getattr(src_lines, 'position', None))
+
+    def _convert_chunk(self, chunk_idx, chunk, stats):
+        # converts and formats a chunk of source rows, the time taken is added to stats.
+        # Returns (source rows, destination rows, destination lines, rejects). With a reject writer a chunk that
+        # fails is converted again a row at a time, the rows that fail are left out of the source rows and listed
+        # in rejects as (index in the chunk, source row, rule, exception)
+        start = timer()
+        rejects = []
+        try:
+            if stats.profile_chunk(chunk_idx):
+                out_rows = self.plan.execute_profiled(chunk, stats.rule_seconds, self.engine == COLUMNAR_ENGINE)
+                stats.profiled_rows += len(chunk)
+            elif self.engine == COLUMNAR_ENGINE:
+                # the whole chunk is converted one column at a time
+                out_rows = self.plan.execute_columns(chunk)
+            else:
+                execute = self.plan.execute
+                out_rows = [execute(line_data) for line_data in chunk]
+        except Exception:
+            if self.reject_writer is None:
+                raise
+            chunk, out_rows, rejects = self._convert_checked(chunk)
+        format_start = timer()
+        format_row = self.format_row
+        out_lines = [format_row(out_line_list) for out_line_list in out_rows]
+        stats.stage_seconds[CONVERT_STAGE] += format_start - start
+        stats.stage_seconds[WRITE_STAGE] += timer() - format_start
+        return chunk, out_rows, out_lines, rejects
+
+    def _convert_checked(self, chunk):
+        # converts the chunk a row at a time, separating the rows that fail
+        good_rows, out_rows, rejects = [], [], []
+        execute_checked = self.plan.execute_checked
+        for idx, line_data in enumerate(chunk):
+            values, failure = execute_checked(line_data)
+            if failure is None:
+                good_rows.append(line_data)
+                out_rows.append(values)
+            else:
+                rejects.append((idx, line_data) + failure)
+        return good_rows, out_rows, rejects
+
+    def _write_rejects(self, rejects, dropped, key_rejects, converted_rows):
+        # writes the rejected rows of a chunk in record order, numbered from the records before the chunk, and checks
+        # the limits. dropped are the positions of the duplicate records left out of the chunk and key_rejects the
+        # (position, source row, exception) of the records left out without a key (see DedupIndex)
+        records = self.line_count + self.reject_writer.count + self.duplicate_count
+        left_out = sorted(dropped + [key_reject[0] for key_reject in key_rejects])
+        numbered = [(idx, line_data, self.dedup_index.key_field, error) for idx, line_data, error in key_rejects]
+        for idx, line_data, rule, error in rejects:
+            for left_out_idx in left_out:
+                if left_out_idx <= idx:
+                    idx += 1
+            numbered.append((idx, line_data, rule.output_column_name, error))
+        for idx, line_data, rule_name, error in sorted(numbered, key=lambda reject: reject[0]):
+            source_line = self._format_source_row(line_data)
+            if isinstance(source_line, bytes):
+                source_line = source_line.decode('utf-8', 'replace')
+            self.reject_writer.add(records + idx + 1, rule_name, error, source_line.rstrip(u'\r\n'))
+        self.reject_writer.check(records + converted_rows + len(rejects) + len(key_rejects) + len(dropped))
+
+    def _convert_chunks_threaded(self, src_lines):
+        # same as _convert_chunks_serial with a reader thread and pipeline_threads converter threads.
+        # Every chunk read takes a slot in the in_flight queue until it has been yielded, which holds the reader
+        # back once PIPELINE_MAX_CHUNKS chunks are queued, being converted or waiting for an earlier chunk.
+        read_queue = queue.Queue(maxsize=PIPELINE_MAX_CHUNKS)
+        converted_queue = queue.Queue()
+        in_flight = queue.Queue(maxsize=PIPELINE_MAX_CHUNKS)
+        stop = threading.Event()
+        thread_stats = [ConversionStats(self.stats.rule_names, self.stats.profile)
+                        for _ in range(self.pipeline_threads)]
+
+        def read():
+            try:
+                for chunk_idx, (chunk, dropped, key_rejects) in enumerate(self._read_chunks(src_lines)):
+                    if not _put_until_stopped(in_flight, None, stop):
+                        return
+                    _put_until_stopped(read_queue, (chunk_idx, chunk, dropped, key_rejects,
+                                                    getattr(src_lines, 'position', None)), stop)
+            except Exception as e:
+                converted_queue.put((None, e))
+            finally:
+                for _ in thread_stats:
+                    _put_until_stopped(read_queue, None, stop)
+
+        def convert(stats):
+            try:
+                read_chunks = iter(lambda: _get_until_stopped(read_queue, stop), None)
+                for chunk_idx, chunk, dropped, key_rejects, position in read_chunks:
+                    converted = self._convert_chunk(chunk_idx, chunk, stats)
+                    converted_queue.put((chunk_idx, (converted, dropped, key_rejects, position)))
+                converted_queue.put((None, None))
+            except Exception as e:
+                converted_queue.put((None, e))
+
+        threads = [threading.Thread(target=read)]
+        threads.extend(threading.Thread(target=convert, args=(stats,)) for stats in thread_stats)
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            # converted chunks arrive in any order, each is yielded once all the chunks before it have been
+            pending = {}
+            next_idx = 0
+            running = len(thread_stats)
+            while running:
+                chunk_idx, item = converted_queue.get()
+                if chunk_idx is None:
+                    if item is not None:
+                        raise item
+                    running -= 1
+                    continue
+                pending[chunk_idx] = item
+                while next_idx in pending:
+                    yield pending.pop(next_idx)
+                    next_idx += 1
+                    in_flight.get()
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            for stats in thread_stats:
+                self.stats.merge(stats)
 
     def _validate_transform(self):
         rootLogger.info(LOG_MSG_VERIFY_BEGIN)
         results = []
         for fn in self.validation_fns:
+            if self.source_file is None or self.destination_file is None:
+                rootLogger.info(LOG_MSG_SKIP_REREAD.format(fn.__name__))
+                continue
             result = fn(self.source_file, self.destination_file)
             results.append(result)
+        for validator in self.stream_validators:
+            results.append(validator.result())
 
         success = (False not in results)
 
@@ -462,14 +3101,16 @@ class Converter(object):
             rootLogger.info(LOG_MSG_VERIFY_SUCCESS)
         else:
             rootLogger.info(LOG_MSG_VERIFY_FAIL)
+        return success
 
-    def _update_rules_source_data_indexes(self, line):
-        # retrieve header names from source and update the rules with the
-        # column positions of the rule's source fields
-        self.source_headers = line.split(CSV_SEP)
+    def _compile_plan(self, header_fields):
+        # retrieve header names from source and compile the rules, with the
+        # column positions of the rule's source fields, into the conversion plan
+        self.source_headers = header_fields
 
         # Use first header line to establish each of the column offsets for each rule
         # this avoids hard coding the various column offsets
+        rule_indexes = []
         for rule in self.rules:
             rootLogger.info(LOG_MSG_GET_SRC_COL_IDX.format(rule.output_column_name))
             column_positions = []
@@ -481,14 +3122,39 @@ class Converter(object):
                     raise Exception(LOG_MSG_EXCEPT_SRC_FLD_NOT_FOUND)
                 column_positions.append(idx)
 
-            rule.source_data_indexes = column_positions
+            rule_indexes.append(column_positions)
+
+        self.plan = ConversionPlan(self.rules, rule_indexes, self.byte_mode)
+
+        column_indexes = [idx for column_positions in rule_indexes for idx in column_positions]
+        if self.dedup_index is not None:
+            self.dedup_key_idx = self._get_index_of_source_field(self.dedup_index.key_field)
+            if self.dedup_key_idx == -1:
+                rootLogger.critical(LOG_MSG_SRC_NOT_FOUND.format(self.dedup_index.key_field))
+                raise Exception(LOG_MSG_EXCEPT_SRC_FLD_NOT_FOUND)
+            column_indexes.append(self.dedup_key_idx)
+
+        # rows are only split up to the last column a rule (or the dedup key) uses
+        last_idx = max(column_indexes or [-1])
+        self.max_split = -1
+        if 0 <= last_idx < len(header_fields) - 2:
+            self.max_split = last_idx + 1
+            rootLogger.info(LOG_MSG_PROJECTION.format(header_fields[last_idx], last_idx + 1, len(header_fields)))
+
+    def _format_source_row(self, line_data):
+        # the source record of a row read with max_split, for the rejects file
+        if self.max_split < 0 or len(line_data) <= self.max_split:
+            return self.format_row(line_data)
+        line = self.format_row(line_data[:self.max_split])
+        separator = CSV_SEP_BYTES if self.byte_mode else CSV_SEP
+        return line[:-1] + separator + line_data[self.max_split] + line[-1:]
 
     def _get_destination_header_line(self):
         #Each rule has its destination field name, just concat these
         header_list = []
         for rule in self.rules:
-            header_list.append(rule.output_column_name)
-        return CSV_SEP.join(header_list) + u'\n'
+            header_list.append(rule.output_column_name.encode('utf-8') if self.byte_mode else rule.output_column_name)
+        return self.format_row(header_list)
 
     def _get_index_of_source_field(self, field):
         idx = 0
@@ -499,6 +3165,555 @@ class Converter(object):
         return idx
 
 
+@contextlib.contextmanager
+def _no_rejects():
+    # stands in for RejectWriter.open when a Converter has no reject writer
+    yield None
+
+
+def _put_until_stopped(the_queue, item, stop):
+    # puts item on a bounded queue, giving up if stop is set while waiting for space. Returns True if put.
+    while not stop.is_set():
+        try:
+            the_queue.put(item, timeout=PIPELINE_POLL_SECONDS)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get_until_stopped(the_queue, stop):
+    # gets the next item of a queue, returns None if stop is set while waiting for one
+    while not stop.is_set():
+        try:
+            return the_queue.get(timeout=PIPELINE_POLL_SECONDS)
+        except queue.Empty:
+            pass
+    return None
+
+
+# worker process functions for WorkerPool - these must be module level so the tasks can be pickled
+
+def _init_pool_worker():
+    # workers only report problems, progress is logged by the parent process.
+    # The listener thread is not copied to a forked worker, so workers log straight to the console.
+    for handler in list(rootLogger.handlers):
+        rootLogger.removeHandler(handler)
+    rootLogger.addHandler(consoleHandler)
+    rootLogger.setLevel(logging.WARNING)
+    # Ctrl-C is handled by the parent process, which then terminates the workers. SIGTERM stops a worker, also one
+    # started in place of a worker that died after the parent set its own SIGTERM handler
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _run_pool_worker(connection):
+    # runs the tasks sent on connection until it is sent None or closed, sending back (exception, result) for each
+    _init_pool_worker()
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        fn, args = task
+        try:
+            outcome = (None, fn(*args))
+        except Exception as e:
+            outcome = (e, None)
+        try:
+            connection.send(outcome)
+        except Exception as e:
+            # the exception or result could not be pickled
+            connection.send((Exception(str(e)), None))
+
+
+def _convert_range_task(task):
+    source_file, part_file, header_line, start, end, mapping_list, engine, csv_format, byte_mode, mmap_input = task
+    converter = Converter(source_file, part_file, mapping_list, [], engine=engine, csv_format=csv_format,
+                          byte_mode=byte_mode, mmap_input=mmap_input)
+    return converter.transform_range(header_line, start, end)
+
+
+def _convert_file_task(task):
+    # converts a whole source file for FolderWatcher, returns (records, validation result, seconds taken).
+    # The destination is written to a temporary file that replaces it only if the conversion passes, so a failed
+    # conversion leaves no partial destination, nor replaces the destination of an earlier version of the file
+    source_file, destination_file, mapping_list, engine, csv_format, byte_mode = task
+    started = timer()
+    column_names = [mapping[DESTINATION_KEY] for mapping in mapping_list]
+    stream_validators = [RowCountValidator(), NullCountValidator(column_names), ChecksumValidator()]
+    temp_file = destination_file + TEMP_FILE_SUFFIX
+    # compressed the same as the destination file, the temporary file name does not end with its extension
+    opener = get_compressed_file_opener(destination_file)
+    sink = CompressedFileSink(temp_file, opener) if opener is not None else FileSink(temp_file)
+    converter = Converter(source_file, sink, mapping_list, [], engine=engine, csv_format=csv_format,
+                          stream_validator_list=stream_validators, byte_mode=byte_mode)
+    success = False
+    try:
+        success = converter.transform()
+    finally:
+        if success:
+            replace_file(temp_file, destination_file)
+        elif os.path.isfile(temp_file):
+            os.remove(temp_file)
+    return converter.line_count, success, timer() - started
+
+
+def _wait_for_connections(connections, timeout):
+    # the connections with data to read, or closed at the other end, once there are any or timeout seconds passed
+    if hasattr(multiprocessing.connection, 'wait'):
+        return multiprocessing.connection.wait(connections, timeout)
+    # Python 2 has no connection.wait
+    deadline = timer() + timeout
+    while True:
+        ready = [connection for connection in connections if connection.poll()]
+        if ready or timer() >= deadline:
+            return ready
+        time.sleep(min(PIPELINE_POLL_SECONDS / 10, max(deadline - timer(), 0)))
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    # stops the parent process of a worker pool on SIGTERM the same as on Ctrl-C, so it terminates the pool
+    raise KeyboardInterrupt()
+
+
+"""
+Class:  WorkerPool
+
+        A pool of worker processes for BatchConverter and FolderWatcher. Tasks are given to idle workers in the order
+        they were submitted, their results are returned by wait as they complete.
+
+        multiprocessing.Pool is not used as its workers take tasks from one queue, and an idle worker waits for a task
+        holding the lock of that queue. A worker that dies holding it, e.g. on a SIGTERM sent to the whole process
+        group as by timeout or systemd, leaves Pool.terminate waiting for the lock forever. Here each worker has
+        a pipe of its own, no lock is shared between processes: a worker that dies only closes its pipe, which is
+        seen as the end of its task, and terminate sends the workers SIGTERM and waits for them.
+
+        Workers ignore SIGINT, so Ctrl-C only interrupts the parent process, which then terminates the pool.
+
+        :param  processes: number of worker processes
+"""
+
+
+class WorkerPool(object):
+    def __init__(self, processes):
+        self.processes = processes
+        self._next_task_id = 0
+        self._queued = collections.deque()
+        # connection -> process, and the id of the task the worker is running if it is busy
+        self._processes = {}
+        self._running = {}
+        try:
+            for _ in range(processes):
+                self._start_worker()
+        except BaseException:
+            self.terminate()
+            raise
+
+    def submit(self, fn, *args):
+        # queues fn(*args) to run in a worker process, returns the id of the task
+        task_id = self._next_task_id
+        self._next_task_id += 1
+        self._queued.append((task_id, fn, args))
+        self._start_tasks()
+        return task_id
+
+    def wait(self, timeout):
+        # returns (task id, exception or None, result) of the tasks completed within timeout seconds
+        completed = []
+        for connection in _wait_for_connections(list(self._running), timeout):
+            task_id = self._running.pop(connection)
+            try:
+                error, result = connection.recv()
+            except EOFError:
+                error, result = Exception(LOG_MSG_EXCEPT_WORKER_EXIT.format(self._replace_worker(connection))), None
+            completed.append((task_id, error, result))
+        self._start_tasks()
+        return completed
+
+    def close(self):
+        # waits for the tasks running and stops the workers, tasks still queued are not run
+        self._queued.clear()
+        while self._running:
+            self.wait(PIPELINE_POLL_SECONDS)
+        for connection, process in list(self._processes.items()):
+            connection.send(None)
+            process.join()
+            connection.close()
+        self._processes = {}
+
+    def terminate(self):
+        # stops the workers at once, the results of the tasks running are lost
+        self._queued.clear()
+        self._running = {}
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for connection, process in list(self._processes.items()):
+            process.join()
+            connection.close()
+        self._processes = {}
+
+    def _start_worker(self):
+        connection, worker_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_run_pool_worker, args=(worker_connection,))
+        process.daemon = True
+        process.start()
+        # only the worker holds its end, so the pipe is closed when the worker dies
+        worker_connection.close()
+        self._processes[connection] = process
+
+    def _replace_worker(self, connection):
+        # starts a worker in place of one that died, returns the exit code of the dead worker
+        process = self._processes.pop(connection)
+        process.join()
+        connection.close()
+        self._start_worker()
+        return process.exitcode
+
+    def _start_tasks(self):
+        if self._queued:
+            # an idle worker may have died too, e.g. killed for running out of memory
+            for connection, process in list(self._processes.items()):
+                if connection not in self._running and not process.is_alive():
+                    self._replace_worker(connection)
+        for connection in self._processes:
+            if not self._queued:
+                break
+            if connection not in self._running:
+                task_id, fn, args = self._queued.popleft()
+                connection.send((fn, args))
+                self._running[connection] = task_id
+
+
+"""
+Class:  BatchConverter
+
+        This class converts a set of source files using a pool of worker processes.
+
+        Each source file is split into byte ranges of about chunk_size bytes on line boundaries, so large files are
+        spread across all the workers as well as multiple files. Each range is converted by a Converter in a worker
+        process into a temporary part file. The parts are then concatenated in source order behind a single header
+        row, either into one merged destination file or into one destination file per source file.
+        With the RFC 4180 format, ranges only end on a line break outside quotes, so a quoted field can hold line
+        breaks. The quotes of every source file are counted to find those.
+
+        :param  source_files: list of source file paths
+        :param  destination_files: list of destination file paths - either a single path (all sources merged in
+                order into one file) or one path per source file
+        :param  mapping_list: list of mappings, see Converter
+        :param  validation_fn_list: list of functions of form f(source_file_path, dest_file_path), run for each
+                source/destination pair when there is one destination per source
+        :param  processes: number of worker processes, defaults to the number of CPUs
+        :param  chunk_size: target size in bytes of the ranges each source file is split into
+        :param  engine: conversion engine used by the workers, see Converter
+        :param  csv_format: CSV reader and writer used by the workers, see Converter
+        :param  byte_mode: whether the workers convert UTF-8 bytes rather than decoded text, see Converter
+        :param  mmap_input: whether the workers memory map the source files, see Converter. The workers then share
+                the page cache of a source file rather than each reading its range through a file buffer.
+"""
+
+
+class BatchConverter(object):
+    def __init__(self, source_files, destination_files, mapping_list, validation_fn_list,
+                 processes=None, chunk_size=PARALLEL_CHUNK_SIZE, engine=ROW_ENGINE, csv_format=RFC4180_CSV,
+                 byte_mode=False, mmap_input=False):
+        if len(destination_files) not in (1, len(source_files)):
+            raise Exception(LOG_MSG_EXCEPT_DEST_COUNT)
+        if not all(is_plain_file_path(path) for path in source_files + destination_files):
+            raise Exception(LOG_MSG_EXCEPT_NOT_A_FILE.format(PARALLEL_SYS_ARG))
+        self.source_files = source_files
+        self.destination_files = destination_files
+        self.mapping_list = mapping_list
+        self.validation_fns = validation_fn_list
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunk_size = chunk_size
+        self.engine = engine
+        self.csv_format = csv_format
+        self.byte_mode = byte_mode
+        self.mmap_input = mmap_input
+        self.line_count = 0
+        format_row = CSV_FORMATS[csv_format][1]
+        self._header_row = format_row([mapping[DESTINATION_KEY] for mapping in mapping_list])
+
+    def transform(self):
+        tasks = []
+        parts = dict((destination, []) for destination in self.destination_files)
+        for file_idx, source_file in enumerate(self.source_files):
+            destination = self._get_destination_file(file_idx)
+            header_line, data_start = read_header_line(source_file)
+            ranges = get_line_aligned_ranges(source_file, data_start, self.chunk_size,
+                                             quoted=self.csv_format == RFC4180_CSV)
+            for range_idx, (start, end) in enumerate(ranges):
+                part_file = PART_FILE_FORMAT.format(destination, file_idx, range_idx)
+                tasks.append((source_file, part_file, header_line, start, end, self.mapping_list,
+                              self.engine, self.csv_format, self.byte_mode, self.mmap_input))
+                parts[destination].append(part_file)
+
+        rootLogger.info(LOG_MSG_PARALLEL_START.format(len(self.source_files), len(tasks), self.processes))
+        pool = WorkerPool(self.processes)
+        previous_handler = signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+        try:
+            for task in tasks:
+                pool.submit(_convert_range_task, task)
+            done_count = 0
+            while done_count < len(tasks):
+                # waits in short timeouts, since on Python 2 a wait without a timeout cannot be interrupted by Ctrl-C
+                for _, error, count in pool.wait(PIPELINE_POLL_SECONDS):
+                    if error is not None:
+                        raise error
+                    done_count += 1
+                    self.line_count += count
+                    rootLogger.info(LOG_MSG_PARALLEL_CHUNK_DONE.format(done_count, len(tasks), count))
+            pool.close()
+        except:
+            pool.terminate()
+            self._remove_parts(parts)
+            raise
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+
+        for destination in self.destination_files:
+            self._merge_parts(destination, parts[destination])
+
+        rootLogger.info(LOG_MSG_PROC_COMPLETE.format(self.line_count))
+        return self._validate_transform()
+
+    def _get_destination_file(self, file_idx):
+        if len(self.destination_files) == 1:
+            return self.destination_files[0]
+        return self.destination_files[file_idx]
+
+    def _remove_parts(self, parts):
+        for part_files in parts.values():
+            for part_file in part_files:
+                if os.path.isfile(part_file):
+                    os.remove(part_file)
+
+    def _merge_parts(self, destination, part_files):
+        rootLogger.info(LOG_MSG_MERGE_OUTPUT.format(len(part_files), destination))
+        with io.open(destination, 'wb') as dest_file:
+            dest_file.write(self._header_row.encode('utf-8'))
+            for part_file in part_files:
+                with io.open(part_file, 'rb') as part:
+                    shutil.copyfileobj(part, dest_file, WRITE_BUFFER_SIZE)
+                os.remove(part_file)
+
+    def _validate_transform(self):
+        rootLogger.info(LOG_MSG_VERIFY_BEGIN)
+        results = []
+        if len(self.destination_files) == len(self.source_files):
+            for source_file, destination in zip(self.source_files, self.destination_files):
+                for fn in self.validation_fns:
+                    results.append(fn(source_file, destination))
+        else:
+            # merged output: one header row plus the data rows of every source file
+            count_source = 1 + sum(count_lines(source_file) - 1 for source_file in self.source_files)
+            count_dest = count_lines(self.destination_files[0])
+            rootLogger.info(LOG_MSG_VERIFY_COUNT.format(count_source, count_dest))
+            results.append(count_source == count_dest)
+
+        success = (False not in results)
+
+        if success:
+            rootLogger.info(LOG_MSG_VERIFY_SUCCESS)
+        else:
+            rootLogger.info(LOG_MSG_VERIFY_FAIL)
+        return success
+
+
+"""
+Class:  ConversionState
+
+        Records the source files converted by successful runs so that incremental runs can skip them.
+
+        A source file is unchanged if its size and its content hash are the same as when it was last converted,
+        and its destination file still exists. The modification time proves nothing either way (a file can be
+        rewritten within its resolution, or re-delivered with the same content), so it is not compared. The source
+        information (get_source_info) is taken once before the conversion, compared by is_unchanged and kept by
+        record, so each source file is hashed once and a change made during the conversion is found by the next run.
+        The state is kept as JSON in state_file.
+
+        :param  state_file: path of the state file
+"""
+
+
+class ConversionState(object):
+    def __init__(self, state_file):
+        self.state_file = state_file
+        self._files = {}
+        if os.path.isfile(state_file):
+            with io.open(state_file, 'r', encoding='utf-8') as the_file:
+                self._files = json.load(the_file)
+
+    def is_unchanged(self, source_file, destination_file, source_info):
+        entry = self._files.get(source_file)
+        if entry is None or entry[DESTINATION_KEY] != destination_file or not os.path.isfile(destination_file):
+            return False
+        return entry[SOURCE_SIZE_KEY] == source_info[SOURCE_SIZE_KEY] \
+            and entry[SOURCE_HASH_KEY] == source_info[SOURCE_HASH_KEY]
+
+    def record(self, source_file, destination_file, source_info):
+        # source_info is the get_source_info of the source file before it was converted
+        entry = dict(source_info)
+        entry[DESTINATION_KEY] = destination_file
+        self._files[source_file] = entry
+
+    def save(self):
+        # written to a temporary file first so an interrupted save cannot corrupt the state
+        temp_file = self.state_file + TEMP_FILE_SUFFIX
+        with io.open(temp_file, 'w', encoding='utf-8') as the_file:
+            the_file.write(text_type(json.dumps(self._files)) + u'\n')
+        replace_file(temp_file, self.state_file)
+
+
+"""
+Class:  FolderWatcher
+
+        Watches a source folder and converts each source file that arrives in it, or changes, into a destination
+        file of the same name in the destination folder, for a trickle of small files where starting the program
+        for each would take longer than converting it.
+
+        Files are converted by a pool of worker processes that is started once, so the workers keep the conversion
+        function caches warm from one file to the next. At most workers files are converted at a time, others wait
+        for the next poll in order of modification time. The folder is polled every poll_seconds with a listing and
+        a stat of each file, a file is picked up once it has not been modified for poll_seconds. Files should be
+        written elsewhere and moved into the folder, or written without pauses.
+
+        Converted files are recorded in state (ConversionState) so they are not converted again, also after a
+        restart. A file that fails to convert is logged and left until it changes, its destination file is only
+        written once a conversion passes.
+
+        :param  source_folder: folder watched for files ending with one of SOURCE_FILE_EXTENSIONS
+        :param  dest_folder: folder the destination files are written to
+        :param  state: ConversionState of the converted files
+        :param  mapping_list: list of mappings, see Converter
+        :param  workers: number of files converted at a time (worker processes), defaults to the number of CPUs
+        :param  poll_seconds: seconds between polls of the source folder
+        :param  engine: conversion engine used by the workers, see Converter
+        :param  csv_format: CSV reader and writer used by the workers, see Converter
+        :param  byte_mode: whether the workers convert UTF-8 bytes rather than decoded text, see Converter
+"""
+
+
+class FolderWatcher(object):
+    def __init__(self, source_folder, dest_folder, state, mapping_list, workers=None,
+                 poll_seconds=WATCH_POLL_SECONDS, engine=ROW_ENGINE, csv_format=RFC4180_CSV, byte_mode=False):
+        self.source_folder = source_folder
+        self.dest_folder = dest_folder
+        self.state = state
+        self.mapping_list = mapping_list
+        self.workers = workers or multiprocessing.cpu_count()
+        self.poll_seconds = poll_seconds
+        self.engine = engine
+        self.csv_format = csv_format
+        self.byte_mode = byte_mode
+        self._pool = None
+        # source file -> (destination file, get_source_info when submitted, WorkerPool task id)
+        self._in_flight = {}
+        # source file -> (size, modification time) when it was last converted, or found to be unchanged
+        self._seen = {}
+
+    def run(self, polls=None):
+        # watches the source folder until interrupted, or for a number of polls after which the files being
+        # converted are waited for
+        rootLogger.info(LOG_MSG_WATCH_START.format(self.source_folder, self.workers, self.poll_seconds))
+        self._pool = WorkerPool(self.workers)
+        previous_handler = signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+        try:
+            poll_count = 0
+            while polls is None or poll_count < polls:
+                self.poll()
+                poll_count += 1
+                time.sleep(self.poll_seconds)
+            while self._in_flight:
+                self._collect_results()
+                time.sleep(self.poll_seconds)
+        except KeyboardInterrupt:
+            rootLogger.info(LOG_MSG_WATCH_STOP)
+        finally:
+            # files still being converted are converted again by the next run
+            self._pool.terminate()
+            for destination_file, _, _ in self._in_flight.values():
+                self._remove_temp_file(destination_file)
+            signal.signal(signal.SIGTERM, previous_handler)
+
+    def poll(self):
+        self._collect_results()
+        for source_file, source_info in self._get_ready_files():
+            if len(self._in_flight) >= self.workers:
+                break
+            destination_file = self._get_destination_file(source_file)
+            task = (source_file, destination_file, self.mapping_list, self.engine, self.csv_format, self.byte_mode)
+            # in flight before it is submitted, so its temporary file is removed if the watcher is stopped meanwhile
+            self._in_flight[source_file] = (destination_file, source_info, None)
+            self._in_flight[source_file] = (destination_file, source_info,
+                                            self._pool.submit(_convert_file_task, task))
+
+    def _get_destination_file(self, source_file):
+        return self.dest_folder + os.path.sep + os.path.basename(source_file)
+
+    @staticmethod
+    def _get_source_stat(source_info):
+        # the (size, modification time) of a get_source_info, as kept in _seen
+        return source_info[SOURCE_SIZE_KEY], source_info[SOURCE_MTIME_KEY]
+
+    def _remove_temp_file(self, destination_file):
+        # the partial destination of a conversion that did not complete, see _convert_file_task
+        if os.path.isfile(destination_file + TEMP_FILE_SUFFIX):
+            os.remove(destination_file + TEMP_FILE_SUFFIX)
+
+    def _get_ready_files(self):
+        # the (source file, get_source_info) of the files to convert, oldest first
+        now = time.time()
+        ready = []
+        for file_name in os.listdir(self.source_folder):
+            source_file = self.source_folder + os.path.sep + file_name
+            if not file_name.endswith(SOURCE_FILE_EXTENSIONS) or source_file in self._in_flight:
+                continue
+            try:
+                file_stat = os.stat(source_file)
+                if self._seen.get(source_file) == (file_stat.st_size, file_stat.st_mtime) \
+                        or now - file_stat.st_mtime < self.poll_seconds:
+                    continue
+                source_info = get_source_info(source_file)
+            except (IOError, OSError):
+                # removed since the folder was listed
+                continue
+            if self.state.is_unchanged(source_file, self._get_destination_file(source_file), source_info):
+                self._seen[source_file] = self._get_source_stat(source_info)
+                continue
+            ready.append((source_info[SOURCE_MTIME_KEY], source_file, source_info))
+        return [(source_file, source_info) for _, source_file, source_info in sorted(ready, key=lambda item: item[:2])]
+
+    def _collect_results(self):
+        source_files = dict((task_id, source_file) for source_file, (_, _, task_id) in self._in_flight.items())
+        for task_id, error, result in self._pool.wait(0):
+            source_file = source_files[task_id]
+            destination_file, source_info, _ = self._in_flight[source_file]
+            source_stat = self._get_source_stat(source_info)
+            if error is not None:
+                # a worker that died has not removed its temporary destination file. The file stays in flight until
+                # then, so it is removed by run if the watcher is stopped meanwhile
+                self._remove_temp_file(destination_file)
+            del self._in_flight[source_file]
+            self._seen[source_file] = source_stat
+            if error is not None:
+                rootLogger.warning(LOG_MSG_WATCH_FAILED.format(source_file, error))
+                continue
+            line_count, success, seconds = result
+            if not success:
+                rootLogger.warning(LOG_MSG_WATCH_FAILED.format(source_file, LOG_MSG_VERIFY_FAIL))
+                continue
+            rootLogger.info(LOG_MSG_WATCH_CONVERTED.format(source_file, destination_file, line_count, seconds))
+            # a file changed while it was converted is left for the next poll to convert again
+            file_stat = os.stat(source_file) if os.path.isfile(source_file) else None
+            if file_stat is not None and (file_stat.st_size, file_stat.st_mtime) == source_stat:
+                self.state.record(source_file, destination_file, source_info)
+                self.state.save()
+
 
 """
 Class:  Configurations
@@ -506,20 +3721,26 @@ Class:  Configurations
         This class encapsulates the set up of the logs and destination directories,
         verifies the source folder exists and there is at least one file to process.
 
+        :param  source_file: if set, the only file to process (a path or STDIO_PATH) instead of the source folder files
+        :param  require_source_files: if False an empty source folder is not an error, e.g. when it is watched
+
 """
 
 
 class Configurations(object):
-    def __init__(self):
-        self._source_files = []
+    def __init__(self, source_file=None, require_source_files=True):
+        self._source_files = [source_file] if source_file else []
         self.source_folder = SOURCE_FOLDER
         self.dest_folder = DEST_FOLDER
         self.log_folder = LOG_FOLDER
+        self.require_source_files = require_source_files
         self.setup()
 
     def setup(self):
         self._setup_logging_file()
         self._setup_destination()
+        if self._source_files:
+            return
 
         # critical error - if no source folder available...
         if not os.path.isdir(self.source_folder):
@@ -538,8 +3759,9 @@ class Configurations(object):
     def _setup_source_files(self):
         # get the list of source files
         for (_, _, source_files) in os.walk(self.source_folder):
-            self._source_files = [self.source_folder + os.path.sep + file for file in source_files if file.endswith('.csv')]
-        if len(self.source_files) == 0:
+            self._source_files = [self.source_folder + os.path.sep + file for file in source_files
+                                  if file.endswith(SOURCE_FILE_EXTENSIONS)]
+        if len(self.source_files) == 0 and self.require_source_files:
             rootLogger.critical(LOG_MSG_ABORT_NO_SRC_FILE.format(self.source_folder))
             raise Exception(LOG_MSG_EXCEPT_NO_SRC)
 
@@ -552,7 +3774,7 @@ class Configurations(object):
 
         fileHandler = logging.FileHandler(log_file)
         fileHandler.setFormatter(logFormatter)
-        rootLogger.addHandler(fileHandler)
+        add_log_handler(fileHandler)
         rootLogger.info(LOG_MSG_SCRIPT_VERSION.format(get_version()))
         rootLogger.info(LOG_MSG_USING_LOG.format(log_file))
 
@@ -564,10 +3786,35 @@ class Configurations(object):
     def destination_file_path(self):
         return self.dest_folder + os.path.sep + OUTPUT_FILE_NAME
 
+    @property
+    def stats_file_path(self):
+        return self.log_folder + os.path.sep + STATS_FILE_NAME
+
+    @property
+    def rejects_file_path(self):
+        return self.log_folder + os.path.sep + REJECTS_FILE_NAME
+
+    @property
+    def dedup_index_path(self):
+        return self.dest_folder + os.path.sep + DEDUP_INDEX_FILE_NAME
+
+    @property
+    def state_file_path(self):
+        return self.dest_folder + os.path.sep + STATE_FILE_NAME
+
+    @property
+    def destination_file_paths_per_source(self):
+        # one destination file per source file, named after the source file
+        return [self.dest_folder + os.path.sep + os.path.basename(source) for source in self.source_files]
+
 
 if __name__ == "__main__":
-    # Won't run version 3 (unicode stuff)
-    if sys.version_info[0] == 3:
+    # the console log moves to stderr when the converted data is written to stdout
+    if get_sys_arg_value(DESTINATION_SYS_ARG) == STDIO_PATH:
+        consoleHandler.stream = sys.stderr
+    start_logging()
+
+    if sys.version_info[:2] < (2, 6):
         rootLogger.info(LOG_MSG_PYTHON_VER)
         exit(1)
 
@@ -582,15 +3829,128 @@ if __name__ == "__main__":
     try:
         rootLogger.info(LOG_MSG_STARTING)
 
-        config = Configurations()
-        # assume single file, can add multiple files
-        source = config.source_files[0]
-        destination = config.destination_file_path
-
-        rootLogger.info(LOG_MSG_PROCESS_FROM_TO.format(source, destination))
+        # watch mode converts the files arriving in the source folder until stopped, it may be empty at first
+        watch_seconds = get_sys_arg_value(WATCH_SYS_ARG)
+        watch = WATCH_SYS_ARG in sys.argv or watch_seconds is not None
+        config = Configurations(get_sys_arg_value(SOURCE_SYS_ARG), require_source_files=not watch)
         validation_rules = [validate_row_counts]
-        converter = Converter(source, destination, RALLY_MAPPING, validation_rules)
-        converter.transform()
+        mapping_file = get_sys_arg_value(MAPPING_SYS_ARG)
+        mapping_list = load_mapping(mapping_file) if mapping_file else RALLY_MAPPING
+        engine = get_sys_arg_value(ENGINE_SYS_ARG, ROW_ENGINE)
+        csv_format = get_sys_arg_value(CSV_SYS_ARG, RFC4180_CSV)
+        byte_mode = BYTES_SYS_ARG in sys.argv
+        mmap_input = MMAP_SYS_ARG in sys.argv
+        pipeline_threads = int(get_sys_arg_value(THREADS_SYS_ARG, 1 if THREADS_SYS_ARG in sys.argv else 0)) or None
+        # records that fail to convert are quarantined if asked to, or if a limit on them is given
+        max_errors = get_sys_arg_value(MAX_ERRORS_SYS_ARG)
+        max_error_rate = get_sys_arg_value(MAX_ERROR_RATE_SYS_ARG)
+        # records with a key converted by an earlier run are dropped, the key column can be given as --dedup=<column>
+        dedup_index = None
+        if DEDUP_SYS_ARG in sys.argv or get_sys_arg_value(DEDUP_SYS_ARG):
+            dedup_index = DedupIndex(config.dedup_index_path, get_sys_arg_value(DEDUP_SYS_ARG, DEDUP_KEY_FIELD))
+        # the destination is split into shards if a limit on their rows or size is given
+        shard_rows = get_sys_arg_value(SHARD_ROWS_SYS_ARG)
+        shard_bytes = get_sys_arg_value(SHARD_BYTES_SYS_ARG)
+        reject_writer = None
+        if QUARANTINE_SYS_ARG in sys.argv or get_sys_arg_value(QUARANTINE_SYS_ARG) or max_errors or max_error_rate:
+            reject_writer = RejectWriter(get_sys_arg_value(QUARANTINE_SYS_ARG, config.rejects_file_path),
+                                         max_errors=int(max_errors) if max_errors else None,
+                                         max_error_rate=float(max_error_rate) if max_error_rate else None)
+
+        if watch:
+            for arg_name in (PARALLEL_SYS_ARG, CHECKPOINT_SYS_ARG, MMAP_SYS_ARG, THREADS_SYS_ARG, QUARANTINE_SYS_ARG,
+                             MAX_ERRORS_SYS_ARG, MAX_ERROR_RATE_SYS_ARG, DEDUP_SYS_ARG, SHARD_ROWS_SYS_ARG,
+                             SHARD_BYTES_SYS_ARG, DESTINATION_SYS_ARG):
+                if arg_name in sys.argv or get_sys_arg_value(arg_name):
+                    raise Exception(LOG_MSG_EXCEPT_NOT_SUPPORTED.format(arg_name, WATCH_SYS_ARG))
+            watcher = FolderWatcher(config.source_folder, config.dest_folder, ConversionState(config.state_file_path),
+                                    mapping_list, workers=int(get_sys_arg_value(WORKERS_SYS_ARG, 0)) or None,
+                                    poll_seconds=float(watch_seconds or WATCH_POLL_SECONDS), engine=engine,
+                                    csv_format=csv_format, byte_mode=byte_mode)
+            watcher.run()
+            exit(0)
+
+        if PARALLEL_SYS_ARG in sys.argv or get_sys_arg_value(PARALLEL_SYS_ARG):
+            # batch mode: every source file, split into chunks across a pool of processes
+            sources = config.source_files
+            if OUTPUT_PER_INPUT_SYS_ARG in sys.argv:
+                destinations = config.destination_file_paths_per_source
+            else:
+                destinations = [config.destination_file_path] * len(sources)
+        else:
+            # assume single file
+            sources = config.source_files[:1]
+            destinations = [get_sys_arg_value(DESTINATION_SYS_ARG, config.destination_file_path)]
+
+        state = None
+        if INCREMENTAL_SYS_ARG in sys.argv:
+            # standard input and output have no state to compare with the next run
+            for arg_name in (SOURCE_SYS_ARG, DESTINATION_SYS_ARG):
+                if get_sys_arg_value(arg_name) == STDIO_PATH:
+                    raise Exception(LOG_MSG_EXCEPT_NOT_SUPPORTED.format(arg_name + '=' + STDIO_PATH,
+                                                                        INCREMENTAL_SYS_ARG))
+            state = ConversionState(config.state_file_path)
+            # taken before the conversion, to be recorded if it succeeds
+            source_infos = dict((source, get_source_info(source)) for source in sources)
+            unchanged = [state.is_unchanged(source, destination, source_infos[source])
+                         for source, destination in zip(sources, destinations)]
+            for source, is_unchanged in zip(sources, unchanged):
+                if is_unchanged:
+                    rootLogger.info(LOG_MSG_SKIP_UNCHANGED.format(source))
+            if OUTPUT_PER_INPUT_SYS_ARG in sys.argv:
+                changed = [pair for pair, is_unchanged in zip(zip(sources, destinations), unchanged) if not is_unchanged]
+                sources, destinations = [pair[0] for pair in changed], [pair[1] for pair in changed]
+            elif all(unchanged):
+                # a merged output is only skipped if none of its source files changed
+                sources = []
+            if not sources:
+                rootLogger.info(LOG_MSG_NOTHING_TO_CONVERT)
+                exit(0)
+
+        if PARALLEL_SYS_ARG in sys.argv or get_sys_arg_value(PARALLEL_SYS_ARG):
+            if reject_writer is not None:
+                raise Exception(LOG_MSG_EXCEPT_NOT_SUPPORTED.format(QUARANTINE_SYS_ARG, PARALLEL_SYS_ARG))
+            if shard_rows or shard_bytes:
+                raise Exception(LOG_MSG_EXCEPT_NOT_SUPPORTED.format(SHARD_ROWS_SYS_ARG, PARALLEL_SYS_ARG))
+            if dedup_index is not None:
+                raise Exception(LOG_MSG_EXCEPT_NOT_SUPPORTED.format(DEDUP_SYS_ARG, PARALLEL_SYS_ARG))
+            processes = int(get_sys_arg_value(PARALLEL_SYS_ARG, 0)) or None
+            batch_destinations = destinations if OUTPUT_PER_INPUT_SYS_ARG in sys.argv else destinations[:1]
+            rootLogger.info(LOG_MSG_PROCESS_FROM_TO.format(sources, batch_destinations))
+            converter = BatchConverter(sources, batch_destinations, mapping_list, validation_rules,
+                                       processes=processes, engine=engine, csv_format=csv_format,
+                                       byte_mode=byte_mode, mmap_input=mmap_input)
+        else:
+            rootLogger.info(LOG_MSG_PROCESS_FROM_TO.format(sources[0], destinations[0]))
+            buffer_size = int(get_sys_arg_value(BUFFER_SIZE_SYS_ARG, READ_BUFFER_SIZE))
+            checkpoint_rows = CHECKPOINT_INTERVAL_ROWS if CHECKPOINT_SYS_ARG in sys.argv else None
+            # validate the row stream as it is converted, unless asked to re-read the files afterwards
+            stream_validators = []
+            if REREAD_VALIDATION_SYS_ARG not in sys.argv:
+                validation_rules = []
+                column_names = [mapping[DESTINATION_KEY] for mapping in mapping_list]
+                stream_validators = [RowCountValidator(), NullCountValidator(column_names), ChecksumValidator()]
+            profile = get_sys_arg_value(PROFILE_SYS_ARG, PROFILE_SAMPLED if PROFILE_SYS_ARG in sys.argv else None)
+            destination = destinations[0]
+            if shard_rows or shard_bytes:
+                if not is_plain_file_path(destination):
+                    raise Exception(LOG_MSG_EXCEPT_NOT_A_FILE.format(SHARD_ROWS_SYS_ARG))
+                destination = ShardedFileSink(destination, max_rows=int(shard_rows or 0) or None,
+                                              max_bytes=int(shard_bytes or 0) or None)
+            converter = Converter(sources[0], destination, mapping_list, validation_rules,
+                                  read_buffer_size=buffer_size, write_buffer_size=buffer_size, engine=engine,
+                                  csv_format=csv_format, checkpoint_rows=checkpoint_rows,
+                                  stream_validator_list=stream_validators, profile=profile, byte_mode=byte_mode,
+                                  mmap_input=mmap_input, pipeline_threads=pipeline_threads,
+                                  reject_writer=reject_writer, dedup_index=dedup_index)
+        success = converter.transform()
+        if isinstance(converter, Converter) and converter.stats.profile:
+            converter.stats.write_json(config.stats_file_path)
+
+        if state and success:
+            for source, destination in zip(sources, destinations):
+                state.record(source, destination, source_infos[source])
+            state.save()
 
     except Exception as e:
         rootLogger.warning(LOG_MSG_PROG_ABORT.format(e))
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the tests import convert.py and support.py as top level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# shared helpers of the tests - source files in the form RALLY_MAPPING converts and a temporary working folder
+
+import io
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONVERT_SCRIPT = os.path.join(REPO_FOLDER, 'convert.py')
+
+SOURCE_HEADER = u'citation,tag,expmm,expyy,state,make,address,violCode,Description,violFine,violDate,balance,' \
+                u'penalty,location'
+DESCRIPTIONS = [u'NO STOPPING', u'EXPIRED METER', u'RESIDENTIAL PARKING', u'FIRE HYDRANT']
+
+
+def source_row(idx, description=None):
+    if description is None:
+        description = DESCRIPTIONS[idx % len(DESCRIPTIONS)]
+    return u'{0},T{1:05d},{2},{3},VA,TOYOTA,{4} MAIN ST,{5},{6},${7}.00,{8:02d}/{9:02d}/2014 0{10}:05:09 PM,$0.00,' \
+           u'$0.00,X'.format(10000000 + idx, idx % 99991, idx % 12 + 1, idx % 8 + 10, idx, idx % 40,
+                             description, 32 + idx % 5 * 10, idx % 12 + 1, idx % 28 + 1, idx % 9 + 1)
+
+
+def write_source_file(path, row_count, first_row=0, description_fn=None):
+    # writes a source file of row_count data rows, description_fn(idx) may give the (raw CSV) Description field
+    with io.open(path, 'w', newline='') as the_file:
+        the_file.write(SOURCE_HEADER + u'\n')
+        for idx in range(first_row, first_row + row_count):
+            description = description_fn(idx) if description_fn else None
+            the_file.write(source_row(idx, description) + u'\n')
+
+
+def read_lines(path):
+    with io.open(path, 'r', encoding='utf-8', newline='') as the_file:
+        return the_file.read().splitlines()
+
+
+def wait_for(predicate, seconds):
+    # polls predicate until it is true or seconds have passed, returns its last value
+    deadline = time.time() + seconds
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.05)
+    return predicate()
+
+
+def start_python(args, cwd):
+    # starts python in its own process group, so a signal can be sent to it and its workers together
+    with open(os.devnull, 'wb') as devnull:
+        return subprocess.Popen([sys.executable] + args, cwd=cwd, stdout=devnull, stderr=devnull,
+                                preexec_fn=os.setsid)
+
+
+def start_convert(args, cwd):
+    return start_python([CONVERT_SCRIPT] + args, cwd)
+
+
+def stop_process_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    process.wait()
+
+
+def process_group_exists(pgid):
+    try:
+        os.killpg(pgid, 0)
+    except OSError:
+        return False
+    return True
+
+
+class TempFolderTestCase(unittest.TestCase):
+    # runs each test in an empty temporary folder, which holds the source, upload and logs folders
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.source_folder = os.path.join(self.folder, 'source')
+        self.dest_folder = os.path.join(self.folder, 'upload')
+        os.mkdir(self.source_folder)
+        self._cwd = os.getcwd()
+        os.chdir(self.folder)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        shutil.rmtree(self.folder)
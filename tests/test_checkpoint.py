@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import unittest
+
+from support import TempFolderTestCase, start_convert, stop_process_group, wait_for, write_source_file, read_lines
+
+
+class CheckpointResumeTest(TempFolderTestCase):
+    # --checkpoint carries on from the last checkpoint of a run that was killed, with the same output
+
+    def setUp(self):
+        super(CheckpointResumeTest, self).setUp()
+        write_source_file(os.path.join(self.source_folder, 'source.csv'), 250000)
+        self.destination_file = os.path.join(self.dest_folder, 'upload.csv')
+        self.checkpoint_file = self.destination_file + '.checkpoint'
+
+    def _read_journal(self):
+        if not os.path.isfile(self.checkpoint_file):
+            return []
+        with io.open(self.checkpoint_file, 'r', encoding='utf-8') as journal:
+            return [line for line in journal if line.endswith(u'\n')]
+
+    def _read_log(self):
+        with io.open(os.path.join(self.folder, 'logs', 'story_data_prep.log'), 'r', encoding='utf-8') as log_file:
+            return log_file.read()
+
+    def test_resumes_after_kill(self):
+        process = start_convert(['--checkpoint'], self.folder)
+        try:
+            self.assertTrue(wait_for(lambda: len(self._read_journal()) >= 1, 60))
+        finally:
+            stop_process_group(process)
+        self.assertTrue(os.path.isfile(self.checkpoint_file))
+
+        self.assertEqual(start_convert(['--checkpoint'], self.folder).wait(), 0)
+        self.assertTrue('Resuming from checkpoint' in self._read_log())
+        self.assertFalse(os.path.isfile(self.checkpoint_file))
+
+        expected_file = os.path.join(self.dest_folder, 'expected.csv')
+        self.assertEqual(start_convert(['--destination=' + expected_file], self.folder).wait(), 0)
+        resumed_lines = read_lines(self.destination_file)
+        self.assertEqual(len(resumed_lines), 250001)
+        self.assertEqual(resumed_lines, read_lines(expected_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
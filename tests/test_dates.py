@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import datetime
+import unittest
+
+import convert
+
+
+def parse_outcome(parse, in_date):
+    # the datetime parsed, or the type of the error raised
+    try:
+        return parse(in_date)
+    except ValueError:
+        return ValueError
+
+
+def strptime(in_date):
+    return datetime.datetime.strptime(in_date, convert.SOURCE_DATE_FORMAT)
+
+
+class ParseSourceDateTest(unittest.TestCase):
+    # parse_source_date gives the datetime strptime does, and fails where strptime fails
+
+    def _check(self, in_dates):
+        for in_date in in_dates:
+            self.assertEqual(parse_outcome(convert.parse_source_date, in_date), parse_outcome(strptime, in_date),
+                             in_date)
+
+    def test_valid_dates(self):
+        in_dates = []
+        for year in (1999, 2000, 2014, 2016, 2100):
+            for month in range(1, 13):
+                for day in (1, 9, 10, 28, 29, 30, 31):
+                    for hour in range(1, 13):
+                        in_dates.append(u'{0:02d}/{1:02d}/{2} {3:02d}:{4:02d}:{5:02d} {6}'.format(
+                            month, day, year, hour, (hour * 7) % 60, (day * 11) % 60, u'AM' if day % 2 else u'PM'))
+        self._check(in_dates)
+        self.assertEqual(convert.parse_source_date(u'01/31/2014 12:05:09 AM'), datetime.datetime(2014, 1, 31, 0, 5, 9))
+        self.assertEqual(convert.parse_source_date(u'01/31/2014 12:05:09 PM'), datetime.datetime(2014, 1, 31, 12, 5, 9))
+
+    def test_other_forms(self):
+        # forms strptime accepts that the direct parse leaves to it
+        self._check([u'1/2/2014 3:05:09 PM', u'01/02/2014 03:05:09 pm', u'01/02/2014 03:05:09 Am',
+                     u'01/02/2014 3:5:9 PM', u'01/02/14 03:05:09 PM'])
+
+    def test_invalid_dates(self):
+        in_dates = [u'02/29/2014 03:05:09 PM', u'02/30/2016 03:05:09 PM', u'04/31/2014 03:05:09 PM',
+                    u'00/10/2014 03:05:09 PM', u'13/10/2014 03:05:09 PM', u'10/00/2014 03:05:09 PM',
+                    u'10/32/2014 03:05:09 PM', u'10/10/2014 00:05:09 PM', u'10/10/2014 13:05:09 PM',
+                    u'10/10/2014 03:60:09 PM', u'10/10/2014 03:05:61 PM', u'10/10/2014 03:05:09 XM',
+                    u'10/10/2014 03:05:09', u'10/10/20x4 03:05:09 PM', u'10/10/2014 03:+5:09 PM',
+                    u'10/10/2014 03:-5:09 PM', u'10/1 /2014 03:05:09 PM', u'10-10-2014 03:05:09 PM',
+                    u'10/10/2014T03:05:09 PM', u'10/10/2014 03:05:09 PM ', u'0x/10/2014 03:05:09 PM',
+                    u'10/10/2014 03:05:0٩ PM', u'١٠/10/2014 03:05:09 PM', u'10/10/2014 0٣:05:09 PM',
+                    u'', u'10/10/2014']
+        self._check(in_dates)
+        for in_date in in_dates[:12]:
+            self.assertEqual(parse_outcome(convert.parse_source_date, in_date), ValueError, in_date)
+
+
+if __name__ == '__main__':
+    unittest.main()
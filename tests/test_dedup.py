@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import os
+import unittest
+
+import convert
+from support import TempFolderTestCase, SOURCE_HEADER, source_row, start_convert, write_source_file, read_lines
+
+
+class DedupAcrossRunsTest(TempFolderTestCase):
+    # --dedup drops the records with a key converted by an earlier run
+
+    def setUp(self):
+        super(DedupAcrossRunsTest, self).setUp()
+        self.source_file = os.path.join(self.source_folder, 'source.csv')
+        self.destination_file = os.path.join(self.dest_folder, 'upload.csv')
+        self.manifest_file = os.path.join(self.dest_folder, 'dedup_keys.manifest.json')
+
+    def _get_citations(self):
+        return [line.split(u',', 1)[0] for line in read_lines(self.destination_file)[1:]]
+
+    def _get_index_key_count(self):
+        with io.open(self.manifest_file, 'r', encoding='utf-8') as the_file:
+            return sum(run['keys'] for run in json.load(the_file)['runs'])
+
+    def test_second_run_drops_keys_of_first(self):
+        write_source_file(self.source_file, 1000)
+        self.assertEqual(start_convert(['--dedup'], self.folder).wait(), 0)
+        self.assertEqual(len(self._get_citations()), 1000)
+        self.assertEqual(self._get_index_key_count(), 1000)
+
+        # half of the records of the second run were converted by the first
+        write_source_file(self.source_file, 1000, first_row=500)
+        self.assertEqual(start_convert(['--dedup'], self.folder).wait(), 0)
+        self.assertEqual(self._get_citations(), [str(10000000 + idx) for idx in range(1000, 1500)])
+        self.assertEqual(self._get_index_key_count(), 1500)
+
+    def test_runs_are_merged_across_runs(self):
+        # small runs, so the keys of each conversion are written as several runs and merged with earlier ones
+        os.mkdir(self.dest_folder)
+        run_keys = convert.DEDUP_RUN_KEYS
+        convert.DEDUP_RUN_KEYS = 100
+        try:
+            for first_row in (0, 500, 1000):
+                write_source_file(self.source_file, 1000, first_row=first_row)
+                index = convert.DedupIndex(os.path.join(self.dest_folder, 'dedup_keys'))
+                converter = convert.Converter(self.source_file, self.destination_file, convert.RALLY_MAPPING, [],
+                                              dedup_index=index)
+                self.assertTrue(converter.transform())
+                self.assertEqual(index.duplicates, 0 if first_row == 0 else 500)
+        finally:
+            convert.DEDUP_RUN_KEYS = run_keys
+        self.assertEqual(self._get_citations(), [str(10000000 + idx) for idx in range(1500, 2000)])
+        self.assertEqual(self._get_index_key_count(), 2000)
+        with io.open(self.manifest_file, 'r', encoding='utf-8') as the_file:
+            run_sizes = [run['keys'] for run in json.load(the_file)['runs']]
+        # each run is more than DEDUP_RUN_RATIO times the size of the next, and only the runs listed are left
+        for size, next_size in zip(run_sizes, run_sizes[1:]):
+            self.assertTrue(size > next_size * convert.DEDUP_RUN_RATIO)
+        run_files = [name for name in os.listdir(self.dest_folder) if name.endswith('.keys')]
+        self.assertEqual(len(run_files), len(run_sizes))
+
+
+class DedupKeyRejectsTest(TempFolderTestCase):
+    # a record too short to have the key field is rejected, numbered with the records rejected by the conversion
+
+    def setUp(self):
+        super(DedupKeyRejectsTest, self).setUp()
+        rows = [source_row(idx) for idx in range(300)]
+        rows[10] = rows[5]
+        rows[20] = rows[150] = u'1,2,3'
+        rows[30] = rows[30].replace(u'/2014', u'/20x4')
+        self.source_text = u''.join(line + u'\n' for line in [SOURCE_HEADER] + rows)
+
+    def _transform(self, reject_writer, index_name='dedup_keys', **kwargs):
+        # the address is the key, the short rows end before it
+        index = convert.DedupIndex(os.path.join(self.folder, index_name), u'address')
+        validator = convert.RowCountValidator()
+        converter = convert.Converter(convert.MemorySource(self.source_text), convert.MemorySink(),
+                                      convert.RALLY_MAPPING, [], dedup_index=index, reject_writer=reject_writer,
+                                      stream_validator_list=[validator], chunk_rows=100, **kwargs)
+        return converter.transform(), validator
+
+    def test_short_rows_are_rejected(self):
+        for index_name, kwargs in (('serial_keys', {}), ('threaded_keys', {'pipeline_threads': 2})):
+            reject_sink = convert.MemorySink()
+            success, validator = self._transform(convert.RejectWriter(reject_sink), index_name, **kwargs)
+            self.assertTrue(success)
+            rejects = reject_sink.getvalue()
+            if isinstance(rejects, bytes):
+                rejects = rejects.decode('utf-8')
+            self.assertEqual([line.split(u',')[:2] for line in rejects.splitlines()[1:]],
+                             [[u'21', u'address'], [u'31', u'ViolationDate'], [u'151', u'address']])
+            self.assertEqual((validator.read_count, validator.written_count, validator.rejected_count,
+                              validator.dropped_count), (300, 296, 3, 1))
+
+    def test_short_row_fails_without_quarantine(self):
+        with self.assertRaises(IndexError):
+            self._transform(None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import convert
+from support import SOURCE_HEADER, source_row
+
+
+def varied_row(idx):
+    # a source row with the values that take the less common paths of the rules
+    fields = source_row(idx).split(u',')
+    kind = idx % 7
+    if kind == 1:
+        # no license expiration
+        fields[2], fields[3] = u'', u''
+    elif kind == 2:
+        # not a US state
+        fields[4] = u'ZZ'
+    elif kind == 3:
+        fields[8] = u'"FIRE HYDRANT, 15 FT ""RED"" CURB"'
+    elif kind == 4:
+        fields[8] = u'STATIONNEMENT INTERDIT – ZONE ÉCOLE'
+    elif kind == 5:
+        # December, the license expires at the end of January of the next year
+        fields[2] = u'12'
+    elif kind == 6:
+        fields[5] = u''
+    return u','.join(fields)
+
+
+def source_text(row_count):
+    return u''.join(line + u'\n' for line in [SOURCE_HEADER] + [varied_row(idx) for idx in range(row_count)])
+
+
+class EngineEquivalenceTest(unittest.TestCase):
+    # COLUMNAR_ENGINE converts a chunk column by column into the same output as ROW_ENGINE does row by row
+
+    def _convert(self, engine, text, **kwargs):
+        sink = convert.MemorySink()
+        converter = convert.Converter(convert.MemorySource(text), sink, convert.RALLY_MAPPING, [], engine=engine,
+                                      **kwargs)
+        self.assertTrue(converter.transform())
+        return sink.getvalue()
+
+    def _check_equivalent(self, row_count=700, **kwargs):
+        text = source_text(row_count)
+        expected = self._convert(convert.ROW_ENGINE, text, **kwargs)
+        self.assertEqual(len(expected.splitlines()), row_count + 1)
+        self.assertEqual(self._convert(convert.COLUMNAR_ENGINE, text, **kwargs), expected)
+
+    def test_same_output(self):
+        self._check_equivalent()
+
+    def test_same_output_in_chunks(self):
+        # chunks of a size that leaves a partial last chunk, and a chunk of a single row
+        self._check_equivalent(chunk_rows=64)
+        self._check_equivalent(row_count=1, chunk_rows=64)
+
+    def test_same_output_byte_mode(self):
+        self._check_equivalent(byte_mode=True)
+
+    def test_same_output_simple_csv(self):
+        text = u''.join(line + u'\n' for line in [SOURCE_HEADER] + [source_row(idx) for idx in range(300)])
+        self.assertEqual(self._convert(convert.COLUMNAR_ENGINE, text, csv_format=convert.SIMPLE_CSV),
+                         self._convert(convert.ROW_ENGINE, text, csv_format=convert.SIMPLE_CSV))
+
+    def test_same_output_threaded(self):
+        self._check_equivalent(chunk_rows=50, pipeline_threads=3)
+
+    def test_same_output_profiled(self):
+        self._check_equivalent(chunk_rows=50, profile=convert.PROFILE_FULL)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import unittest
+
+import convert
+from support import TempFolderTestCase, start_convert, write_source_file, read_lines
+
+
+class IncrementalStateTest(TempFolderTestCase):
+    # --incremental skips a source file only if its content is the same as when it was converted
+
+    def setUp(self):
+        super(IncrementalStateTest, self).setUp()
+        self.source_file = os.path.join(self.source_folder, 'source.csv')
+        self.destination_file = os.path.join(self.dest_folder, 'upload.csv')
+        write_source_file(self.source_file, 100)
+
+    def _convert(self, *args):
+        return start_convert(['--incremental'] + list(args), self.folder).wait()
+
+    def _mark_destination(self):
+        # gives the destination file a modification time no conversion would, to tell whether it was rewritten
+        os.utime(self.destination_file, (1, 1))
+
+    def _is_destination_rewritten(self):
+        return os.path.getmtime(self.destination_file) != 1
+
+    def test_changed_content_with_same_size_and_time_is_converted(self):
+        self.assertEqual(self._convert(), 0)
+        self._mark_destination()
+        source_stat = os.stat(self.source_file)
+        with io.open(self.source_file, 'rb') as the_file:
+            content = the_file.read()
+        with io.open(self.source_file, 'wb') as the_file:
+            the_file.write(content.replace(b'\n10000001,', b'\n19999991,'))
+        os.utime(self.source_file, (source_stat.st_atime, source_stat.st_mtime))
+        self.assertEqual(self._convert(), 0)
+        self.assertTrue(self._is_destination_rewritten())
+        self.assertTrue(any(line.startswith(u'19999991,') for line in read_lines(self.destination_file)))
+
+    def test_same_content_with_new_time_is_skipped(self):
+        self.assertEqual(self._convert(), 0)
+        self._mark_destination()
+        source_stat = os.stat(self.source_file)
+        os.utime(self.source_file, (source_stat.st_atime, source_stat.st_mtime + 60))
+        self.assertEqual(self._convert(), 0)
+        self.assertFalse(self._is_destination_rewritten())
+
+    def test_change_during_conversion_is_converted_again(self):
+        # the state keeps the source as it was before the conversion, not as it is when the conversion is recorded
+        self.assertEqual(self._convert(), 0)
+        state = convert.ConversionState(os.path.join(self.folder, 'state.json'))
+        source_info = convert.get_source_info(self.source_file)
+        write_source_file(self.source_file, 100, first_row=1)
+        state.record(self.source_file, self.destination_file, source_info)
+        self.assertTrue(state.is_unchanged(self.source_file, self.destination_file, source_info))
+        self.assertFalse(state.is_unchanged(self.source_file, self.destination_file,
+                                            convert.get_source_info(self.source_file)))
+
+    def test_standard_input_source_is_rejected(self):
+        self.assertEqual(self._convert('--source=-'), 1)
+        self.assertFalse(os.path.isfile(os.path.join(self.dest_folder, 'conversion_state.json')))
+
+
+if __name__ == '__main__':
+    unittest.main()
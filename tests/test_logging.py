@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import subprocess
+import sys
+import unittest
+
+from support import REPO_FOLDER
+
+# logs a record from a program that imports convert, optionally after starting the listener thread
+LOG_SCRIPT = '''
+import sys
+sys.path.insert(0, {0!r})
+import convert
+if sys.argv[1] == 'started':
+    convert.start_logging()
+convert.rootLogger.info('logged record')
+sys.stdout.write('queued records: {{0}}\\n'.format(convert.logQueue.qsize()))
+'''.format(REPO_FOLDER)
+
+
+class ImportedLoggingTest(unittest.TestCase):
+
+    def _run(self, mode):
+        process = subprocess.Popen([sys.executable, '-c', LOG_SCRIPT, mode], stdout=subprocess.PIPE)
+        output = process.communicate()[0].decode('utf-8')
+        self.assertEqual(process.returncode, 0)
+        return output
+
+    def test_imported_module_logs_to_console(self):
+        output = self._run('imported')
+        self.assertTrue('[INFO ]  logged record' in output)
+        self.assertTrue('queued records: 0' in output)
+
+    def test_started_logging_writes_through_listener(self):
+        output = self._run('started')
+        self.assertTrue('[INFO ]  logged record' in output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import os
+import unittest
+
+import convert
+from support import REPO_FOLDER, TempFolderTestCase
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+class LoadMappingTest(TempFolderTestCase):
+    # mapping files are validated, and a valid mapping is cached for the next job to reuse
+
+    def setUp(self):
+        super(LoadMappingTest, self).setUp()
+        self.mapping_file = os.path.join(self.folder, 'mapping.json')
+        self.cache_folder = os.path.join(self.folder, 'cache')
+
+    def _write_mapping(self, content, mapping_file=None):
+        with io.open(mapping_file or self.mapping_file, 'wb') as the_file:
+            the_file.write(content.encode('utf-8') if isinstance(content, type(u'')) else content)
+
+    def _check_invalid(self, content, reason):
+        self._write_mapping(content)
+        with self.assertRaises(Exception) as context:
+            convert.load_mapping(self.mapping_file, self.cache_folder)
+        self.assertEqual(str(context.exception), convert.LOG_MSG_EXCEPT_MAPPING.format(self.mapping_file, reason))
+        # nothing is cached for an invalid mapping
+        self.assertFalse(os.path.isdir(self.cache_folder) and os.listdir(self.cache_folder))
+
+    def _get_cache_files(self):
+        return sorted(os.listdir(self.cache_folder))
+
+    def test_rally_mapping_file(self):
+        mapping_file = os.path.join(REPO_FOLDER, 'rally_mapping.json')
+        self.assertEqual(convert.load_mapping(mapping_file, None), convert.RALLY_MAPPING)
+
+    def test_invalid_mappings(self):
+        self._check_invalid(u'{}', 'expected a list of mappings')
+        self._check_invalid(u'[]', 'expected a list of mappings')
+        self._check_invalid(u'["Name"]', 'mapping 0 is not a dictionary')
+        self._check_invalid(u'[{"source": ["citation"], "conversion": null}]', 'mapping 0 has no destination')
+        self._check_invalid(u'[{"destination": "Name", "source": ["citation"], "conversion": null},'
+                            u' {"destination": "Name", "source": ["tag"], "conversion": null}]',
+                            'Name is mapped more than once')
+        self._check_invalid(u'[{"destination": "Name", "source": "citation", "conversion": null}]',
+                            'Name: source must be a list of column names')
+        self._check_invalid(u'[{"destination": "Name", "source": [], "conversion": null}]',
+                            'Name: source must be a list of column names')
+        self._check_invalid(u'[{"destination": "Name", "source": ["citation"], "conversion": "upper"}]',
+                            'Name: unknown conversion function upper')
+
+    def test_invalid_json(self):
+        self._write_mapping(u'[{"destination": "Name",')
+        with self.assertRaises(Exception) as context:
+            convert.load_mapping(self.mapping_file, self.cache_folder)
+        self.assertTrue(str(context.exception).startswith(convert.LOG_MSG_EXCEPT_MAPPING.format(self.mapping_file,
+                                                                                                 '')))
+
+    def test_unknown_keys_are_left_out(self):
+        self._write_mapping(u'[{"destination": "Name", "source": ["citation"], "conversion": null, "note": "x"}]')
+        self.assertEqual(convert.load_mapping(self.mapping_file, None),
+                         [{convert.DESTINATION_KEY: u'Name', convert.SOURCE_KEY: [u'citation'],
+                           convert.CONVERSION_FUNCTION_KEY: None}])
+
+    def test_cache_is_reused(self):
+        self._write_mapping(u'[{"destination": "Date", "source": ["violDate"], "conversion": "date_to_iso_date"}]')
+        mapping_list = convert.load_mapping(self.mapping_file, self.cache_folder)
+        self.assertEqual(mapping_list[0][convert.CONVERSION_FUNCTION_KEY], convert.date_to_iso_date)
+        cache_files = self._get_cache_files()
+        self.assertEqual(len(cache_files), 1)
+        # a mapping found in the cache is taken from it, without parsing the mapping file again
+        cache_file = os.path.join(self.cache_folder, cache_files[0])
+        with io.open(cache_file, 'r', encoding='utf-8') as the_file:
+            entries = json.load(the_file)
+        entries[0][convert.DESTINATION_KEY] = u'CachedDate'
+        with io.open(cache_file, 'w', encoding='utf-8') as the_file:
+            the_file.write(json.dumps(entries) + u'\n')
+        self.assertEqual(convert.load_mapping(self.mapping_file, self.cache_folder)[0][convert.DESTINATION_KEY],
+                         u'CachedDate')
+        self.assertEqual(self._get_cache_files(), cache_files)
+
+    def test_changed_mapping_is_cached_apart(self):
+        self._write_mapping(u'[{"destination": "Name", "source": ["citation"], "conversion": null}]')
+        convert.load_mapping(self.mapping_file, self.cache_folder)
+        self._write_mapping(u'[{"destination": "Tag", "source": ["tag"], "conversion": null}]')
+        self.assertEqual(convert.load_mapping(self.mapping_file, self.cache_folder)[0][convert.DESTINATION_KEY],
+                         u'Tag')
+        self.assertEqual(len(self._get_cache_files()), 2)
+
+    def test_cached_unknown_function_fails(self):
+        # a cache written by a version with other conversion functions is checked as it is resolved
+        self._write_mapping(u'[{"destination": "Name", "source": ["citation"], "conversion": null}]')
+        convert.load_mapping(self.mapping_file, self.cache_folder)
+        cache_file = os.path.join(self.cache_folder, self._get_cache_files()[0])
+        with io.open(cache_file, 'w', encoding='utf-8') as the_file:
+            the_file.write(u'[{"destination": "Name", "source": ["citation"], "conversion": "upper"}]\n')
+        with self.assertRaises(Exception) as context:
+            convert.load_mapping(self.mapping_file, self.cache_folder)
+        self.assertEqual(str(context.exception), convert.LOG_MSG_EXCEPT_MAPPING.format(
+            self.mapping_file, 'unknown conversion function upper'))
+
+    @unittest.skipIf(yaml is None, 'PyYAML is not installed')
+    def test_yaml_mapping(self):
+        mapping_file = os.path.join(self.folder, 'mapping.yaml')
+        self._write_mapping(u'- destination: Date\n  source: [violDate]\n  conversion: date_to_iso_date\n',
+                            mapping_file)
+        mapping_list = convert.load_mapping(mapping_file, self.cache_folder)
+        self.assertEqual(mapping_list, [{convert.DESTINATION_KEY: u'Date', convert.SOURCE_KEY: [u'violDate'],
+                                         convert.CONVERSION_FUNCTION_KEY: convert.date_to_iso_date}])
+        # the cache holds the mapping as JSON, and gives the same mapping
+        self.assertEqual(len(self._get_cache_files()), 1)
+        self.assertEqual(convert.load_mapping(mapping_file, self.cache_folder), mapping_list)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import io
+import mmap
+import os
+import unittest
+
+import convert
+from support import TempFolderTestCase, SOURCE_HEADER, source_row
+
+
+class MappedLinesTest(TempFolderTestCase):
+    # a memory mapped source is split into the same lines, and converted the same, as when it is read in byte mode
+
+    def _write_source(self, rows):
+        source_file = os.path.join(self.folder, 'source.csv')
+        with io.open(source_file, 'wb') as the_file:
+            the_file.write(b''.join(row.encode('utf-8') + b'\n' for row in [SOURCE_HEADER] + rows))
+        return source_file
+
+    def _read_mapped(self, source_file, block_size):
+        with io.open(source_file, 'rb') as the_file:
+            mapped = mmap.mmap(the_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                return list(convert.read_mapped_lines(mapped, block_size=block_size))
+            finally:
+                mapped.close()
+
+    def _convert(self, source_file, **kwargs):
+        sink = convert.MemorySink()
+        converter = convert.Converter(source_file, sink, convert.RALLY_MAPPING, [], **kwargs)
+        self.assertTrue(converter.transform())
+        return sink.getvalue()
+
+    def test_lone_carriage_return_stays_in_line(self):
+        rows = [source_row(idx) for idx in range(200)]
+        rows[50] = source_row(50, u'carriage\rreturn')
+        rows[120] = source_row(120, u'form\x0cfeed and\x1dseparator')
+        source_file = self._write_source(rows)
+        with io.open(source_file, 'rb') as the_file:
+            expected_lines = list(the_file)
+        self.assertEqual(len(expected_lines), 201)
+        for block_size in (64, 1000, 1 << 20):
+            self.assertEqual(self._read_mapped(source_file, block_size), expected_lines)
+        self.assertEqual(self._convert(source_file, mmap_input=True), self._convert(source_file, byte_mode=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
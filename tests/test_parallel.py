@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import os
+import signal
+import unittest
+
+import convert
+from support import REPO_FOLDER, TempFolderTestCase, start_python, stop_process_group, process_group_exists, \
+    wait_for, write_source_file, read_lines
+
+# converts source/large.csv into upload.csv in small ranges, so the interrupt finds part files being written
+BATCH_SCRIPT = '''
+import sys
+sys.path.insert(0, {0!r})
+import convert
+convert.BatchConverter(['source/large.csv'], ['upload.csv'], convert.RALLY_MAPPING, [], processes=2,
+                       chunk_size=1000000).transform()
+'''.format(REPO_FOLDER)
+
+
+class ParallelSignalTest(TempFolderTestCase):
+    # an interrupted BatchConverter stops its workers and removes its part files
+
+    def _part_files(self):
+        return [file_name for file_name in os.listdir(self.folder) if file_name.endswith('.part')]
+
+    def _check_stops_on(self, signum):
+        write_source_file(os.path.join(self.source_folder, 'large.csv'), 400000)
+        process = start_python(['-c', BATCH_SCRIPT], self.folder)
+        try:
+            self.assertTrue(wait_for(self._part_files, 20))
+            os.killpg(process.pid, signum)
+            self.assertTrue(wait_for(lambda: process.poll() is not None, 5))
+            self.assertNotEqual(process.returncode, 0)
+            self.assertTrue(wait_for(lambda: not process_group_exists(process.pid), 5))
+            self.assertEqual(self._part_files(), [])
+            self.assertFalse(os.path.exists(os.path.join(self.folder, 'upload.csv')))
+        finally:
+            stop_process_group(process)
+
+    def test_stops_on_sigint(self):
+        self._check_stops_on(signal.SIGINT)
+
+    def test_stops_on_sigterm(self):
+        self._check_stops_on(signal.SIGTERM)
+
+
+class LineBreakInQuotesTest(TempFolderTestCase):
+    # ranges end outside quoted fields, so fields holding line breaks convert the same as by a single Converter
+
+    def setUp(self):
+        super(LineBreakInQuotesTest, self).setUp()
+        self.source_file = os.path.join(self.source_folder, 'multiline.csv')
+        write_source_file(self.source_file, 2000,
+                          description_fn=lambda idx: u'"multi\nline, desc"' if idx % 3 == 0 else None)
+        expected_file = os.path.join(self.folder, 'expected.csv')
+        convert.Converter(self.source_file, expected_file, convert.RALLY_MAPPING, []).transform()
+        self.expected_lines = read_lines(expected_file)
+
+    def _check_batch(self, **kwargs):
+        destination_file = os.path.join(self.folder, 'upload.csv')
+        converter = convert.BatchConverter([self.source_file], [destination_file], convert.RALLY_MAPPING, [],
+                                           processes=2, chunk_size=7919, **kwargs)
+        converter.transform()
+        self.assertEqual(converter.line_count, 2000)
+        self.assertEqual(read_lines(destination_file), self.expected_lines)
+
+    def test_ranges_end_outside_quotes(self):
+        start = len(read_lines(self.source_file)[0]) + 1
+        ranges = convert.get_line_aligned_ranges(self.source_file, start, 7919, quoted=True)
+        self.assertTrue(len(ranges) > 2)
+        with open(self.source_file, 'rb') as src_file:
+            content = src_file.read()
+        for range_start, range_end in ranges:
+            self.assertEqual(content[range_start:range_end].count(b'"') % 2, 0)
+            self.assertEqual(content[range_end - 1:range_end], b'\n')
+
+    def test_batch_converter(self):
+        self._check_batch()
+
+    def test_batch_converter_byte_mode(self):
+        self._check_batch(byte_mode=True)
+
+    def test_batch_converter_mmap_input(self):
+        self._check_batch(mmap_input=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import unittest
+
+import convert
+from support import SOURCE_HEADER, source_row, wait_for
+
+
+def source_text(row_count):
+    return u''.join(line + u'\n' for line in [SOURCE_HEADER] + [source_row(idx) for idx in range(row_count)])
+
+
+class ChunkError(Exception):
+    pass
+
+
+class SlowFirstConverter(convert.Converter):
+    # converts the earlier chunks slower, so the threads finish them out of order
+
+    def _convert_chunk(self, chunk_idx, chunk, stats):
+        time.sleep(0.002 * (10 - chunk_idx % 10))
+        return super(SlowFirstConverter, self)._convert_chunk(chunk_idx, chunk, stats)
+
+
+class FailingConverter(convert.Converter):
+    # fails to convert the chunk fail_chunk_idx
+
+    fail_chunk_idx = 5
+
+    def _convert_chunk(self, chunk_idx, chunk, stats):
+        if chunk_idx == self.fail_chunk_idx:
+            raise ChunkError(chunk_idx)
+        return super(FailingConverter, self)._convert_chunk(chunk_idx, chunk, stats)
+
+
+class FailingReadConverter(convert.Converter):
+    # fails to read the source after three chunks
+
+    def _read_chunks(self, src_lines):
+        for chunk_idx, item in enumerate(super(FailingReadConverter, self)._read_chunks(src_lines)):
+            if chunk_idx == 3:
+                raise ChunkError(chunk_idx)
+            yield item
+
+
+class BlockedConverter(convert.Converter):
+    # holds the conversion of the first chunk until released, counting the chunks read meanwhile
+
+    def __init__(self, *args, **kwargs):
+        super(BlockedConverter, self).__init__(*args, **kwargs)
+        self.release = threading.Event()
+        self.read_count = 0
+
+    def _read_chunks(self, src_lines):
+        for item in super(BlockedConverter, self)._read_chunks(src_lines):
+            self.read_count += 1
+            yield item
+
+    def _convert_chunk(self, chunk_idx, chunk, stats):
+        if chunk_idx == 0:
+            self.release.wait(30)
+        return super(BlockedConverter, self)._convert_chunk(chunk_idx, chunk, stats)
+
+
+class ThreadPipelineTest(unittest.TestCase):
+    # the converter threads keep the chunks in source order, and their errors reach the caller
+
+    def setUp(self):
+        self.thread_count = threading.active_count()
+
+    def _make_converter(self, converter_class, row_count, pipeline_threads=4):
+        sink = convert.MemorySink()
+        converter = converter_class(convert.MemorySource(source_text(row_count)), sink, convert.RALLY_MAPPING, [],
+                                    chunk_rows=50, pipeline_threads=pipeline_threads)
+        return converter, sink
+
+    def _check_threads_stopped(self):
+        self.assertTrue(wait_for(lambda: threading.active_count() == self.thread_count, 5))
+
+    def test_chunks_are_written_in_order(self):
+        converter, sink = self._make_converter(convert.Converter, 2000, pipeline_threads=None)
+        self.assertTrue(converter.transform())
+        expected = sink.getvalue()
+        converter, sink = self._make_converter(SlowFirstConverter, 2000)
+        self.assertTrue(converter.transform())
+        self.assertEqual(sink.getvalue(), expected)
+        self._check_threads_stopped()
+
+    def test_conversion_error_reaches_caller(self):
+        converter, _ = self._make_converter(FailingConverter, 2000)
+        with self.assertRaises(ChunkError) as context:
+            converter.transform()
+        self.assertEqual(context.exception.args, (FailingConverter.fail_chunk_idx,))
+        self._check_threads_stopped()
+
+    def test_read_error_reaches_caller(self):
+        converter, _ = self._make_converter(FailingReadConverter, 2000)
+        with self.assertRaises(ChunkError):
+            converter.transform()
+        self._check_threads_stopped()
+
+    def test_reader_is_held_back(self):
+        # PIPELINE_MAX_CHUNKS chunks from the first chunk not yet written take all the slots, and the reader waits
+        # for a slot with the next chunk read
+        converter, sink = self._make_converter(BlockedConverter, 100 * convert.PIPELINE_MAX_CHUNKS)
+        thread = threading.Thread(target=converter.transform)
+        thread.start()
+        try:
+            self.assertTrue(wait_for(lambda: converter.read_count == convert.PIPELINE_MAX_CHUNKS + 1, 10))
+            time.sleep(0.5)
+            self.assertEqual(converter.read_count, convert.PIPELINE_MAX_CHUNKS + 1)
+        finally:
+            converter.release.set()
+            thread.join(30)
+        self.assertEqual(converter.read_count, 2 * convert.PIPELINE_MAX_CHUNKS)
+        self.assertEqual(len(sink.getvalue().splitlines()), 100 * convert.PIPELINE_MAX_CHUNKS + 1)
+        self._check_threads_stopped()
+
+
+if __name__ == '__main__':
+    unittest.main()
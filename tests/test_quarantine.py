@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+import convert
+from support import TempFolderTestCase, SOURCE_HEADER, source_row, start_convert, read_lines
+
+
+def bad_date_row(idx):
+    return source_row(idx).replace(u'/2014', u'/20x4')
+
+
+def source_text(rows):
+    return u''.join(line + u'\n' for line in [SOURCE_HEADER] + rows)
+
+
+def source_rows(row_count, bad_rows):
+    # the source rows, with those of the indices in bad_rows replaced by the rows given
+    return [bad_rows.get(idx) or source_row(idx) for idx in range(row_count)]
+
+
+class QuarantineTest(unittest.TestCase):
+    # records that fail to convert are written to the rejects, numbered by their record in the source
+
+    def _transform(self, rows, **kwargs):
+        reject_sink = convert.MemorySink()
+        reject_writer = convert.RejectWriter(reject_sink, max_errors=kwargs.pop('max_errors', None),
+                                             max_error_rate=kwargs.pop('max_error_rate', None))
+        sink = convert.MemorySink()
+        converter = convert.Converter(convert.MemorySource(source_text(rows)), sink, convert.RALLY_MAPPING, [],
+                                      reject_writer=reject_writer, chunk_rows=100, **kwargs)
+        success = converter.transform()
+        return success, sink.getvalue(), self._get_rejects(reject_sink)
+
+    def _get_rejects(self, reject_sink):
+        # the (record, rule, source line) of each reject
+        content = reject_sink.getvalue()
+        if isinstance(content, bytes):
+            content = content.decode('utf-8')
+        rows = list(convert.read_csv_rows(content.splitlines(True)))
+        self.assertEqual(rows[0], convert.REJECTS_HEADER)
+        return [(int(record), rule, source_line) for record, rule, _, source_line in rows[1:]]
+
+    def _convert_plain(self, rows):
+        sink = convert.MemorySink()
+        converter = convert.Converter(convert.MemorySource(source_text(rows)), sink, convert.RALLY_MAPPING, [])
+        self.assertTrue(converter.transform())
+        return sink.getvalue()
+
+    def test_rejects_are_numbered_by_record(self):
+        bad_rows = {0: bad_date_row(0), 149: u'1,2,3', 150: bad_date_row(150), 499: bad_date_row(499)}
+        expected = [(1, u'ViolationDate', bad_rows[0]), (150, u'Description', bad_rows[149]),
+                    (151, u'ViolationDate', bad_rows[150]), (500, u'ViolationDate', bad_rows[499])]
+        for kwargs in ({}, {'pipeline_threads': 2}, {'engine': convert.COLUMNAR_ENGINE}):
+            success, _, rejects = self._transform(source_rows(500, bad_rows), **kwargs)
+            self.assertTrue(success)
+            self.assertEqual(rejects, expected)
+
+    def test_failed_chunk_is_converted_row_by_row(self):
+        # the other rows of a chunk with a failing row are converted, in order, as they are without it
+        bad_rows = {120: bad_date_row(120), 121: bad_date_row(121), 180: u'1,2,3'}
+        rows = source_rows(300, bad_rows)
+        success, output, rejects = self._transform(rows)
+        self.assertTrue(success)
+        self.assertEqual([reject[0] for reject in rejects], [121, 122, 181])
+        self.assertEqual(output, self._convert_plain([row for idx, row in enumerate(rows) if idx not in bad_rows]))
+
+    def test_max_errors_aborts(self):
+        rows = source_rows(300, dict((idx, bad_date_row(idx)) for idx in (10, 20, 30)))
+        self.assertTrue(self._transform(rows, max_errors=3)[0])
+        with self.assertRaises(Exception) as context:
+            self._transform(rows, max_errors=2)
+        self.assertEqual(str(context.exception), convert.LOG_MSG_EXCEPT_MAX_REJECTS.format(3, 2))
+
+    def test_max_error_rate_aborts(self):
+        # 1% of the records rejected, checked once ERROR_RATE_MIN_ROWS records have been read
+        row_count = convert.ERROR_RATE_MIN_ROWS * 2
+        rows = source_rows(row_count, dict((idx, bad_date_row(idx)) for idx in range(0, row_count, 100)))
+        self.assertTrue(self._transform(rows, max_error_rate=0.01)[0])
+        with self.assertRaises(Exception) as context:
+            self._transform(rows, max_error_rate=0.005)
+        self.assertTrue(str(context.exception).startswith(u'Aborting program - 10 of 1000 records rejected'))
+
+    def test_max_error_rate_checked_at_end(self):
+        # a conversion of fewer than ERROR_RATE_MIN_ROWS records is checked when it ends
+        rows = source_rows(100, {50: bad_date_row(50), 60: bad_date_row(60)})
+        self.assertTrue(self._transform(rows, max_error_rate=0.02)[0])
+        with self.assertRaises(Exception) as context:
+            self._transform(rows, max_error_rate=0.01)
+        self.assertEqual(str(context.exception), convert.LOG_MSG_EXCEPT_REJECT_RATE.format(2, 100, 0.01))
+
+
+class QuarantineCommandLineTest(TempFolderTestCase):
+    # --max-errors and --max-error-rate abort the program, --quarantine alone only writes the rejects
+
+    def setUp(self):
+        super(QuarantineCommandLineTest, self).setUp()
+        rows = source_rows(200, dict((idx, bad_date_row(idx)) for idx in (5, 6, 7)))
+        with open(os.path.join(self.source_folder, 'source.csv'), 'wb') as the_file:
+            the_file.write(source_text(rows).encode('utf-8'))
+        self.rejects_file = os.path.join(self.folder, convert.LOG_FOLDER, convert.REJECTS_FILE_NAME)
+        self.destination_file = os.path.join(self.dest_folder, 'upload.csv')
+
+    def test_quarantine_writes_rejects(self):
+        self.assertEqual(start_convert(['--quarantine'], self.folder).wait(), 0)
+        self.assertEqual([line.split(u',', 1)[0] for line in read_lines(self.rejects_file)[1:]], [u'6', u'7', u'8'])
+        self.assertEqual(len(read_lines(self.destination_file)), 198)
+
+    def test_max_errors_fails_program(self):
+        self.assertEqual(start_convert(['--max-errors=3'], self.folder).wait(), 0)
+        self.assertEqual(start_convert(['--max-errors=2'], self.folder).wait(), 1)
+
+    def test_max_error_rate_fails_program(self):
+        self.assertEqual(start_convert(['--max-error-rate=0.015'], self.folder).wait(), 0)
+        self.assertEqual(start_convert(['--max-error-rate=0.01'], self.folder).wait(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
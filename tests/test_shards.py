@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import io
+import json
+import os
+import unittest
+
+from support import TempFolderTestCase, start_convert, write_source_file
+
+
+class ShardRolloverTest(TempFolderTestCase):
+    # --shard-rows and --shard-bytes split the destination into shards listed in a manifest
+
+    def setUp(self):
+        super(ShardRolloverTest, self).setUp()
+        write_source_file(os.path.join(self.source_folder, 'source.csv'), 1000)
+        self.expected_file = os.path.join(self.dest_folder, 'expected.csv')
+        self.assertEqual(start_convert(['--destination=' + self.expected_file], self.folder).wait(), 0)
+        with io.open(self.expected_file, 'rb') as the_file:
+            self.expected_lines = the_file.read().splitlines(True)
+        self.manifest_file = os.path.join(self.dest_folder, 'upload.csv.manifest.json')
+
+    def _convert_shards(self, *args):
+        # returns the manifest and the lines of each shard, checking the manifest matches the shard files
+        self.assertEqual(start_convert(list(args), self.folder).wait(), 0)
+        with io.open(self.manifest_file, 'r', encoding='utf-8') as the_file:
+            manifest = json.load(the_file)
+        self.assertTrue(manifest['complete'])
+        shard_lines = []
+        for number, shard in enumerate(manifest['shards']):
+            self.assertEqual(shard['file'], 'upload.{0:05d}.csv'.format(number + 1))
+            with io.open(os.path.join(self.dest_folder, shard['file']), 'rb') as the_file:
+                content = the_file.read()
+            self.assertEqual(shard['bytes'], len(content))
+            self.assertEqual(shard['sha1'], hashlib.sha1(content).hexdigest())
+            lines = content.splitlines(True)
+            self.assertEqual(lines[0], self.expected_lines[0])
+            self.assertEqual(shard['rows'], len(lines) - 1)
+            shard_lines.append(lines)
+        self.assertEqual(manifest['rows'], sum(shard['rows'] for shard in manifest['shards']))
+        # the shards hold the rows of the unsharded destination, in order
+        self.assertEqual([line for lines in shard_lines for line in lines[1:]], self.expected_lines[1:])
+        return manifest, shard_lines
+
+    def _get_shard_files(self):
+        return sorted(name for name in os.listdir(self.dest_folder) if name.startswith('upload.0'))
+
+    def test_rolls_over_at_max_rows(self):
+        manifest, _ = self._convert_shards('--shard-rows=300')
+        self.assertEqual([shard['rows'] for shard in manifest['shards']], [300, 300, 300, 100])
+        self.assertEqual(manifest['rows'], 1000)
+
+    def test_rolls_over_at_max_bytes(self):
+        max_bytes = 20000
+        manifest, shard_lines = self._convert_shards('--shard-bytes={0}'.format(max_bytes))
+        self.assertTrue(len(shard_lines) > 1)
+        for lines, next_lines in zip(shard_lines, shard_lines[1:] + [None]):
+            size = sum(len(line) for line in lines)
+            self.assertTrue(size <= max_bytes)
+            # a shard is only finished if the next row would take it past max_bytes
+            if next_lines is not None:
+                self.assertTrue(size + len(next_lines[1]) > max_bytes)
+
+    def test_rerun_replaces_shards_of_earlier_run(self):
+        self._convert_shards('--shard-rows=300')
+        self.assertEqual(len(self._get_shard_files()), 4)
+        manifest, _ = self._convert_shards('--shard-rows=600')
+        self.assertEqual([shard['rows'] for shard in manifest['shards']], [600, 400])
+        self.assertEqual(self._get_shard_files(), ['upload.00001.csv', 'upload.00002.csv'])
+
+
+if __name__ == '__main__':
+    unittest.main()
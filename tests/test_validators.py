@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import convert
+from support import SOURCE_HEADER, source_row
+
+
+def source_text(row_count, extra_rows=()):
+    return u''.join(line + u'\n' for line in [SOURCE_HEADER] + [source_row(idx) for idx in range(row_count)] +
+                    list(extra_rows))
+
+
+class LosingConverter(convert.Converter):
+    # loses the last destination line of every chunk between the conversion and the sink
+
+    def _convert_chunk(self, chunk_idx, chunk, stats):
+        chunk, out_rows, out_lines, rejects = super(LosingConverter, self)._convert_chunk(chunk_idx, chunk, stats)
+        return chunk, out_rows, out_lines[:-1], rejects
+
+
+class RowCountValidatorTest(unittest.TestCase):
+
+    def _transform(self, converter_class, text, **kwargs):
+        validator = convert.RowCountValidator()
+        sink = convert.MemorySink()
+        converter = converter_class(convert.MemorySource(text), sink, convert.RALLY_MAPPING, [],
+                                    stream_validator_list=[validator], chunk_rows=100, **kwargs)
+        return converter.transform(), validator, sink
+
+    def test_counts_match(self):
+        success, validator, sink = self._transform(convert.Converter, source_text(250))
+        self.assertTrue(success)
+        self.assertEqual((validator.read_count, validator.written_count), (250, 250))
+        self.assertEqual(len(sink.getvalue().splitlines()), 251)
+
+    def test_lost_rows_fail(self):
+        success, validator, _ = self._transform(LosingConverter, source_text(250))
+        self.assertFalse(success)
+        self.assertEqual((validator.read_count, validator.written_count), (250, 247))
+
+    def test_lost_rows_fail_threaded(self):
+        success, _, _ = self._transform(LosingConverter, source_text(250), pipeline_threads=2)
+        self.assertFalse(success)
+
+    def test_rejects_are_counted_apart(self):
+        bad_row = source_row(900).replace(u'/2014', u'/20x4')
+        reject_writer = convert.RejectWriter(convert.MemorySink())
+        success, validator, _ = self._transform(convert.Converter, source_text(250, [bad_row]),
+                                                reject_writer=reject_writer)
+        self.assertTrue(success)
+        self.assertEqual((validator.read_count, validator.written_count, validator.rejected_count), (251, 250, 1))
+
+    def test_unbalanced_counts_fail(self):
+        validator = convert.RowCountValidator()
+        validator.add_read(10)
+        validator.add_left_out(1, 2)
+        validator.add_written(6)
+        self.assertFalse(validator.result())
+        validator.add_written(1)
+        self.assertTrue(validator.result())
+
+
+if __name__ == '__main__':
+    unittest.main()
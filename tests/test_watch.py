@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import signal
+import unittest
+
+from support import TempFolderTestCase, start_convert, stop_process_group, process_group_exists, wait_for, \
+    write_source_file, read_lines
+
+
+def get_destination_files(dest_folder):
+    # the destination files and partial destination files, without the state file
+    return sorted(name for name in os.listdir(dest_folder) if name.endswith(('.csv', '.tmp')))
+
+
+class WatchSignalTest(TempFolderTestCase):
+    # --watch is stopped by a signal sent to its process group, as by Ctrl-C, timeout or systemd
+
+    def _check_stops_on(self, signum):
+        process = start_convert(['--watch=0.1', '--workers=2'], self.folder)
+        try:
+            write_source_file(os.path.join(self.source_folder, 'first.csv'), 50)
+            destination_file = os.path.join(self.dest_folder, 'first.csv')
+            self.assertTrue(wait_for(lambda: os.path.isfile(destination_file) and
+                                     len(read_lines(destination_file)) == 51, 20))
+            # signal while a worker converts a large file
+            write_source_file(os.path.join(self.source_folder, 'large.csv'), 300000)
+            self.assertTrue(wait_for(lambda: os.path.isfile(os.path.join(self.dest_folder, 'large.csv.tmp')), 20))
+            os.killpg(process.pid, signum)
+            self.assertTrue(wait_for(lambda: process.poll() is not None, 5))
+            self.assertTrue(wait_for(lambda: not process_group_exists(process.pid), 5))
+        finally:
+            stop_process_group(process)
+        # the partial destination of the large file is removed, it is converted again by the next run
+        self.assertEqual(get_destination_files(self.dest_folder), ['first.csv'])
+
+    def test_stops_on_sigint(self):
+        self._check_stops_on(signal.SIGINT)
+
+    def test_stops_on_sigterm(self):
+        self._check_stops_on(signal.SIGTERM)
+
+
+class WatchFailureTest(TempFolderTestCase):
+    # a source file that fails to convert leaves no destination file, or the one of an earlier version
+
+    def _read_log(self):
+        with io.open(os.path.join(self.folder, 'logs', 'story_data_prep.log'), 'r', encoding='utf-8') as log_file:
+            return log_file.read()
+
+    def test_failed_file_leaves_no_partial_destination(self):
+        bad_file = os.path.join(self.source_folder, 'bad.csv')
+        bad_destination_file = os.path.join(self.dest_folder, 'bad.csv')
+        process = start_convert(['--watch=0.1', '--workers=2'], self.folder)
+        try:
+            write_source_file(bad_file, 50)
+            self.assertTrue(wait_for(lambda: os.path.isfile(bad_destination_file), 20))
+            converted_lines = read_lines(bad_destination_file)
+            # many rows converted before a malformed row
+            write_source_file(bad_file, 100000)
+            with io.open(bad_file, 'a', newline='') as the_file:
+                the_file.write(u'1,2,3\n')
+            self.assertTrue(wait_for(lambda: 'Failed to convert' in self._read_log(), 20))
+            write_source_file(os.path.join(self.source_folder, 'good.csv'), 50)
+            self.assertTrue(wait_for(lambda: os.path.isfile(os.path.join(self.dest_folder, 'good.csv')), 20))
+        finally:
+            stop_process_group(process)
+        self.assertEqual(read_lines(bad_destination_file), converted_lines)
+        self.assertEqual(get_destination_files(self.dest_folder), ['bad.csv', 'good.csv'])
+
+
+if __name__ == '__main__':
+    unittest.main()
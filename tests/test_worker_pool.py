@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import os
+import signal
+import time
+import unittest
+
+import convert
+
+
+def _terminate_self():
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+class WorkerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = convert.WorkerPool(2)
+
+    def tearDown(self):
+        self.pool.terminate()
+
+    def _wait_all(self, task_count, seconds=20):
+        # the (exception, result) of each task by task id
+        results = {}
+        deadline = time.time() + seconds
+        while len(results) < task_count and time.time() < deadline:
+            for task_id, error, result in self.pool.wait(0.1):
+                results[task_id] = (error, result)
+        self.assertEqual(len(results), task_count)
+        return results
+
+    def test_runs_tasks(self):
+        task_ids = [self.pool.submit(pow, idx, 2) for idx in range(10)]
+        results = self._wait_all(len(task_ids))
+        self.assertEqual([results[task_id] for task_id in task_ids], [(None, idx * idx) for idx in range(10)])
+        self.pool.close()
+
+    def test_returns_task_exception(self):
+        task_id = self.pool.submit(int, 'not a number')
+        error, result = self._wait_all(1)[task_id]
+        self.assertTrue(isinstance(error, ValueError))
+        self.assertEqual(result, None)
+
+    def test_sigterm_stops_worker(self):
+        # the task of a worker that dies fails, and a new worker takes the next tasks
+        task_id = self.pool.submit(_terminate_self)
+        error, _ = self._wait_all(1)[task_id]
+        self.assertEqual(str(error), convert.LOG_MSG_EXCEPT_WORKER_EXIT.format(-signal.SIGTERM))
+        task_ids = [self.pool.submit(pow, idx, 2) for idx in range(4)]
+        results = self._wait_all(len(task_ids))
+        self.assertEqual([results[task_id][1] for task_id in task_ids], [0, 1, 4, 9])
+
+    def test_terminate_stops_busy_workers(self):
+        for _ in range(3):
+            self.pool.submit(time.sleep, 60)
+        started = time.time()
+        self.pool.terminate()
+        self.assertTrue(time.time() - started < 5)
+
+
+if __name__ == '__main__':
+    unittest.main()